@@ -1,15 +1,53 @@
 from fastapi import APIRouter, Query, HTTPException
+from fastapi.responses import Response
 from app.services.data_prep import fetch_data_from_bigquery
-from app.services.diagnostics_service import run_diagnostics
+from app.services.diagnostics_service import run_diagnostics, render_plot, PLOT_KINDS
+from app.services.series import DailySeries, get_cached_series
 
 router = APIRouter(prefix="/diagnostics", tags=["Diagnostics"])
 
 
 @router.get("/")
-async def diagnostics(category: str = Query(None), product: str = Query(None)):
-    df = fetch_data_from_bigquery(category=category, product=product)
+def diagnostics(
+    category: str = Query(None),
+    product: str = Query(None),
+    include_plots: bool = Query(False, description="Embed base64 ACF/PACF images in the response"),
+):
+    df = fetch_data_from_bigquery(category=category, product=product, daily=True)
     if df is None or df.empty:
         raise HTTPException(status_code=404, detail="No data found for selection.")
 
-    diagnostics = run_diagnostics(df)
+    diagnostics = run_diagnostics(df, include_plots=include_plots)
     return {"category": category, "diagnostics": diagnostics}
+
+
+@router.get("/plots/{series_key}/{kind}")
+def diagnostics_plot(
+    series_key: str,
+    kind: str,
+    max_lags: int = Query(30),
+    category: str = Query(None, description="Same selection as the diagnostics call"),
+    product: str = Query(None, description="Same selection as the diagnostics call"),
+):
+    """
+    PNG of the ACF or PACF plot for a series returned by a previous diagnostics call.
+    If the series is no longer in memory (another worker, a restart, eviction) it is rebuilt
+    from the same category/product selection, served from the fetch cache.
+    Example: GET /diagnostics/plots/<diagnostics.series_key>/acf?category=Books
+    """
+    if kind not in PLOT_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {PLOT_KINDS}")
+    series = get_cached_series(series_key)
+    if series is None:
+        df = fetch_data_from_bigquery(category=category, product=product, daily=True)
+        if df is None or df.empty:
+            raise HTTPException(status_code=404, detail="No data found for selection.")
+        series = DailySeries.from_frame(df)
+        if series.key != series_key:
+            raise HTTPException(status_code=404,
+                                detail="The selection's data has changed since series_key was issued; "
+                                       "request diagnostics again.")
+
+    # Results are cached per series hash
+    png = render_plot(series, kind, max_lags)
+    return Response(content=png, media_type="image/png")
@@ -1,22 +1,40 @@
 from fastapi import APIRouter, Query, HTTPException
-from app.services.data_prep import fetch_data_from_bigquery
+from fastapi.responses import StreamingResponse
+import json
+
+from app.services.data_prep import fetch_data_from_bigquery, fetch_daily_by_group
 from app.services.diagnostics_service import run_diagnostics
-from app.services.forecast_service import run_forecast
+from app.services.forecast_service import run_forecast, iter_batch_forecasts
+from app.services.backtest_service import run_backtest
+from app.services.series import DailySeries
 
 router = APIRouter(prefix="/forecast", tags=["Forecast"])
 
 
 @router.get("/")
-async def forecast(
+def forecast(
     category: str = Query(None, description="Filter by product category"),
-    product: str = Query(None, description="Filter by product name")
+    product: str = Query(None, description="Filter by product name"),
+    engine: str = Query("fast", description="'fast' trend/seasonality model or 'prophet'"),
+    arima_order: str = Query("fixed", description="'fixed' ARIMA(1,1,1) or 'auto' AIC order search"),
 ):
-    df = fetch_data_from_bigquery(category=category, product=product)
+    df = fetch_data_from_bigquery(category=category, product=product, daily=True)
     if df.empty:
         raise HTTPException(status_code=404, detail="No data found for selection.")
 
-    diagnostics = run_diagnostics(df)
-    forecasts = run_forecast(df)
+    # Aggregate once and share the prepared series between both services
+    series = DailySeries.from_frame(df)
+    diagnostics = run_diagnostics(series)
+    try:
+        forecasts = run_forecast(
+            series,
+            series_id=f"category={category}|product={product}",
+            engine=engine,
+            arima_order=arima_order,
+            diagnostics=diagnostics,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return {
         "category": category,
@@ -24,3 +42,53 @@ async def forecast(
         "diagnostics": diagnostics,
         "forecasts": forecasts,
     }
+
+
+@router.get("/backtest")
+def backtest(
+    category: str = Query(None, description="Filter by product category"),
+    product: str = Query(None, description="Filter by product name"),
+    horizon: int = Query(7, description="Days forecast in each fold"),
+    folds: int = Query(5, description="Number of rolling origins"),
+    window: str = Query("expanding", description="'expanding' or 'sliding' training window"),
+):
+    """
+    Rolling-origin backtest with per-fold and mean RMSE/MASE/sMAPE for each model.
+    Example: GET /forecast/backtest?category=Books&horizon=14&folds=4
+    """
+    df = fetch_data_from_bigquery(category=category, product=product, daily=True)
+    if df.empty:
+        raise HTTPException(status_code=404, detail="No data found for selection.")
+
+    try:
+        results = run_backtest(DailySeries.from_frame(df), horizon=horizon, n_folds=folds, window=window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"category": category, "product": product, "backtest": results}
+
+
+@router.get("/batch")
+def forecast_batch(
+    group_by: str = Query("category", description="Forecast every 'category' or every 'product'"),
+    workers: int = Query(None, description="Series forecast at once (defaults to FORECAST_BATCH_WORKERS, the shared pool size)"),
+    time_budget: float = Query(None, description="Per-series time budget in seconds"),
+    engine: str = Query("fast", description="'fast' trend/seasonality model or 'prophet'"),
+):
+    """
+    Forecast every category or product in one request.
+    Results stream back as NDJSON, one line per series, in completion order.
+    Example: GET /forecast/batch?group_by=product&workers=8
+    """
+    try:
+        df = fetch_daily_by_group(group_by=group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if df.empty:
+        raise HTTPException(status_code=404, detail="No data found for selection.")
+
+    def ndjson_stream():
+        for result in iter_batch_forecasts(df, workers=workers, time_budget=time_budget, id_prefix=group_by, engine=engine):
+            yield json.dumps(result, default=str) + "\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
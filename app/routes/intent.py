@@ -1,61 +1,140 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
-import threading
-import queue
 import json
+from typing import Optional
 
+from app.services.intent_aggregates import IntentAggregates, find_aggregates
+from app.services.intent_runs import get_run_store
 from app.services.intent_service import infer_intent_for_dataset
+from app.services.job_manager import Job, JobLimitReached, get_job_manager
 
 router = APIRouter(prefix="/intent", tags=["Intent Inference"])
 
 
 @router.post("/infer")
-def run_intent_inference(dataset: str = Query(..., description="BigQuery dataset name")):
+def run_intent_inference(dataset: str = Query(..., description="BigQuery dataset name"),
+                         resume: Optional[str] = Query(None, description="run_id of an unfinished run to continue")):
     """
     Triggers intent inference for a given dataset (synchronous call).
     Example: POST /intent/infer?dataset=my_dataset
     """
     # Keep synchronous behavior for backward compatibility
-    infer_intent_for_dataset(dataset)
-    return {"status": "started", "dataset": dataset}
+    try:
+        run_id = infer_intent_for_dataset(dataset, resume=resume)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "started", "dataset": dataset, "run_id": run_id}
+
+
+def _start_inference_job(dataset: str, sample_size: int, resume: Optional[str]) -> Job:
+    def target(job: Job):
+        return infer_intent_for_dataset(dataset, sample_size=sample_size, progress_cb=job.publish,
+                                        resume=resume, cancel_event=job.cancelled)
+
+    try:
+        return get_job_manager().submit("intent", target, dataset=dataset, sample_size=sample_size, resume=resume)
+    except JobLimitReached as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+
+def _get_job(job_id: str) -> Job:
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+@router.post("/jobs", status_code=202)
+def start_intent_job(dataset: str = Query(..., description="BigQuery dataset name"),
+                     sample_size: int = Query(200, description="Number of rows to sample; 0 streams the full dataset"),
+                     resume: Optional[str] = Query(None, description="run_id of an unfinished run to continue")):
+    """
+    Start intent inference in the background and return its job id.
+    Follow it with GET /intent/jobs/{job_id} or GET /intent/jobs/{job_id}/events.
+    """
+    return _start_inference_job(dataset, sample_size, resume).snapshot()
+
+
+@router.get("/jobs/{job_id}")
+def get_intent_job(job_id: str):
+    """Status of a background inference job, including its run_id and latest progress event."""
+    return _get_job(job_id).snapshot()
+
+
+@router.post("/jobs/{job_id}/cancel", status_code=202)
+def cancel_intent_job(job_id: str):
+    """
+    Ask a job to stop. Batches already sent are still written; the run can be continued
+    later with resume=<run_id>.
+    """
+    job = _get_job(job_id)
+    job.cancel()
+    return job.snapshot()
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_intent_job(job_id: str, request: Request, after: int = Query(0, description="Replay events after this id")):
+    """
+    Server-Sent Events for a job: the events so far, then live ones until the job ends.
+    Reconnecting clients are resumed from the Last-Event-ID header (or ``after``); the job
+    keeps running while no one is attached.
+    """
+    job = _get_job(job_id)
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        after = int(last_event_id)
+
+    async def event_stream():
+        async for event_id, payload in job.events(after):
+            yield f"id: {event_id}\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@router.get("/runs/{run_id}/aggregates")
+def get_run_aggregates(run_id: str, k: int = Query(10, ge=1, le=1000, description="How many intents (and products per intent) to return")):
+    """
+    Intent counts for a run, kept up to date as its results are written: top ``k`` intents and,
+    for each, the products most often in its baskets. Cheap enough to poll during a run.
+    Aggregates live in memory, so after a restart they cover only what was written since.
+    """
+    run = get_run_store().get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Unknown run: {run_id}")
+    aggregates = find_aggregates(("run", run_id)) or IntentAggregates()
+    return {"run_id": run_id, "dataset": run["dataset"], "status": run["status"], **aggregates.snapshot(k)}
 
 
 @router.get("/infer/stream")
-def run_intent_inference_stream(dataset: str = Query(..., description="BigQuery dataset name"), sample_size: int = Query(200, description="Number of rows to sample")):
+async def run_intent_inference_stream(dataset: str = Query(..., description="BigQuery dataset name"), sample_size: int = Query(200, description="Number of rows to sample; 0 streams the full dataset"),
+                                      resume: Optional[str] = Query(None, description="run_id of an unfinished run to continue")):
     """
     Trigger intent inference and stream progress updates as Server-Sent Events (SSE).
-    Example: GET /intent/infer/stream?dataset=my_dataset&sample_size=200
-    """
-    q: "queue.Queue[str]" = queue.Queue()
-
-    def progress_cb(msg: str):
-        q.put(msg)
-
-    def worker():
-        try:
-            infer_intent_for_dataset(dataset, sample_size=sample_size, progress_cb=progress_cb)
-            q.put(json.dumps({"type": "done", "text": "Inference finished"}))
-        except Exception as e:
-            q.put(json.dumps({"type": "error", "text": str(e)}))
-
-    threading.Thread(target=worker, daemon=True).start()
-
-    def event_stream():
-        while True:
-            msg = q.get()
-            # Parse JSON progress messages and only forward minimal batch info
-            try:
-                obj = json.loads(msg)
-                if obj.get("type") == "progress":
-                    out = json.dumps({"type": "batch", "batch": obj.get("batch"), "total": obj.get("total_batches")})
-                    yield f"data: {out}\n\n"
-                    continue
-                # pass through done/error and other messages
-                yield f"data: {json.dumps(obj)}\n\n"
-                if obj.get("type") in ("done", "error"):
-                    break
-            except Exception:
-                # if message isn't JSON, forward raw
-                yield f"data: {msg}\n\n"
+    Example: GET /intent/infer/stream?dataset=my_dataset&sample_size=200 (sample_size=0 for the full dataset)
+    Pass ``resume=<run_id>`` (from the final ``done`` event) to continue an incomplete run.
+
+    The run is a background job (the first event carries its ``job_id``): disconnecting does not
+    stop it, and GET /intent/jobs/{job_id}/events reattaches.
+    """
+    job = _start_inference_job(dataset, sample_size, resume)
+
+    async def event_stream():
+        yield f"data: {json.dumps({'type': 'job', 'job_id': job.id})}\n\n"
+        async for _, obj in job.events():
+            # Only forward minimal batch info for progress messages
+            if obj.get("type") == "progress":
+                out = json.dumps({"type": "batch", "batch": obj.get("batch"), "total": obj.get("total_batches")})
+                yield f"data: {out}\n\n"
+                continue
+            if obj.get("type") == "end":
+                if obj.get("status") == "failed":
+                    yield f"data: {json.dumps({'type': 'error', 'text': obj.get('error')})}\n\n"
+                else:
+                    yield f"data: {json.dumps({'type': 'done', 'text': 'Inference finished'})}\n\n"
+                break
+            # pass through done/error and other messages
+            yield f"data: {json.dumps(obj)}\n\n"
+            if obj.get("type") in ("done", "error"):
+                break
 
     return StreamingResponse(event_stream(), media_type="text/event-stream")
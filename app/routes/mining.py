@@ -1,18 +1,22 @@
 from fastapi import APIRouter, HTTPException
 from io import BytesIO
 import pandas as pd
-from google.cloud import bigquery
-from mlxtend.frequent_patterns import fpgrowth, association_rules
+
+from app.utils.clients import get_bigquery_client
 
 router = APIRouter()
 
-bq_client = bigquery.Client()
 ORDERS_TABLE = "pivotal-canto-466205-p6.intent_inference.Orders"
 RULES_TABLE = "pivotal-canto-466205-p6.intent_inference.MiningResults"
 
 
 @router.post("/mining")
 async def mine_rules():
+    from google.cloud import bigquery
+    from mlxtend.frequent_patterns import fpgrowth, association_rules
+
+    bq_client = get_bigquery_client()
+
     # --- Step 1: Fetch latest dataset_id ---
     try:
         dataset_id = 1  # You can customize how you select the dataset_id
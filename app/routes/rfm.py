@@ -2,32 +2,25 @@
 from fastapi import APIRouter, Request, Query
 from fastapi.responses import JSONResponse
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+
+from app.services.dataset_catalog import get_dataset_catalog, latest_dataset_id
+from app.utils.clients import get_bigquery_client
 
 router = APIRouter()
 
 @router.get("/rfm-insights")
 def get_rfm_insights(user_id: str = Query(...)):
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.cluster import KMeans
+
     # Load and process data
     from google.cloud import bigquery
-    client = bigquery.Client()
-    # Get latest dataset_id for this user from Data sets table
+    client = get_bigquery_client()
+    # Latest dataset_id for this user: local catalog, checked against Data sets at most once per TTL
     dataset_table = "pivotal-canto-466205-p6.intent_inference.Data sets"
-    dataset_query = f"""
-        SELECT dataset_id FROM `{dataset_table}`
-        WHERE Client_id = @user_id
-        ORDER BY dataset_id DESC
-        LIMIT 1
-    """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
-    )
-    dataset_result = client.query(dataset_query, job_config=job_config).result()
-    dataset_row = next(dataset_result, None)
-    if not dataset_row:
+    dataset_id = latest_dataset_id(get_dataset_catalog(), client, dataset_table, user_id)
+    if dataset_id is None:
         return JSONResponse(content={"error": "No dataset found for this user."}, status_code=404)
-    dataset_id = dataset_row.dataset_id
 
     # Query Orders for this dataset_id
     table_path = "pivotal-canto-466205-p6.intent_inference.Orders"
@@ -1,48 +1,63 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, status, Form
+from fastapi.concurrency import run_in_threadpool
 from io import BytesIO
 import pandas as pd
-from google.cloud import bigquery
+import pyarrow.parquet as pq
 import ast
+import json
 
 from app.schemas.intent import UploadResult
 from app.services import storage
+from app.services.dataset_catalog import FAILED as CATALOG_FAILED, allocate_dataset_id, get_dataset_catalog
+from app.services.job_manager import Job, JobLimitReached, get_upload_job_manager
+from app.services.upload_staging import (
+    build_orders_file, claim_staged_files, csv_to_parquet, detect_file_type, get_upload_pool, load_parquet,
+    read_header, release_staged_files, staged_path,
+)
+from app.utils.clients import get_bigquery_client
+from app.utils.config import UPLOAD_CHUNK_BYTES, UPLOAD_TMP_DIR
 
 router = APIRouter()
 
-bq_client = bigquery.Client()
 TABLE_ID = "pivotal-canto-466205-p6.intent_inference.Orders"
+DATASET_TABLE_ID = "pivotal-canto-466205-p6.intent_inference.Data sets"
 
-# BigQuery schema 
+# BigQuery schema as (name, type, mode); see orders_schema()
 SCHEMA = [
-    bigquery.SchemaField("order_id", "INTEGER", mode="NULLABLE"),
-    bigquery.SchemaField("user_id", "INTEGER", mode="NULLABLE"),
-    bigquery.SchemaField("products", "STRING", mode="REPEATED"),
-    bigquery.SchemaField("dataset_id", "INTEGER", mode="NULLABLE"),
-    bigquery.SchemaField("intent", "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("order_date", "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("Total cost", "FLOAT", mode="NULLABLE"),
-    bigquery.SchemaField("City", "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("payment method", "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("User name", "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("Store type", "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("Customer_Category", "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("Season", "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("Promotion", "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("Total_Items", "STRING", mode="NULLABLE")
+    ("order_id", "INTEGER", "NULLABLE"),
+    ("user_id", "INTEGER", "NULLABLE"),
+    ("products", "STRING", "REPEATED"),
+    ("dataset_id", "INTEGER", "NULLABLE"),
+    ("intent", "STRING", "NULLABLE"),
+    ("order_date", "STRING", "NULLABLE"),
+    ("Total cost", "FLOAT", "NULLABLE"),
+    ("City", "STRING", "NULLABLE"),
+    ("payment method", "STRING", "NULLABLE"),
+    ("User name", "STRING", "NULLABLE"),
+    ("Store type", "STRING", "NULLABLE"),
+    ("Customer_Category", "STRING", "NULLABLE"),
+    ("Season", "STRING", "NULLABLE"),
+    ("Promotion", "STRING", "NULLABLE"),
+    ("Total_Items", "STRING", "NULLABLE")
 ]
 
 
+def orders_schema():
+    from google.cloud import bigquery
+    return [bigquery.SchemaField(name, field_type, mode=mode) for name, field_type, mode in SCHEMA]
+
+
 from fastapi import Form
 
 
 # --- New incremental upload logic ---
 import os
+import shutil
 import tempfile
 
-UPLOAD_TMP_DIR = os.path.join(tempfile.gettempdir(), "intent_uploads")
 os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
 
-@router.post("/upload", response_model=UploadResult)
+@router.post("/upload", response_model=UploadResult, response_model_exclude_none=True)
 async def upload_csv(file: UploadFile = File(...), user_id: str = Form(None)):
     print(f"DEBUG: Received user_id={user_id}, file={file.filename if file else None}")
     if not user_id:
@@ -53,133 +68,162 @@ async def upload_csv(file: UploadFile = File(...), user_id: str = Form(None)):
             detail="File must be a CSV."
         )
 
-    # Save uploaded file to temp dir, named by user_id and file type
-    content = await file.read()
-    df = pd.read_csv(BytesIO(content))
-    print(f"DEBUG: Uploaded file columns: {list(df.columns)} shape: {df.shape}")
-    cols = set(df.columns)
-    if {"order_id", "user_id", "order_date", "Total cost"} <= cols:
-        file_type = "orders"
-    elif {"order_id", "product_id"} <= cols:
-        file_type = "order_products"
-    elif {"product_id", "product_name"} <= cols:
-        file_type = "products"
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Unknown schema in file {file.filename}"
-        )
     user_dir = os.path.join(UPLOAD_TMP_DIR, user_id)
     os.makedirs(user_dir, exist_ok=True)
-    file_path = os.path.join(user_dir, f"{file_type}.csv")
-    df.to_csv(file_path, index=False)
-    print(f"Saved {file_type} for user {user_id} to {file_path}")
-
-    # Check if all three files are present
-    expected = ["orders.csv", "order_products.csv", "products.csv"]
-    present = [os.path.exists(os.path.join(user_dir, f)) for f in expected]
-    if not all(present):
+
+    # Stream the upload to disk in chunks rather than holding it in memory
+    fd, raw_path = tempfile.mkstemp(suffix=".csv", dir=user_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                await run_in_threadpool(out.write, chunk)
+
+        # Only the header is needed to tell which of the three files this is
+        try:
+            columns = read_header(raw_path)
+        except ValueError:
+            # Not UTF-8 text
+            columns = []
+        print(f"DEBUG: Uploaded file columns: {columns}")
+        file_type = detect_file_type(columns)
+        if file_type is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown schema in file {file.filename}"
+            )
+
+        # Stage as Parquet, named by user_id and file type
+        file_path = staged_path(user_dir, file_type)
+        try:
+            rows, n_columns = await run_in_threadpool(csv_to_parquet, raw_path, file_path, columns)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Could not parse {file.filename}: {e}")
+    finally:
+        os.remove(raw_path)
+    print(f"Saved {file_type} for user {user_id} to {file_path} ({rows} rows)")
+
+    # Once all three files are present, move them into a directory of their own for the job
+    expected = ["orders", "order_products", "products"]
+    job_dir = claim_staged_files(user_dir, expected)
+    if job_dir is None:
         # Only acknowledge upload, don't process yet
-        return UploadResult(rows=len(df), columns=len(df.columns))
+        return UploadResult(rows=rows, columns=n_columns)
 
-    # All files present: process and upload
+    # All files present: merge and load in the background
     try:
-        dfs = {}
-        for fname in expected:
-            ftype = fname.replace(".csv", "")
-            dfs[ftype] = pd.read_csv(os.path.join(user_dir, fname))
-            print(f"DEBUG: {ftype} columns: {list(dfs[ftype].columns)} shape: {dfs[ftype].shape}")
-
-       
-        merged = dfs["order_products"].merge(dfs["products"], on="product_id", how="left")
-  
-        grouped = merged.groupby("order_id")["product_name"].apply(list).reset_index()
-        final_df = dfs["orders"].merge(grouped, on="order_id", how="left")
-        # Ensure column is renamed before upload
-        if "product_name" in final_df.columns:
-            final_df.rename(columns={"product_name": "products"}, inplace=True)
-        final_df["products"] = final_df["products"].apply(lambda x: x if isinstance(x, list) else [])
+        job = get_upload_job_manager().submit(
+            "upload", lambda job: _process_upload(job, user_id, job_dir, rows), user_id=user_id, rows=rows
+        )
+    except JobLimitReached as e:
+        release_staged_files(job_dir, user_dir, expected)
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return UploadResult(rows=rows, columns=n_columns, job_id=job.id)
 
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error merging files: {e}")
 
-    # --- Get next dataset_id ---
+def _process_upload(job: Job, user_id: str, job_dir: str, rows: int) -> dict:
+    """Merge the three files claimed into ``job_dir`` and load them as a new dataset.
+
+    Runs on an upload job thread; the CPU-bound assembly goes to the upload process pool and
+    the rest is waiting on BigQuery. Each stage is published as ``{"type": "stage", ...}``.
+    ``job_dir`` belongs to this job alone and is removed when it finishes.
+    """
     try:
-        query = f"SELECT MAX(dataset_id) AS last_id FROM {TABLE_ID}"
-        query_job = bq_client.query(query)
-        result = query_job.result()
-        last_id = next(result).last_id or 0
-        new_dataset_id = int(last_id) + 1
-    except Exception as e:
-        raise HTTPException(500, f"Failed to fetch last dataset_id: {e}")
-
-    final_df["dataset_id"] = new_dataset_id
-
-    # --- Step 4b: Insert new dataset record into Data Set table ---
-    # You may need to adjust how you get user_id depending on your auth system
-    from fastapi import Request, Depends
-    from fastapi.security import OAuth2PasswordBearer
-    # user_id is now received from the frontend form
-    DATASET_TABLE_ID = "pivotal-canto-466205-p6.intent_inference.Data sets"
-    dataset_row = [{
-        "dataset_id": new_dataset_id,
-        "Client_id": user_id,
-        "num of rows": len(df)
-    }]
-    # Convert to DataFrame and upload
-    dataset_df = pd.DataFrame(dataset_row)
-    dataset_json = dataset_df.to_json(orient="records", lines=True)
-    dataset_schema = [
-        bigquery.SchemaField("dataset_id", "INTEGER", mode="NULLABLE"),
-        bigquery.SchemaField("Client_id", "STRING", mode="NULLABLE"),
-        bigquery.SchemaField("num of rows", "INTEGER", mode="NULLABLE"),
-    ]
+        return _register_and_load(job, user_id, job_dir, rows)
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+
+def _register_and_load(job: Job, user_id: str, job_dir: str, rows: int) -> dict:
+    def stage(name: str, **info):
+        job.publish(json.dumps({"type": "stage", "stage": name, **info}))
+
+    bq_client = get_bigquery_client()
+
+    # --- Get next dataset_id (atomic, from the local catalog) ---
+    stage("allocating")
+    catalog = get_dataset_catalog()
     try:
-        dataset_job_config = bigquery.LoadJobConfig(
-            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
-            schema=dataset_schema,
-            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-        )
-        dataset_load_job = bq_client.load_table_from_file(
-            BytesIO(dataset_json.encode("utf-8")),
-            DATASET_TABLE_ID,
-            job_config=dataset_job_config,
-        )
-        dataset_load_job.result()
+        new_dataset_id = allocate_dataset_id(catalog, bq_client, DATASET_TABLE_ID, client_id=user_id)
     except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to add dataset record: {e}"
-        )
-
-    # --- Step 5: Convert to JSON ---
-    import json
+        raise RuntimeError(f"Failed to allocate dataset_id: {e}")
     try:
-        # Use final_df, not df, for upload
-        records = final_df.to_dict(orient="records")
-        json_lines = [json.dumps(row, default=str) for row in records]
-        json_data = "\n".join(json_lines)
+        result = _assemble_and_load(stage, bq_client, user_id, job_dir, rows, new_dataset_id)
     except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Failed to serialize data: {e}"
-        )
+        catalog.record(new_dataset_id, user_id, rows=rows, status=CATALOG_FAILED, error=str(e))
+        raise
+    catalog.record(new_dataset_id, user_id, rows=rows, orders=result["orders"])
+    return result
+
 
-    # --- Upload to BigQuery ---
+def _assemble_and_load(stage, bq_client, user_id: str, job_dir: str, rows: int, new_dataset_id: int) -> dict:
+    from google.cloud import bigquery
+
+    # --- Merge files into Orders rows (see basket_assembly) in a worker process ---
+    stage("assembling", dataset_id=new_dataset_id)
+    load_path = staged_path(job_dir, f"orders_load-{new_dataset_id}")
     try:
-        job_config = bigquery.LoadJobConfig(
-            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
-            schema=SCHEMA,
-            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-        )
-        load_job = bq_client.load_table_from_file(
-            BytesIO(json_data.encode("utf-8")), TABLE_ID, job_config=job_config
-        )
-        load_job.result()
+        counts = get_upload_pool().submit(
+            build_orders_file, job_dir, SCHEMA, load_path, dataset_id=new_dataset_id
+        ).result()
     except Exception as e:
-        raise HTTPException(500, f"BigQuery upload failed: {e}")
-
-    # Optional local store
-    storage.set_baskets(final_df.to_dict(orient="records"))
+        raise RuntimeError(f"Error merging files: {e}")
 
-    return UploadResult(rows=len(df), columns=len(df.columns))
+    try:
+        # --- Step 4b: Insert new dataset record into Data Set table ---
+        stage("registering", dataset_id=new_dataset_id, **counts)
+        dataset_row = [{
+            "dataset_id": new_dataset_id,
+            "Client_id": user_id,
+            "num of rows": rows
+        }]
+        # Convert to DataFrame and upload
+        dataset_df = pd.DataFrame(dataset_row)
+        dataset_json = dataset_df.to_json(orient="records", lines=True)
+        dataset_schema = [
+            bigquery.SchemaField("dataset_id", "INTEGER", mode="NULLABLE"),
+            bigquery.SchemaField("Client_id", "STRING", mode="NULLABLE"),
+            bigquery.SchemaField("num of rows", "INTEGER", mode="NULLABLE"),
+        ]
+        try:
+            dataset_job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+                schema=dataset_schema,
+                write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+            )
+            dataset_load_job = bq_client.load_table_from_file(
+                BytesIO(dataset_json.encode("utf-8")),
+                DATASET_TABLE_ID,
+                job_config=dataset_job_config,
+            )
+            dataset_load_job.result()
+        except Exception as e:
+            raise RuntimeError(f"Failed to add dataset record: {e}")
+
+        # --- Step 5: Load the Parquet file into BigQuery ---
+        stage("loading", dataset_id=new_dataset_id, **counts)
+        try:
+            loaded = load_parquet(bq_client, load_path, TABLE_ID, orders_schema())
+        except Exception as e:
+            raise RuntimeError(f"BigQuery upload failed: {e}")
+
+        # Optional local store
+        stage("storing", dataset_id=new_dataset_id, **counts)
+        storage.set_baskets(pq.read_table(load_path), user_id=user_id, dataset_id=new_dataset_id)
+    finally:
+        if os.path.exists(load_path):
+            os.remove(load_path)
+
+    return {"dataset_id": new_dataset_id, "rows": rows, "loaded_rows": loaded, **counts}
+
+
+@router.get("/upload/jobs/{job_id}")
+def get_upload_job(job_id: str):
+    """Status of an upload's merge-and-load job: current stage, row counts and, once done, the dataset_id."""
+    job = get_upload_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.snapshot()
@@ -1,8 +1,12 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 class UploadResult(BaseModel):
     rows: int
     columns: int
+    # Set once all three files are in: follow processing at GET /upload/jobs/{job_id}
+    job_id: Optional[str] = None
 
 class ProcessResult(BaseModel):
     processed_baskets: int
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException, status
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, status
 from pydantic import BaseModel
 # from app.schemas.intent import ProcessResult
 from app.services import storage, inference
+from app.services.dataset_catalog import get_dataset_catalog
 
 router = APIRouter()
 
@@ -19,8 +22,13 @@ class AggregateRow(BaseModel):
     count: int
 
 @router.post("/process", response_model=ProcessResult)
-async def process_baskets():
-    baskets = storage.get_baskets()
+async def process_baskets(
+    user_id: str = Query(..., description="Owner of the baskets"),
+    dataset_id: Optional[int] = Query(None, description="Dataset to process (defaults to the user's latest)"),
+):
+    if dataset_id is None:
+        dataset_id = get_dataset_catalog().latest_for_client(user_id)
+    baskets = storage.get_baskets(user_id, dataset_id) if dataset_id is not None else []
     if not baskets:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -28,7 +36,8 @@ async def process_baskets():
         )
 
     results = inference.infer_intent(baskets)
-    storage.set_intents(results)
+    # Stored next to the baskets, so co-occurrence counts can join them
+    storage.set_intents(results, user_id, dataset_id)
 
     unique_intents = len(set(item["intent"] for item in results))
     return ProcessResult(
@@ -0,0 +1,164 @@
+import hashlib
+import itertools
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services import model_store
+from app.utils.config import ARIMA_SEARCH_BUDGET_SECONDS, ARIMA_SEARCH_WORKERS
+
+
+Order = Tuple[int, int, int]
+SeasonalOrder = Tuple[int, int, int, int]
+
+
+def difference_order(stationarity: Optional[Dict[str, Any]], values: np.ndarray, alpha: float = 0.05) -> int:
+    """Pick ``d`` from an ADF test: 0 if the series is stationary, otherwise 1.
+
+    Reuses the ``stationarity`` block from ``run_diagnostics`` when given, so the ADF test
+    is not run twice.
+    """
+    if stationarity is None:
+        from statsmodels.tsa.stattools import adfuller
+        p_value = float(adfuller(values)[1])
+    else:
+        p_value = float(stationarity['p_value'])
+    return 0 if p_value < alpha else 1
+
+
+def candidate_orders(d: int, season: int, seasonal_D: int,
+                     max_p: int = 2, max_q: int = 2, max_P: int = 1, max_Q: int = 1) -> List[Tuple[Order, SeasonalOrder]]:
+    """All (p,d,q)(P,D,Q,s) candidates, simplest first so a budget cut keeps the cheap ones."""
+    candidates = []
+    for p, q in itertools.product(range(max_p + 1), range(max_q + 1)):
+        if season >= 2:
+            for P, Q in itertools.product(range(max_P + 1), range(max_Q + 1)):
+                seasonal = (P, seasonal_D, Q, season) if (P or seasonal_D or Q) else (0, 0, 0, 0)
+                candidates.append(((p, d, q), seasonal))
+        else:
+            candidates.append(((p, d, q), (0, 0, 0, 0)))
+    # Deduplicate (P=Q=D=0 collapses to the non-seasonal model) and order by complexity
+    unique = list(dict.fromkeys(candidates))
+    return sorted(unique, key=lambda c: sum(c[0]) + sum(c[1][:3]))
+
+
+def _fit_aic(values: np.ndarray, order: Order, seasonal_order: SeasonalOrder,
+             deadline: Optional[float] = None) -> Optional[float]:
+    """Process-pool worker: AIC of one candidate model.
+
+    Returns None without fitting once ``deadline`` (a ``time.time()`` value) has passed, so
+    candidates still queued for a search that ran out of budget cost nothing.
+    """
+    if deadline is not None and time.time() >= deadline:
+        return None
+    import warnings
+    from statsmodels.tsa.arima.model import ARIMA
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return float(ARIMA(values, order=order, seasonal_order=seasonal_order).fit().aic)
+
+
+def _warm_worker() -> None:
+    """Pool initializer: import statsmodels once per worker, not inside a search's budget."""
+    import statsmodels.tsa.arima.model  # noqa: F401
+
+
+# Persistent pool of spawned workers shared by all searches. A search that runs out of budget
+# abandons its candidates: queued ones return at once (see ``_fit_aic``) and results of the
+# ones still running are dropped, so the pool stays warm for the next search.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _search_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+
+            _pool = multiprocessing.get_context("spawn").Pool(processes=max(1, ARIMA_SEARCH_WORKERS),
+                                                              initializer=_warm_worker)
+        return _pool
+
+
+def data_version(values: np.ndarray) -> str:
+    """Version of a series for caching its order when no date-based version is given."""
+    return hashlib.sha1(np.ascontiguousarray(values, dtype=float).tobytes()).hexdigest()
+
+
+def select_order(values: np.ndarray,
+                 series_id: Optional[str] = None,
+                 stationarity: Optional[Dict[str, Any]] = None,
+                 seasonality_strength: Optional[float] = None,
+                 season: int = 7,
+                 budget: Optional[float] = None,
+                 version: Optional[str] = None) -> Dict[str, Any]:
+    """Choose an ARIMA order by AIC, fitting candidates in parallel within a wall-clock budget.
+
+    ``d`` comes from the ADF result and seasonal differencing is only tried when the STL
+    seasonality strength from ``run_diagnostics`` is noticeable. Candidates are fitted in a
+    persistent pool of ``ARIMA_SEARCH_WORKERS`` processes shared by concurrent searches; the
+    budget starts once the pool exists, and candidates not finished when it runs out are
+    abandoned and discarded.
+
+    With ``series_id`` the choice is kept in ``model_store`` for the series' data ``version``
+    (e.g. its last date and length; a hash of ``values`` by default) and returned directly on
+    later calls with the same data.
+    """
+    values = np.asarray(values, dtype=float)
+    if series_id:
+        version = version or data_version(values)
+        cached = model_store.get_arima_order(series_id, version)
+        if cached is not None:
+            return {**cached, 'cached': True}
+
+    budget = ARIMA_SEARCH_BUDGET_SECONDS if budget is None else budget
+    d = difference_order(stationarity, values)
+    seasonal_D = 1 if seasonality_strength is not None and seasonality_strength >= 0.3 else 0
+    if len(values) < 3 * season:
+        season = 0
+    candidates = candidate_orders(d, season, seasonal_D)
+
+    pool = _search_pool()
+    start = time.perf_counter()
+    deadline = start + budget
+    worker_deadline = time.time() + budget
+    scores: List[Tuple[float, Order, SeasonalOrder]] = []
+    # Each search collects its own callbacks; once it stops reading, late results are ignored
+    finished: "queue.Queue[Tuple[Tuple[Order, SeasonalOrder], Optional[float]]]" = queue.Queue()
+    for candidate in candidates:
+        pool.apply_async(_fit_aic, (values, *candidate, worker_deadline),
+                         callback=lambda aic, c=candidate: finished.put((c, aic)),
+                         error_callback=lambda e, c=candidate: finished.put((c, None)))
+    received = 0
+    while received < len(candidates):
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        try:
+            (order, seasonal), aic = finished.get(timeout=remaining)
+        except queue.Empty:
+            break
+        received += 1
+        if aic is not None and np.isfinite(aic):
+            scores.append((aic, order, seasonal))
+
+    if not scores:
+        raise ValueError(f'No ARIMA candidate finished within {budget}s')
+
+    aic, order, seasonal = min(scores)
+    selection = {
+        'order': order,
+        'seasonal_order': seasonal,
+        'aic': aic,
+        'evaluated': len(scores),
+        'candidates': len(candidates),
+        'search_seconds': time.perf_counter() - start,
+    }
+    if series_id:
+        model_store.save_arima_order(series_id, version, selection)
+    return {**selection, 'cached': False}
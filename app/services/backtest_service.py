@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Union
+
+from app.services.forecast_service import get_forecast_pool
+from app.services.series import DailySeries, as_daily_series
+
+
+def fold_origins(n: int, horizon: int, n_folds: int, min_train: int) -> np.ndarray:
+    """Return the index where each fold's test window starts (train is everything before it).
+
+    Origins are spaced ``horizon`` apart and end so the last fold's test window touches the
+    end of the series. Folds that would leave fewer than ``min_train`` training points are dropped.
+    """
+    last = n - horizon
+    origins = last - horizon * np.arange(n_folds)[::-1]
+    return origins[origins >= min_train]
+
+
+def _window_matrix(y: np.ndarray, starts: np.ndarray, horizon: int) -> np.ndarray:
+    return y[starts[:, None] + np.arange(horizon)]
+
+
+def naive_forecasts(y: np.ndarray, origins: np.ndarray, horizon: int) -> np.ndarray:
+    """Last observed value repeated over the horizon, for every fold at once -> (folds, horizon)."""
+    return np.repeat(y[origins - 1][:, None], horizon, axis=1)
+
+
+def seasonal_naive_forecasts(y: np.ndarray, origins: np.ndarray, horizon: int, season: int) -> np.ndarray:
+    """Value from the same point of the previous season, for every fold at once -> (folds, horizon)."""
+    offsets = np.arange(horizon) % season - season
+    return y[origins[:, None] + offsets]
+
+
+def rmse_2d(actual: np.ndarray, forecast: np.ndarray) -> np.ndarray:
+    return np.sqrt(np.mean((actual - forecast) ** 2, axis=1))
+
+
+def mase_2d(actual: np.ndarray, forecast: np.ndarray) -> np.ndarray:
+    """Row-wise equivalent of ``forecast_service.mase``."""
+    if actual.shape[1] < 2:
+        return np.full(actual.shape[0], np.nan)
+    mae_naive = np.mean(np.abs(np.diff(actual, axis=1)), axis=1)
+    mae_model = np.mean(np.abs(actual - forecast), axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(mae_naive != 0, mae_model / mae_naive, np.inf)
+
+
+def smape_2d(actual: np.ndarray, forecast: np.ndarray) -> np.ndarray:
+    """Row-wise equivalent of ``forecast_service.smape``."""
+    denom = np.abs(actual) + np.abs(forecast)
+    denom[denom == 0] = 1e-8
+    return 100.0 / actual.shape[1] * np.sum(2.0 * np.abs(forecast - actual) / denom, axis=1)
+
+
+def _fit_fold(model: str, dates: np.ndarray, train: np.ndarray, future_dates: np.ndarray) -> np.ndarray:
+    """Process-pool worker: fit one model on one fold's training window and forecast its test window.
+
+    ``future_dates`` are the series' own dates for the test window, so date-based models are
+    evaluated where the actual values lie even when the daily series has gaps.
+    """
+    horizon = len(future_dates)
+    if model == 'ARIMA':
+        from statsmodels.tsa.arima.model import ARIMA
+        fitted = ARIMA(train, order=(1, 1, 1)).fit()
+        return np.asarray(fitted.forecast(steps=horizon), dtype=float)
+    if model == 'TrendSeasonal':
+        from app.services.forecast_service import trend_seasonal_forecast
+        train_series = pd.Series(train, index=pd.DatetimeIndex(dates))
+        return trend_seasonal_forecast(train_series, pd.DatetimeIndex(future_dates))
+    if model == 'Prophet':
+        from prophet import Prophet
+        m = Prophet()
+        m.fit(pd.DataFrame({'ds': dates, 'y': train}))
+        return np.asarray(m.predict(pd.DataFrame({'ds': future_dates}))['yhat'].values, dtype=float)
+    raise ValueError(f'Unknown model: {model}')
+
+
+def _score(origins: np.ndarray, index: pd.DatetimeIndex, actual: np.ndarray, forecast: np.ndarray) -> Dict[str, Any]:
+    rmse, mase_vals, smape_vals = rmse_2d(actual, forecast), mase_2d(actual, forecast), smape_2d(actual, forecast)
+    folds = [
+        {
+            'test_start': str(index[o]),
+            'RMSE': float(rmse[i]),
+            'MASE': float(mase_vals[i]),
+            'sMAPE': float(smape_vals[i]),
+        }
+        for i, o in enumerate(origins)
+    ]
+    return {
+        'folds': folds,
+        'mean': {
+            'RMSE': float(np.mean(rmse)),
+            'MASE': float(np.mean(mase_vals)),
+            'sMAPE': float(np.mean(smape_vals)),
+        },
+    }
+
+
+def run_backtest(df: Union[pd.DataFrame, DailySeries],
+                 horizon: int = 7,
+                 n_folds: int = 5,
+                 window: str = 'expanding',
+                 train_size: Optional[int] = None,
+                 season: int = 7,
+                 models: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Rolling-origin backtest of the forecast models.
+
+    The series is cut at ``n_folds`` origins spaced ``horizon`` days apart. With an ``expanding``
+    window each fold trains on everything before its origin; with ``sliding`` it trains on the
+    last ``train_size`` points only. Naive and seasonal-naive forecasts and all metrics are computed
+    for every fold at once as 2-D NumPy arrays; ARIMA, TrendSeasonal and (if listed in ``models``)
+    Prophet folds are fitted in the shared forecast process pool. Returns per-fold and mean RMSE, MASE
+    and sMAPE for each model.
+    """
+    if window not in ('expanding', 'sliding'):
+        raise ValueError("window must be 'expanding' or 'sliding'")
+    if horizon < 1 or n_folds < 1:
+        raise ValueError('horizon and n_folds must be positive')
+
+    series = as_daily_series(df)
+    y = series.values
+    index = series.ts.index
+    n = len(y)
+
+    min_train = max(season, 3)
+    if window == 'sliding':
+        train_size = int(train_size or max(min_train, 4 * horizon))
+        min_train = max(min_train, train_size)
+    origins = fold_origins(n, horizon, n_folds, min_train)
+    if len(origins) == 0:
+        raise ValueError(f'Not enough observations for a backtest with horizon={horizon} (have {n})')
+
+    actual = _window_matrix(y, origins, horizon)
+    results: Dict[str, Any] = {
+        'Naive': _score(origins, index, actual, naive_forecasts(y, origins, horizon)),
+        'SeasonalNaive': _score(origins, index, actual, seasonal_naive_forecasts(y, origins, horizon, season)),
+    }
+
+    models = ['ARIMA', 'TrendSeasonal'] if models is None else models
+    if models:
+        starts = origins - train_size if window == 'sliding' else np.zeros_like(origins)
+        dates = index.to_numpy()
+        pool = get_forecast_pool()
+        futures = {
+            model: [pool.submit(_fit_fold, model, dates[s:o], y[s:o], dates[o:o + horizon])
+                    for s, o in zip(starts, origins)]
+            for model in models
+        }
+        for model, model_futures in futures.items():
+            try:
+                forecast = np.vstack([f.result() for f in model_futures])
+                results[model] = _score(origins, index, actual, forecast)
+            except Exception as e:
+                for f in model_futures:
+                    f.cancel()
+                results[model] = {'error': f'{model} failed: {str(e)}'}
+
+    results['_meta'] = {
+        'window': window,
+        'horizon': int(horizon),
+        'folds': int(len(origins)),
+        'train_size': int(train_size) if window == 'sliding' else None,
+    }
+    return results
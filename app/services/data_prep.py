@@ -1,22 +1,128 @@
+from typing import Optional, Tuple
 
-from typing import Optional
-from google.oauth2 import service_account
-
+import glob
+import hashlib
+import os
+import threading
+import time
 
 import pandas as pd
+from cachetools import TTLCache
+
+from app.utils.clients import get_bigquery_client
+from app.utils.config import FETCH_CACHE_DIR, FETCH_CACHE_TTL_SECONDS, FETCH_CACHE_MAX_ENTRIES
 
 try:
-    from google.cloud import bigquery
+    from google.api_core.exceptions import NotFound
 except Exception:  # pragma: no cover - optional dependency
-    bigquery = None
+    NotFound = LookupError
+
+
+SOURCE_TABLE = "pivotal-canto-466205-p6.intent_inference.predictive_analysis"
+DAILY_VIEW = "pivotal-canto-466205-p6.intent_inference.predictive_analysis_daily"
+
+# Seconds between table metadata lookups used to detect a changed source table.
+_VERSION_CHECK_SECONDS = 30
+
+# In-memory LRU (with TTL) in front of the Parquet files in FETCH_CACHE_DIR.
+_memory_cache: TTLCache = TTLCache(maxsize=FETCH_CACHE_MAX_ENTRIES, ttl=FETCH_CACHE_TTL_SECONDS)
+_version_cache: TTLCache = TTLCache(maxsize=8, ttl=_VERSION_CHECK_SECONDS)
+_cache_lock = threading.Lock()
+
+
+def _make_client():
+    key_path = r"C:\Users\raguk\Downloads\Document from Ilam.json"
+    return get_bigquery_client(project="pivotal-canto-466205-p6", credentials_path=key_path)
+
+
+def _source_version(client, table: str = SOURCE_TABLE) -> str:
+    """Return a token that changes whenever ``table`` (the object a query reads) is modified.
+
+    Uses the table's metadata, which is far cheaper than scanning it: the last refresh time
+    for a materialized view, else its ``modified`` timestamp. A missing view is versioned by
+    ``SOURCE_TABLE``, which the fallback queries read instead. Lookups are throttled to one
+    per ``_VERSION_CHECK_SECONDS`` per table.
+    """
+    with _cache_lock:
+        version = _version_cache.get(table)
+    if version is not None:
+        return version
+
+    try:
+        meta = client.get_table(table)
+        modified = getattr(meta, "mview_last_refresh_time", None) or meta.modified
+        version = str(int(modified.timestamp())) if modified is not None else "0"
+    except NotFound:
+        version = _source_version(client, SOURCE_TABLE) if table != SOURCE_TABLE else "0"
+    except Exception:
+        # If metadata is unavailable, fall back to TTL-only expiry
+        version = "0"
+
+    with _cache_lock:
+        _version_cache[table] = version
+    return version
+
+
+def _cache_key(category: Optional[str], product: Optional[str], limit: Optional[int], daily: bool = False) -> str:
+    # limit counts days in daily mode and rows otherwise, so the mode is part of the key
+    raw = f"{category}|{product}|{int(limit) if limit else None}|{'daily' if daily else 'rows'}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _disk_path(key: str, version: str) -> str:
+    return os.path.join(FETCH_CACHE_DIR, f"{key}-{version}.parquet")
+
+
+def _read_disk(key: str, version: str) -> Optional[pd.DataFrame]:
+    path = _disk_path(key, version)
+    try:
+        if time.time() - os.path.getmtime(path) > FETCH_CACHE_TTL_SECONDS:
+            return None
+        return pd.read_parquet(path)
+    except Exception:
+        return None
+
+
+def _write_disk(key: str, version: str, df: pd.DataFrame) -> None:
+    try:
+        os.makedirs(FETCH_CACHE_DIR, exist_ok=True)
+        # Drop files for older versions of the same selection
+        for stale in glob.glob(os.path.join(FETCH_CACHE_DIR, f"{key}-*.parquet")):
+            os.remove(stale)
+        path = _disk_path(key, version)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"WARNING: could not write fetch cache file: {e}")
+
+
+def clear_fetch_cache(remove_files: bool = True) -> None:
+    """Drop all cached fetch results (in memory and, optionally, on disk)."""
+    with _cache_lock:
+        _memory_cache.clear()
+        _version_cache.clear()
+    if remove_files:
+        for path in glob.glob(os.path.join(FETCH_CACHE_DIR, "*.parquet")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
 
 
 def fetch_data_from_bigquery(category: Optional[str] = None,
                              product: Optional[str] = None,
                              limit: Optional[int] = None,
-                             client: Optional[object] = None) -> pd.DataFrame:
+                             client: Optional[object] = None,
+                             use_cache: bool = True,
+                             daily: bool = False) -> pd.DataFrame:
     """Fetch data from BigQuery for a given category or product.
 
+    Results are cached per (category, product, limit): first in an in-memory LRU, then
+    as Parquet files in ``FETCH_CACHE_DIR``. Entries expire after ``FETCH_CACHE_TTL_SECONDS``
+    or as soon as the object queried (``DAILY_VIEW`` when ``daily``, else ``SOURCE_TABLE``)
+    is modified or refreshed.
+
     Parameters
     ----------
     category : Optional[str]
@@ -24,24 +130,94 @@ def fetch_data_from_bigquery(category: Optional[str] = None,
     product : Optional[str]
         Product_Name value to filter the query. If None, no product filter is applied.
     limit : Optional[int]
-        Optional LIMIT to reduce returned rows.
+        Optional LIMIT on the result. Without ``daily`` this is a number of source rows; with
+        ``daily`` it is a number of days (the earliest ``limit`` dates), since each result row
+        is one day.
     client : Optional[bigquery.Client]
         Optional BigQuery client instance (useful for testing/mocking). If not provided,
         a new client is created using default credentials.
+    use_cache : bool
+        Set to False to bypass the cache and always query BigQuery.
+    daily : bool
+        If True, return only the daily revenue series (one row per Date), aggregated
+        in SQL from ``DAILY_VIEW``. This is all the diagnostics and forecast services need.
 
     Returns
     -------
     pd.DataFrame
-        DataFrame with columns Date, Category, Product_Name, Quantity, Unit_Price, Total_Price
+        DataFrame with columns Date, Category, Product_Name, Quantity, Unit_Price, Total_Price,
+        or just Date and Total Price when ``daily`` is True.
     """
-    key_path = r"C:\Users\raguk\Downloads\Document from Ilam.json"
-    credentials = service_account.Credentials.from_service_account_file(key_path)
+    if client is None:
+        client = _make_client()
+
+    query_fn = _query_daily if daily else _query_sales
+    if not use_cache:
+        return query_fn(client, category, product, limit)
+
+    key = _cache_key(category, product, limit, daily)
+    table = DAILY_VIEW if daily else SOURCE_TABLE
+    return _cached_query(client, key, table, lambda: query_fn(client, category, product, limit))
+
+
+GROUP_COLUMNS = {"category": "Product Category", "product": "Product Name"}
 
-    client = bigquery.Client(credentials=credentials, project="pivotal-canto-466205-p6")
 
-    query = """
+def fetch_daily_by_group(group_by: str = "category",
+                         client: Optional[object] = None,
+                         use_cache: bool = True) -> pd.DataFrame:
+    """Fetch the daily revenue series of every category or product in a single query.
+
+    Parameters
+    ----------
+    group_by : str
+        Either "category" or "product".
+    client : Optional[bigquery.Client]
+        Optional BigQuery client instance. If not provided, a new client is created.
+    use_cache : bool
+        Set to False to bypass the cache and always query BigQuery.
+
+    Returns
+    -------
+    pd.DataFrame
+        Long-format DataFrame with columns Date, group and Total Price, ordered by group then Date.
+    """
+    if group_by not in GROUP_COLUMNS:
+        raise ValueError(f"group_by must be one of {sorted(GROUP_COLUMNS)}")
+    if client is None:
+        client = _make_client()
+
+    if not use_cache:
+        return _query_daily_by_group(client, group_by)
+
+    key = hashlib.sha1(f"groups|{group_by}".encode("utf-8")).hexdigest()
+    return _cached_query(client, key, DAILY_VIEW, lambda: _query_daily_by_group(client, group_by))
+
+
+def _cached_query(client, key: str, table: str, run) -> pd.DataFrame:
+    """Return the frame cached under ``key`` for the current version of ``table``, or ``run()`` it."""
+    version = _source_version(client, table)
+    mem_key: Tuple[str, str] = (key, version)
+
+    with _cache_lock:
+        cached = _memory_cache.get(mem_key)
+    if cached is not None:
+        return cached.copy()
+
+    df = _read_disk(key, version)
+    if df is None:
+        df = run()
+        _write_disk(key, version, df)
+
+    with _cache_lock:
+        _memory_cache[mem_key] = df
+    return df.copy()
+
+
+def _query_sales(client, category: Optional[str], product: Optional[str], limit: Optional[int]) -> pd.DataFrame:
+    query = f"""
         SELECT `Date`, `Product Category`, `Product Name`, `Units Sold`, `Unit Price`, `Total Revenue`, `Region`, `Payment Method`
-        FROM `pivotal-canto-466205-p6.intent_inference.predictive_analysis`
+        FROM `{SOURCE_TABLE}`
         WHERE 1=1
     """
 
@@ -53,3 +229,66 @@ def fetch_data_from_bigquery(category: Optional[str] = None,
     query += " ORDER BY `Date`"
     if limit:
         query += f" LIMIT {int(limit)}"
+
+    df = client.query(query).to_dataframe()
+    # Downstream services aggregate on 'Total Price'
+    return df.rename(columns={"Total Revenue": "Total Price"})
+
+
+def _query_daily(client, category: Optional[str], product: Optional[str], limit: Optional[int]) -> pd.DataFrame:
+    def build(table: str, revenue_col: str) -> str:
+        query = f"""
+            SELECT `Date`, SUM(`{revenue_col}`) AS `Total Price`
+            FROM `{table}`
+            WHERE 1=1
+        """
+        if category:
+            query += f" AND `Product Category` = '{category}'"
+        if product:
+            query += f" AND `Product Name` = '{product}'"
+        query += " GROUP BY `Date` ORDER BY `Date`"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        return query
+
+    try:
+        return client.query(build(DAILY_VIEW, "Total Price")).to_dataframe()
+    except NotFound:
+        # View not created yet: aggregate from the raw table instead
+        print(f"WARNING: {DAILY_VIEW} not found, aggregating from {SOURCE_TABLE}. Run ensure_daily_view() to create it.")
+        return client.query(build(SOURCE_TABLE, "Total Revenue")).to_dataframe()
+
+
+def _query_daily_by_group(client, group_by: str) -> pd.DataFrame:
+    column = GROUP_COLUMNS[group_by]
+
+    def build(table: str, revenue_col: str) -> str:
+        return f"""
+            SELECT `Date`, `{column}` AS `group`, SUM(`{revenue_col}`) AS `Total Price`
+            FROM `{table}`
+            GROUP BY `Date`, `group`
+            ORDER BY `group`, `Date`
+        """
+
+    try:
+        return client.query(build(DAILY_VIEW, "Total Price")).to_dataframe()
+    except NotFound:
+        print(f"WARNING: {DAILY_VIEW} not found, aggregating from {SOURCE_TABLE}. Run ensure_daily_view() to create it.")
+        return client.query(build(SOURCE_TABLE, "Total Revenue")).to_dataframe()
+
+
+def ensure_daily_view(client: Optional[object] = None) -> None:
+    """Create the materialized daily-aggregate view read by ``fetch_data_from_bigquery(daily=True)``.
+
+    BigQuery keeps the materialized view in sync with ``SOURCE_TABLE``, so this only needs
+    to run once per project.
+    """
+    if client is None:
+        client = _make_client()
+    ddl = f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS `{DAILY_VIEW}` AS
+        SELECT `Date`, `Product Category`, `Product Name`, SUM(`Total Revenue`) AS `Total Price`
+        FROM `{SOURCE_TABLE}`
+        GROUP BY `Date`, `Product Category`, `Product Name`
+    """
+    client.query(ddl).result()
@@ -0,0 +1,237 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from cachetools import TTLCache
+
+from app.utils.config import DATASET_CATALOG_PATH, DATASET_CATALOG_REFRESH_SECONDS
+
+
+# allocate() relies on UPDATE ... RETURNING
+if sqlite3.sqlite_version_info < (3, 35, 0):
+    raise RuntimeError(
+        f"The dataset catalog needs SQLite 3.35 or newer (UPDATE ... RETURNING); "
+        f"this Python is linked against SQLite {sqlite3.sqlite_version}"
+    )
+
+ALLOCATED = "allocated"
+READY = "ready"
+FAILED = "failed"
+
+DATASET_FIELDS = ("dataset_id", "client_id", "rows", "orders", "status", "error", "created_at", "updated_at")
+
+
+class DatasetCatalog:
+    """Local SQLite index of uploaded datasets and the dataset_id sequence.
+
+    ``allocate`` hands out ids with a single ``UPDATE ... RETURNING``, so concurrent uploads
+    (threads or worker processes sharing the file) never get the same id. The warehouse's
+    ``Data sets`` table stays the record of truth: the catalog is backfilled from it once
+    (``sync``), the sequence is raised to its ``MAX(dataset_id)`` before every allocation and
+    per-client lookups are refreshed from it (``allocate_dataset_id``, ``latest_dataset_id``).
+
+    That re-sync keeps ids written by other hosts or other write paths from being reissued
+    once they are in ``Data sets``. Two hosts allocating at the same moment, each with its own
+    catalog file, can still pick the same id, so deployments that allocate from several hosts
+    must share one catalog file (``DATASET_CATALOG_PATH``).
+    """
+
+    def __init__(self, path: str = DATASET_CATALOG_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dataset_sequence ("
+                " name TEXT PRIMARY KEY,"
+                " last_id INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS datasets ("
+                " dataset_id INTEGER PRIMARY KEY,"
+                " client_id TEXT,"
+                " rows INTEGER,"
+                " orders INTEGER,"
+                " status TEXT NOT NULL,"
+                " error TEXT,"
+                " created_at TEXT NOT NULL,"
+                " updated_at TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS datasets_client ON datasets (client_id, status, dataset_id)"
+            )
+
+    @property
+    def seeded(self) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM dataset_sequence WHERE name = 'dataset_id'"
+            ).fetchone() is not None
+
+    def seed(self, last_id: int) -> None:
+        """Make sure the next allocated id is above ``last_id`` (ids are never handed out twice)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO dataset_sequence (name, last_id) VALUES ('dataset_id', ?)"
+                " ON CONFLICT (name) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)",
+                (int(last_id),),
+            )
+
+    def allocate(self, client_id: Optional[str] = None) -> int:
+        """Reserve the next dataset_id and register it as ``allocated`` for ``client_id``.
+
+        The id is also kept above every dataset already in the catalog (a primary-key seek), so
+        backfilled datasets are never reissued.
+        """
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO dataset_sequence (name, last_id) VALUES ('dataset_id', 0)")
+            (dataset_id,) = self._conn.execute(
+                "UPDATE dataset_sequence"
+                " SET last_id = MAX(last_id, (SELECT COALESCE(MAX(dataset_id), 0) FROM datasets)) + 1"
+                " WHERE name = 'dataset_id' RETURNING last_id"
+            ).fetchone()
+            self._conn.execute(
+                "INSERT INTO datasets (dataset_id, client_id, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (dataset_id, client_id, ALLOCATED, now, now),
+            )
+        return dataset_id
+
+    def record(self, dataset_id: int, client_id: Optional[str], rows: Optional[int] = None,
+               orders: Optional[int] = None, status: str = READY, error: Optional[str] = None) -> None:
+        """Insert or update a dataset, e.g. when finishing an upload or backfilling from the warehouse."""
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO datasets (dataset_id, client_id, rows, orders, status, error, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (dataset_id) DO UPDATE SET"
+                " client_id = COALESCE(excluded.client_id, client_id),"
+                " rows = COALESCE(excluded.rows, rows),"
+                " orders = COALESCE(excluded.orders, orders),"
+                " status = excluded.status, error = excluded.error, updated_at = excluded.updated_at",
+                (int(dataset_id), client_id, rows, orders, status, error, now, now),
+            )
+
+    def record_many(self, datasets: Iterable[Tuple[int, Optional[str], Optional[int]]]) -> None:
+        """Backfill ``(dataset_id, client_id, rows)`` tuples as ready, keeping what is already known."""
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO datasets (dataset_id, client_id, rows, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(int(dataset_id), client_id, rows, READY, now, now) for dataset_id, client_id, rows in datasets],
+            )
+
+    def get(self, dataset_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(DATASET_FIELDS)} FROM datasets WHERE dataset_id = ?", (int(dataset_id),),
+            ).fetchone()
+        return dict(zip(DATASET_FIELDS, row)) if row else None
+
+    def latest_for_client(self, client_id: str) -> Optional[int]:
+        """Newest ready dataset_id of ``client_id`` (an index seek), or None if none is known."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dataset_id FROM datasets WHERE client_id = ? AND status = ?"
+                " ORDER BY dataset_id DESC LIMIT 1",
+                (client_id, READY),
+            ).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def sync(catalog: DatasetCatalog, bq_client, datasets_table: str) -> int:
+    """Backfill ``catalog`` from the warehouse's datasets table and seed the id sequence.
+
+    Reads one row per dataset (not the Orders table), so it is cheap, and is only needed once
+    per catalog file; afterwards ``allocate_dataset_id`` and ``latest_dataset_id`` keep it
+    current. Returns the highest dataset_id seen.
+    """
+    rows = bq_client.query(
+        f"SELECT dataset_id, Client_id, `num of rows` AS num_rows FROM `{datasets_table}`"
+        " WHERE dataset_id IS NOT NULL"
+    ).result()
+    datasets = [(row.dataset_id, row.Client_id, row.num_rows) for row in rows]
+    catalog.record_many(datasets)
+    last_id = max((dataset_id for dataset_id, _, _ in datasets), default=0)
+    catalog.seed(last_id)
+    return last_id
+
+
+def max_dataset_id(bq_client, datasets_table: str) -> int:
+    """Highest dataset_id in the warehouse's datasets table (one aggregate row, cheap to scan)."""
+    rows = bq_client.query(f"SELECT MAX(dataset_id) AS max_id FROM `{datasets_table}`").result()
+    row = next(iter(rows), None)
+    return int(row.max_id) if row is not None and row.max_id is not None else 0
+
+
+def allocate_dataset_id(catalog: DatasetCatalog, bq_client, datasets_table: str,
+                        client_id: Optional[str] = None) -> int:
+    """Next dataset_id, above every id the warehouse already has.
+
+    The first call on a catalog backfills it from the warehouse (``sync``); later calls only
+    re-read ``MAX(dataset_id)``, so ids registered by other hosts or write paths are skipped.
+    """
+    if not catalog.seeded:
+        sync(catalog, bq_client, datasets_table)
+    else:
+        catalog.seed(max_dataset_id(bq_client, datasets_table))
+    return catalog.allocate(client_id)
+
+
+# (catalog path, client_id) pairs refreshed from the warehouse within the last TTL
+_refreshed: TTLCache = TTLCache(maxsize=4096, ttl=DATASET_CATALOG_REFRESH_SECONDS)
+_refreshed_lock = threading.Lock()
+
+
+def latest_dataset_id(catalog: DatasetCatalog, bq_client, datasets_table: str, client_id: str) -> Optional[int]:
+    """Newest ready dataset_id of ``client_id``, refreshed from the warehouse at most once per TTL.
+
+    Datasets loaded by another host or write path reach the local catalog within
+    ``DATASET_CATALOG_REFRESH_SECONDS``. What the catalog already knows (e.g. an upload still
+    loading here) is kept as is.
+    """
+    key = (catalog.path, client_id)
+    with _refreshed_lock:
+        fresh = key in _refreshed
+    if not fresh:
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("client_id", "STRING", client_id)]
+        )
+        rows = bq_client.query(
+            f"SELECT dataset_id, `num of rows` AS num_rows FROM `{datasets_table}`"
+            " WHERE Client_id = @client_id ORDER BY dataset_id DESC LIMIT 1",
+            job_config=job_config,
+        ).result()
+        row = next(iter(rows), None)
+        if row is not None:
+            catalog.record_many([(row.dataset_id, client_id, row.num_rows)])
+        with _refreshed_lock:
+            _refreshed[key] = True
+    return catalog.latest_for_client(client_id)
+
+
+_catalog: Optional[DatasetCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_dataset_catalog() -> DatasetCatalog:
+    """Shared catalog at ``DATASET_CATALOG_PATH``, opened on first use."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = DatasetCatalog(DATASET_CATALOG_PATH)
+        return _catalog
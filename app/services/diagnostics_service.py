@@ -1,59 +1,108 @@
 import pandas as pd
-from statsmodels.tsa.stattools import adfuller
-from statsmodels.tsa.seasonal import STL
-from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
 import io
 import base64
-import matplotlib.pyplot as plt
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, Optional, Union
 
+from cachetools import LRUCache
 
-def _plot_to_base64(fig) -> str:
+from app.services.series import DailySeries, as_daily_series
+
+
+PLOT_KINDS = ('acf', 'pacf')
+
+# Rendered PNGs keyed by (series key, kind, lags)
+_plot_cache: LRUCache = LRUCache(maxsize=256)
+_plot_lock = threading.Lock()
+
+
+def _lags(series: DailySeries, kind: str, max_lags: int) -> int:
+    # PACF is only defined up to half the sample size
+    limit = len(series) - 1 if kind == 'acf' else len(series) // 2 - 1
+    return max(0, min(max_lags, limit))
+
+
+def _correlogram(series: DailySeries, kind: str, max_lags: int) -> Dict[str, Any]:
+    lags = _lags(series, kind, max_lags)
+    if lags < 1:
+        return {'lags': 0, 'values': [], 'confint': []}
+    try:
+        if kind == 'acf':
+            values, confint = series.acf(lags), series.acf_confint(lags)
+        else:
+            values, confint = series.pacf(lags), series.pacf_confint(lags)
+    except Exception:
+        return {'lags': 0, 'values': [], 'confint': []}
+    return {'lags': lags, 'values': values.tolist(), 'confint': confint.tolist()}
+
+
+def render_plot(series: DailySeries, kind: str, max_lags: int = 30) -> bytes:
+    """Render the ACF or PACF plot of ``series`` as PNG bytes, cached per series hash.
+
+    Uses the object-oriented matplotlib API (no pyplot global state) so it can run on a
+    worker thread. matplotlib is only imported when a plot is actually requested.
+    """
+    if kind not in PLOT_KINDS:
+        raise ValueError(f"kind must be one of {PLOT_KINDS}")
+    lags = _lags(series, kind, max_lags)
+    cache_key = (series.key, kind, lags)
+    with _plot_lock:
+        cached = _plot_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    from matplotlib.figure import Figure
+    from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
+
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
+    plot_fn = plot_acf if kind == 'acf' else plot_pacf
+    plot_fn(series.values, ax=ax, lags=lags)
     buf = io.BytesIO()
     fig.savefig(buf, format="png", bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode()
+    png = buf.getvalue()
 
+    with _plot_lock:
+        _plot_cache[cache_key] = png
+    return png
 
-def run_diagnostics(df: pd.DataFrame, period: Optional[int] = 7, max_lags: int = 30) -> Dict[str, Any]:
+
+def run_diagnostics(df: Union[pd.DataFrame, DailySeries], period: Optional[int] = 7, max_lags: int = 30,
+                    include_plots: bool = False) -> Dict[str, Any]:
     """Run time-series diagnostics on a DataFrame with 'Date' and 'Total Price' columns.
 
     Steps performed:
     - aggregate by Date and ensure datetime index
     - Augmented Dickey-Fuller test for stationarity
     - STL decomposition to estimate trend and seasonality strengths
-    - Autocorrelation (ACF) and Partial ACF (PACF) plots encoded as base64 PNGs
+    - Autocorrelation (ACF) and Partial ACF (PACF) values with 95% confidence bands
 
     Returns a dict with stationarity results, strength metrics, short decomposition sample,
-    and base64-encoded ACF/PACF images.
+    numeric ACF/PACF and the ``series_key`` to request plot images with (see ``render_plot``).
 
     Parameters
     ----------
-    df : pd.DataFrame
-        Input data. Must contain 'Date' and 'Total Price'.
+    df : pd.DataFrame or DailySeries
+        Input data. Must contain 'Date' and 'Total Price', or be an already prepared DailySeries.
     period : int, optional
         Seasonal period to pass to STL. Default is 7.
     max_lags : int, optional
         Number of lags to show in ACF/PACF plots. Default is 30.
+    include_plots : bool, optional
+        Also embed base64-encoded ACF/PACF PNGs, as older clients expect. Default is False.
     """
-    if not isinstance(df, pd.DataFrame):
-        raise ValueError("df must be a pandas DataFrame")
-
-    if 'Date' not in df.columns or 'Total Price' not in df.columns:
-        raise ValueError("DataFrame must contain 'Date' and 'Total Price' columns")
+    # statsmodels is heavy; import on first use rather than at app startup
+    from statsmodels.tsa.stattools import adfuller
+    from statsmodels.tsa.seasonal import STL
 
-    # Aggregate and prepare series
-    series = df.groupby('Date')['Total Price'].sum().reset_index()
-    series['Date'] = pd.to_datetime(series['Date'])
-    series = series.sort_values('Date')
-    series = series.set_index('Date')
+    # Aggregate and prepare series (shared with run_forecast when a DailySeries is passed)
+    series = as_daily_series(df)
 
     # Ensure there's enough data
     if len(series) < 3:
         raise ValueError('Not enough data points for diagnostics (need at least 3)')
 
-    ts = series['Total Price']
+    ts = series.ts
 
     # ADF test
     adf_result = adfuller(ts.dropna())
@@ -72,8 +121,9 @@ def run_diagnostics(df: pd.DataFrame, period: Optional[int] = 7, max_lags: int =
     stl = STL(ts, period=stl_period, robust=True)
     res = stl.fit()
 
-    trend_strength = float(res.trend.var() / ts.var()) if ts.var() != 0 else 0.0
-    seasonality_strength = float(res.seasonal.var() / ts.var()) if ts.var() != 0 else 0.0
+    ts_var = series.variance
+    trend_strength = float(res.trend.var() / ts_var) if ts_var != 0 else 0.0
+    seasonality_strength = float(res.seasonal.var() / ts_var) if ts_var != 0 else 0.0
 
     decomposition_sample = {
         'trend_head': res.trend.dropna().head(5).to_dict(),
@@ -81,28 +131,22 @@ def run_diagnostics(df: pd.DataFrame, period: Optional[int] = 7, max_lags: int =
         'resid_head': res.resid.dropna().head(5).to_dict(),
     }
 
-    # ACF plot
-    fig_acf, ax_acf = plt.subplots(figsize=(8, 4))
-    plot_acf(ts.fillna(method='ffill').values, ax=ax_acf, lags=min(max_lags, len(ts) - 1))
-    acf_b64 = _plot_to_base64(fig_acf)
-
-    # PACF plot
-    fig_pacf, ax_pacf = plt.subplots(figsize=(8, 4))
-    try:
-        plot_pacf(ts.fillna(method='ffill').values, ax=ax_pacf, lags=min(max_lags, len(ts) - 1))
-        pacf_b64 = _plot_to_base64(fig_pacf)
-    except Exception:
-        plt.close(fig_pacf)
-        pacf_b64 = ''
-
     diagnostics = {
         'stationarity': stationarity,
         'trend_strength': trend_strength,
         'seasonality_strength': seasonality_strength,
         'decomposition_sample': decomposition_sample,
-        'acf_plot_b64': acf_b64,
-        'pacf_plot_b64': pacf_b64,
+        'acf': _correlogram(series, 'acf', max_lags),
+        'pacf': _correlogram(series, 'pacf', max_lags),
         'stl_period_used': stl_period,
+        'series_key': series.key,
     }
 
+    if include_plots:
+        for kind in PLOT_KINDS:
+            try:
+                diagnostics[f'{kind}_plot_b64'] = base64.b64encode(render_plot(series, kind, max_lags)).decode()
+            except Exception:
+                diagnostics[f'{kind}_plot_b64'] = ''
+
     return diagnostics
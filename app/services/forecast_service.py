@@ -1,19 +1,40 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Any
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Any, Iterator, Optional, Union
 from numpy.typing import ArrayLike
 
-from sklearn.metrics import mean_squared_error
+from app.services import model_store
+from app.services.arima_search import select_order
+from app.services.series import DailySeries, as_daily_series
+from app.utils.config import FORECAST_BATCH_WORKERS, FORECAST_SERIES_BUDGET_SECONDS
 
-try:
-    from statsmodels.tsa.arima.model import ARIMA
-except Exception:  # pragma: no cover - imported if available
-    ARIMA = None
 
-try:
-    from prophet import Prophet
-except Exception:  # pragma: no cover - imported if available
-    Prophet = None
+# statsmodels and prophet are heavy, so they are imported on first use rather than at app startup
+def _arima_class():
+    try:
+        from statsmodels.tsa.arima.model import ARIMA
+    except Exception:  # pragma: no cover - imported if available
+        return None
+    return ARIMA
+
+
+def _prophet_class():
+    try:
+        from prophet import Prophet
+    except Exception:  # pragma: no cover - imported if available
+        return None
+    return Prophet
+
+
+def mean_squared_error(y_true: ArrayLike, y_pred: ArrayLike) -> float:
+    """Same as sklearn.metrics.mean_squared_error for 1-d inputs, without importing sklearn."""
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    return float(np.mean((y_true - y_pred) ** 2))
 
 
 def mase(actual: ArrayLike, forecast: ArrayLike) -> float:
@@ -42,21 +63,83 @@ def smape(y_true: ArrayLike, y_pred: ArrayLike) -> float:
     return float(100.0 / len(y_true) * np.sum(2.0 * np.abs(y_pred - y_true) / denom))
 
 
-def run_forecast(df: pd.DataFrame, test_size: float = 0.2) -> Dict[str, Any]:
+def _trend_seasonal_design(t: np.ndarray, days: np.ndarray, changepoints: np.ndarray,
+                           weekly_order: int, yearly_order: int) -> np.ndarray:
+    """Design matrix: intercept, linear trend, trend hinges at changepoints and Fourier terms."""
+    columns = [np.ones_like(t), t, np.maximum(0.0, t[:, None] - changepoints[None, :])]
+    for period, order in ((7.0, weekly_order), (365.25, yearly_order)):
+        if order:
+            k = np.arange(1, order + 1)
+            angle = 2.0 * np.pi * days[:, None] * k[None, :] / period
+            columns.extend([np.sin(angle), np.cos(angle)])
+    return np.column_stack(columns)
+
+
+def trend_seasonal_forecast(train: pd.Series, future_index: pd.DatetimeIndex,
+                            n_changepoints: int = 10, changepoint_range: float = 0.8,
+                            changepoint_penalty: float = 10.0) -> np.ndarray:
+    """Fast Prophet-style forecast: piecewise-linear trend plus weekly/yearly Fourier seasonality.
+
+    Fitted with a single ridge-regularized least-squares solve (the penalty applies to the
+    trend changes only). ``y`` is standardized first, as Prophet scales it, so the penalty means
+    the same for sales in cents or in millions. As in Prophet, weekly seasonality needs at least
+    two weeks of data and yearly seasonality at least two years.
+    """
+    dates = pd.DatetimeIndex(train.index)
+    y = np.asarray(train.values, dtype=float)
+    y_mean = float(y.mean()) if len(y) else 0.0
+    y_scale = float(y.std()) if len(y) else 0.0
+    if not y_scale > 0:
+        y_scale = 1.0
+    y = (y - y_mean) / y_scale
+    origin = dates[0]
+    days = np.asarray((dates - origin).days, dtype=float)
+    future_days = np.asarray((pd.DatetimeIndex(future_index) - origin).days, dtype=float)
+    span = max(days[-1], 1.0)
+
+    weekly_order = 3 if span >= 14 else 0
+    yearly_order = 10 if span >= 730 else 0
+    n_changepoints = min(n_changepoints, max(0, len(y) // 4))
+    changepoints = np.linspace(0.0, changepoint_range, n_changepoints + 2)[1:-1]
+
+    X = _trend_seasonal_design(days / span, days, changepoints, weekly_order, yearly_order)
+    penalty = np.zeros((len(changepoints), X.shape[1]))
+    penalty[np.arange(len(changepoints)), 2 + np.arange(len(changepoints))] = np.sqrt(changepoint_penalty)
+    coef, *_ = np.linalg.lstsq(np.vstack([X, penalty]), np.concatenate([y, np.zeros(len(changepoints))]), rcond=None)
+
+    X_future = _trend_seasonal_design(future_days / span, future_days, changepoints, weekly_order, yearly_order)
+    return X_future @ coef * y_scale + y_mean
+
+
+ENGINES = ('fast', 'prophet')
+
+
+def run_forecast(df: Union[pd.DataFrame, DailySeries], test_size: float = 0.2,
+                 series_id: Optional[str] = None, engine: str = 'fast',
+                 arima_order: str = 'fixed', diagnostics: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Compare Naive, ARIMA and Prophet forecasts on the provided DataFrame.
 
-    Expects columns 'Date' and 'Total Price'. Splits data into train/test by `test_size` fraction.
+    Expects columns 'Date' and 'Total Price', or an already prepared DailySeries.
+    Splits data into train/test by `test_size` fraction.
     Returns forecasts and metrics (RMSE, MASE, sMAPE) for each model. If ARIMA or Prophet
     are not available in the environment, they will be skipped and indicated in the result.
-    """
-    if not isinstance(df, pd.DataFrame):
-        raise ValueError('df must be a pandas DataFrame')
-    if 'Date' not in df.columns or 'Total Price' not in df.columns:
-        raise ValueError("DataFrame must contain 'Date' and 'Total Price' columns")
 
-    df = df.copy()
-    df['Date'] = pd.to_datetime(df['Date'])
-    series = df.groupby('Date')['Total Price'].sum().sort_index()
+    ``engine`` picks the trend/seasonality model: 'fast' (default) runs the NumPy
+    ``trend_seasonal_forecast`` under the 'TrendSeasonal' key; 'prophet' runs Prophet instead,
+    which is much slower and meant for offline runs.
+
+    ``arima_order`` is 'fixed' for ARIMA(1,1,1) or 'auto' to pick (p,d,q)(P,D,Q,s) by AIC with
+    ``arima_search.select_order``; pass the ``run_diagnostics`` output as ``diagnostics`` so its ADF
+    and seasonality results are reused.
+
+    When ``series_id`` identifies the series (e.g. its category/product filter), fitted models
+    are kept in ``model_store`` and reused or incrementally updated on later calls.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {ENGINES}")
+    if arima_order not in ('fixed', 'auto'):
+        raise ValueError("arima_order must be 'fixed' or 'auto'")
+    series = as_daily_series(df).ts
 
     n = len(series)
     if n < 3:
@@ -79,12 +162,27 @@ def run_forecast(df: pd.DataFrame, test_size: float = 0.2) -> Dict[str, Any]:
     }
 
     # 2) ARIMA
+    ARIMA = _arima_class()
     if ARIMA is None:
         results['ARIMA'] = {'error': 'statsmodels ARIMA not available in environment'}
     else:
         try:
-            model = ARIMA(train, order=(1, 1, 1))
-            fitted = model.fit()
+            order, seasonal_order = (1, 1, 1), (0, 0, 0, 0)
+            if arima_order == 'auto':
+                diagnostics = diagnostics or {}
+                selection = select_order(
+                    train.values,
+                    series_id=series_id,
+                    stationarity=diagnostics.get('stationarity'),
+                    seasonality_strength=diagnostics.get('seasonality_strength'),
+                    version=f"{train.index[-1]:%Y-%m-%d}|{len(train)}" if len(train) else None,
+                )
+                order, seasonal_order = tuple(selection['order']), tuple(selection['seasonal_order'])
+            if series_id:
+                fitted = model_store.get_arima(series_id, train, order=order, seasonal_order=seasonal_order)
+            else:
+                model = ARIMA(train, order=order, seasonal_order=seasonal_order)
+                fitted = model.fit()
             pred = fitted.forecast(steps=len(test))
             pred_vals = np.asarray(pred, dtype=float)
             results['ARIMA'] = {
@@ -92,29 +190,48 @@ def run_forecast(df: pd.DataFrame, test_size: float = 0.2) -> Dict[str, Any]:
                 'RMSE': float(np.sqrt(mean_squared_error(test_arr, pred_vals))),
                 'MASE': mase(test_arr, pred_vals),
                 'sMAPE': smape(test_arr, pred_vals),
+                'order': list(order),
+                'seasonal_order': list(seasonal_order),
             }
         except Exception as e:
             results['ARIMA'] = {'error': f'ARIMA failed: {str(e)}'}
 
-    # 3) Prophet
-    if Prophet is None:
-        results['Prophet'] = {'error': 'prophet package not available in environment'}
-    else:
+    # 3) Trend + seasonality: fast NumPy model, or Prophet when requested
+    if engine == 'fast':
         try:
-            df_prophet = train.reset_index().rename(columns={'Date': 'ds', 'Total Price': 'y'})
-            m = Prophet()
-            m.fit(df_prophet)
-            future = m.make_future_dataframe(periods=len(test), freq=None)
-            forecast = m.predict(future)
-            y_pred = np.asarray(forecast['yhat'].iloc[-len(test):].values, dtype=float)
-            results['Prophet'] = {
+            y_pred = trend_seasonal_forecast(train, test.index)
+            results['TrendSeasonal'] = {
                 'forecast': y_pred.tolist(),
                 'RMSE': float(np.sqrt(mean_squared_error(test_arr, y_pred))),
                 'MASE': mase(test_arr, y_pred),
                 'sMAPE': smape(test_arr, y_pred),
             }
         except Exception as e:
-            results['Prophet'] = {'error': f'Prophet failed: {str(e)}'}
+            results['TrendSeasonal'] = {'error': f'TrendSeasonal failed: {str(e)}'}
+        results['Prophet'] = {'error': "skipped (engine='fast'); pass engine='prophet' to run it"}
+    else:
+        Prophet = _prophet_class()
+        if Prophet is None:
+            results['Prophet'] = {'error': 'prophet package not available in environment'}
+        else:
+            try:
+                if series_id:
+                    m = model_store.get_prophet(series_id, train)
+                else:
+                    df_prophet = train.reset_index().rename(columns={'Date': 'ds', 'Total Price': 'y'})
+                    m = Prophet()
+                    m.fit(df_prophet)
+                future = m.make_future_dataframe(periods=len(test), freq=None)
+                forecast = m.predict(future)
+                y_pred = np.asarray(forecast['yhat'].iloc[-len(test):].values, dtype=float)
+                results['Prophet'] = {
+                    'forecast': y_pred.tolist(),
+                    'RMSE': float(np.sqrt(mean_squared_error(test_arr, y_pred))),
+                    'MASE': mase(test_arr, y_pred),
+                    'sMAPE': smape(test_arr, y_pred),
+                }
+            except Exception as e:
+                results['Prophet'] = {'error': f'Prophet failed: {str(e)}'}
 
     # Include train/test summaries
     results['_meta'] = {
@@ -126,3 +243,108 @@ def run_forecast(df: pd.DataFrame, test_size: float = 0.2) -> Dict[str, Any]:
     }
 
     return results
+
+
+class ForecastTimeout(BaseException):
+    """Raised inside a batch worker when a series exceeds its time budget.
+
+    Derives from BaseException so the per-model ``except Exception`` handlers in
+    ``run_forecast`` do not swallow it.
+    """
+
+
+def _raise_timeout(signum, frame):
+    raise ForecastTimeout()
+
+
+def _forecast_group(group: Any, dates: np.ndarray, values: np.ndarray,
+                    test_size: float, time_budget: Optional[float],
+                    id_prefix: Optional[str] = None, engine: str = 'fast') -> Dict[str, Any]:
+    """Process-pool worker: run ``run_forecast`` for one group within ``time_budget`` seconds."""
+    start = time.perf_counter()
+    # SIGALRM is only available on Unix; elsewhere the budget is not enforced
+    use_alarm = bool(time_budget) and hasattr(signal, 'setitimer')
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, float(time_budget))
+
+    result: Dict[str, Any] = {'group': str(group)}
+    try:
+        df = pd.DataFrame({'Date': dates, 'Total Price': values})
+        series_id = f"{id_prefix}={group}" if id_prefix else None
+        result['forecasts'] = run_forecast(df, test_size=test_size, series_id=series_id, engine=engine)
+    except ForecastTimeout:
+        result['error'] = f'time budget of {time_budget}s exceeded'
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+    result['elapsed_ms'] = (time.perf_counter() - start) * 1000.0
+    return result
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_forecast_pool() -> ProcessPoolExecutor:
+    """Process pool for batch forecasts and backtest folds, created on first use.
+
+    One pool of ``FORECAST_BATCH_WORKERS`` processes is shared by all requests, so workers
+    (and their statsmodels imports) are started once rather than per request. Workers are
+    spawned rather than forked, like ``upload_staging.get_upload_pool``.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+
+            _pool = ProcessPoolExecutor(max_workers=max(1, FORECAST_BATCH_WORKERS),
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def iter_batch_forecasts(df: pd.DataFrame,
+                         workers: Optional[int] = None,
+                         time_budget: Optional[float] = None,
+                         test_size: float = 0.2,
+                         id_prefix: Optional[str] = None,
+                         engine: str = 'fast') -> Iterator[Dict[str, Any]]:
+    """Run ``run_forecast`` for every group in ``df`` in the shared forecast process pool.
+
+    ``df`` is the long-format output of ``fetch_daily_by_group`` (columns Date, group, Total Price).
+    It is partitioned in a single groupby pass and results are yielded as each series finishes,
+    not in group order. At most ``workers`` series of this call are in the pool at once, so one
+    large batch does not queue ahead of every other request. Each result has ``group``,
+    ``elapsed_ms`` and either ``forecasts`` or ``error``.
+    With ``id_prefix`` (e.g. "category"), fitted models are reused from ``model_store`` per group.
+    """
+    if 'group' not in df.columns:
+        raise ValueError("DataFrame must contain a 'group' column")
+    workers = max(1, int(workers or FORECAST_BATCH_WORKERS))
+    if time_budget is None:
+        time_budget = FORECAST_SERIES_BUDGET_SECONDS
+
+    pool = get_forecast_pool()
+    groups = iter(df.groupby('group', sort=False))
+    pending = set()
+    try:
+        while True:
+            for name, group in groups:
+                pending.add(pool.submit(_forecast_group, name, group['Date'].to_numpy(),
+                                        group['Total Price'].to_numpy(), test_size, time_budget,
+                                        id_prefix, engine))
+                if len(pending) >= workers:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        # Drop queued work if the consumer goes away early (e.g. client disconnect)
+        for future in pending:
+            future.cancel()
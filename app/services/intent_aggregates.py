@@ -0,0 +1,180 @@
+import bisect
+import threading
+from typing import TYPE_CHECKING, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from cachetools import LRUCache
+
+from app.utils.config import INTENT_AGGREGATE_SCOPES
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+
+class RankedCounter:
+    """A counter that answers ``top(k)`` in O(k).
+
+    Keys are kept in buckets by count, with the distinct counts in a sorted list, so adding to
+    a key moves it between two buckets instead of re-sorting anything. Ties keep the order in
+    which keys reached that count.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self._counts: Dict[str, int] = {}
+        self._buckets: Dict[int, Dict[str, None]] = {}
+        self._levels: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __getitem__(self, key: str) -> int:
+        return self._counts.get(key, 0)
+
+    def add(self, key: str, n: int = 1) -> None:
+        if n <= 0:
+            return
+        old = self._counts.get(key, 0)
+        if old:
+            self._leave(old, key)
+        new = old + n
+        self._counts[key] = new
+        bucket = self._buckets.get(new)
+        if bucket is None:
+            bucket = self._buckets[new] = {}
+            bisect.insort(self._levels, new)
+        bucket[key] = None
+        self.total += n
+
+    def _leave(self, count: int, key: str) -> None:
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            del self._levels[bisect.bisect_left(self._levels, count)]
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        found: List[Tuple[str, int]] = []
+        if k <= 0:
+            return found
+        for level in reversed(self._levels):
+            for key in self._buckets[level]:
+                found.append((key, level))
+                if len(found) >= k:
+                    return found
+        return found
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self._counts)
+
+
+class IntentAggregates:
+    """Intent counts and intent-by-product co-occurrence for one scope (a dataset or a run).
+
+    Updated as rows arrive, so reading counts or top-k never rescans the rows. ``add`` takes
+    row dicts; ``add_table`` takes an Arrow table and counts it with group-bys, touching each
+    distinct (intent, product) pair once rather than each row.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.intents = RankedCounter()
+        self._products: Dict[str, RankedCounter] = {}
+        self._lock = threading.Lock()
+
+    def add(self, rows: Iterable[dict]) -> None:
+        """Count rows with an ``intent`` and, optionally, the basket's ``products``."""
+        with self._lock:
+            for row in rows:
+                self.rows += 1
+                intent = row.get("intent")
+                if not intent:
+                    continue
+                self.intents.add(intent)
+                products = row.get("products")
+                if products:
+                    counter = self._products.setdefault(intent, RankedCounter())
+                    for product in products:
+                        if product is not None:
+                            counter.add(str(product))
+
+    def add_table(self, table: "pa.Table") -> None:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        if "intent" not in table.column_names:
+            with self._lock:
+                self.rows += table.num_rows
+            return
+        intents = table.column("intent").combine_chunks().cast(pa.string())
+        counts = pc.value_counts(intents)
+        pairs: List[Tuple[str, str, int]] = []
+        if "products" in table.column_names:
+            products = table.column("products").combine_chunks()
+            parents = pc.list_parent_indices(products)
+            exploded = pa.table({
+                "intent": intents.take(parents),
+                "product": pc.list_flatten(products).cast(pa.string()),
+            }).group_by(["intent", "product"]).aggregate([([], "count_all")])
+            pairs = list(zip(exploded.column("intent").to_pylist(), exploded.column("product").to_pylist(),
+                             exploded.column("count_all").to_pylist()))
+        with self._lock:
+            self.rows += table.num_rows
+            for intent, n in zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist()):
+                if intent:
+                    self.intents.add(intent, n)
+            for intent, product, n in pairs:
+                if intent and product is not None:
+                    self._products.setdefault(intent, RankedCounter()).add(product, n)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return self.intents.as_dict()
+
+    def top(self, k: int = 10) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self.intents.top(k)
+
+    def top_products(self, intent: str, k: int = 10) -> List[Tuple[str, int]]:
+        """Products most often in baskets with ``intent``."""
+        with self._lock:
+            counter = self._products.get(intent)
+            return counter.top(k) if counter else []
+
+    def snapshot(self, k: int = 10) -> dict:
+        with self._lock:
+            top = self.intents.top(k)
+            return {
+                "rows": self.rows,
+                "with_intent": self.intents.total,
+                "distinct_intents": len(self.intents),
+                "top_intents": [{"intent": intent, "count": n} for intent, n in top],
+                "top_products": {
+                    intent: [{"product": p, "count": c} for p, c in self._products[intent].top(k)]
+                    for intent, _ in top if intent in self._products
+                },
+            }
+
+
+_scopes: LRUCache = LRUCache(maxsize=INTENT_AGGREGATE_SCOPES)
+_scopes_lock = threading.Lock()
+
+
+def get_aggregates(scope: Hashable) -> IntentAggregates:
+    """Aggregates for ``scope`` (e.g. ``("run", run_id)``), created empty on first use."""
+    with _scopes_lock:
+        aggregates = _scopes.get(scope)
+        if aggregates is None:
+            aggregates = _scopes[scope] = IntentAggregates()
+        return aggregates
+
+
+def find_aggregates(scope: Hashable) -> Optional[IntentAggregates]:
+    with _scopes_lock:
+        return _scopes.get(scope)
+
+
+def reset_aggregates(scope: Hashable, aggregates: Optional[IntentAggregates] = None) -> IntentAggregates:
+    """Start ``scope`` over, e.g. when its intents are replaced wholesale, or install rebuilt ``aggregates``."""
+    with _scopes_lock:
+        aggregates = _scopes[scope] = aggregates if aggregates is not None else IntentAggregates()
+        return aggregates
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.utils.config import INTENT_CACHE_PATH
+
+
+def normalize_basket(products: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    """Canonical form of a basket: stripped, case-folded, de-duplicated and sorted item names."""
+    if not products:
+        return ()
+    return tuple(sorted({str(p).strip().casefold() for p in products if p is not None and str(p).strip()}))
+
+
+def basket_key(products: Optional[Iterable[str]]) -> str:
+    """Stable hash of the normalized basket, used to share intents between identical orders."""
+    return hashlib.sha1("\x1f".join(normalize_basket(products)).encode("utf-8")).hexdigest()
+
+
+def group_orders_by_basket(orders: List[dict]) -> Dict[str, dict]:
+    """Collapse orders with identical baskets.
+
+    Returns ``{basket_key: {"order_id": <first order_id>, "products": [...], "order_ids": [...]}}``
+    in first-seen order; the first order of each group represents it when calling the model.
+    """
+    groups: Dict[str, dict] = {}
+    for order in orders:
+        key = basket_key(order["products"])
+        group = groups.get(key)
+        if group is None:
+            groups[key] = {"order_id": order["order_id"], "products": order["products"], "order_ids": [order["order_id"]]}
+        else:
+            group["order_ids"].append(order["order_id"])
+    return groups
+
+
+class IntentCache:
+    """Persistent SQLite map of (basket_key, model) -> intent."""
+
+    def __init__(self, path: str = INTENT_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS basket_intents ("
+                " basket_key TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " intent TEXT NOT NULL,"
+                " created_at TEXT NOT NULL,"
+                " PRIMARY KEY (basket_key, model))"
+            )
+
+    def get_many(self, keys: Iterable[str], model: str) -> Dict[str, str]:
+        keys = list(keys)
+        found: Dict[str, str] = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT basket_key, intent FROM basket_intents WHERE model = ? AND basket_key IN ({placeholders})",
+                    [model, *chunk],
+                ).fetchall()
+            found.update(rows)
+        return found
+
+    def put_many(self, items: Dict[str, str], model: str) -> None:
+        if not items:
+            return
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO basket_intents (basket_key, model, intent, created_at) VALUES (?, ?, ?, ?)",
+                [(key, model, intent, now) for key, intent in items.items()],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[IntentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_intent_cache() -> IntentCache:
+    """Shared cache instance at ``INTENT_CACHE_PATH``, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = IntentCache(INTENT_CACHE_PATH)
+        return _cache
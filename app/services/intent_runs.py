@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from app.utils.config import INTENT_RUNS_PATH
+
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+RUN_FIELDS = ("run_id", "dataset", "model", "sample_size", "rows_read", "source_done", "status", "created_at", "updated_at")
+
+
+class RunStore:
+    """SQLite checkpoint of intent inference runs.
+
+    Orders are recorded as ``pending`` page by page as they are read from the source, together
+    with how many source rows have been read so far, and moved to ``done`` or ``failed`` as
+    their batch completes. An interrupted or partly failed run can therefore be resumed without
+    re-sending the orders that already succeeded or re-reading the part of the source already
+    seen.
+    """
+
+    def __init__(self, path: str = INTENT_RUNS_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS intent_runs ("
+                " run_id TEXT PRIMARY KEY,"
+                " dataset TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " sample_size INTEGER,"
+                " rows_read INTEGER NOT NULL DEFAULT 0,"
+                " source_done INTEGER NOT NULL DEFAULT 0,"
+                " status TEXT NOT NULL,"
+                " created_at TEXT NOT NULL,"
+                " updated_at TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS intent_run_orders ("
+                " run_id TEXT NOT NULL,"
+                " order_id NOT NULL,"
+                " products TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " error TEXT,"
+                " PRIMARY KEY (run_id, order_id))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS intent_run_orders_status ON intent_run_orders (run_id, status)"
+            )
+
+    def create_run(self, run_id: str, dataset: str, model: str, orders: Sequence[dict] = (),
+                   sample_size: Optional[int] = None) -> None:
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO intent_runs (run_id, dataset, model, sample_size, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, dataset, model, sample_size, "running", now, now),
+            )
+        if orders:
+            self.add_orders(run_id, orders)
+
+    def add_orders(self, run_id: str, orders: Sequence[dict], rows_read: Optional[int] = None) -> None:
+        """Register ``orders`` as pending; ``rows_read`` records the source position in the same transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO intent_run_orders (run_id, order_id, products, status) VALUES (?, ?, ?, ?)",
+                [(run_id, o["order_id"], json.dumps(list(o["products"] or [])), PENDING) for o in orders],
+            )
+            if rows_read is not None:
+                self._conn.execute("UPDATE intent_runs SET rows_read = ? WHERE run_id = ?", (rows_read, run_id))
+
+    def set_source_done(self, run_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE intent_runs SET source_done = 1 WHERE run_id = ?", (run_id,))
+
+    def get_run(self, run_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(RUN_FIELDS)} FROM intent_runs WHERE run_id = ?", (run_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        run = dict(zip(RUN_FIELDS, row))
+        run["source_done"] = bool(run["source_done"])
+        return run
+
+    def iter_orders(self, run_id: str, statuses: Iterable[str], page_size: int = 5000) -> Iterator[List[dict]]:
+        """Yield pages of the run's orders in one of ``statuses``, in insertion order.
+
+        Pages are read with a rowid cursor, so orders can be re-marked while iterating.
+        """
+        statuses = list(statuses)
+        placeholders = ",".join("?" * len(statuses))
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT rowid, order_id, products FROM intent_run_orders"
+                    f" WHERE run_id = ? AND rowid > ? AND status IN ({placeholders}) ORDER BY rowid LIMIT ?",
+                    [run_id, last, *statuses, page_size],
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [{"order_id": order_id, "products": json.loads(products)} for _, order_id, products in rows]
+
+    def unfinished_orders(self, run_id: str) -> List[dict]:
+        """Orders of ``run_id`` that are still pending or failed, in insertion order."""
+        return [order for page in self.iter_orders(run_id, (PENDING, FAILED)) for order in page]
+
+    def mark(self, run_id: str, order_ids: Iterable, status: str, error: Optional[str] = None) -> None:
+        order_ids = list(order_ids)
+        if not order_ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE intent_run_orders SET status = ?, error = ?, attempts = attempts + 1"
+                " WHERE run_id = ? AND order_id = ?",
+                [(status, error, run_id, oid) for oid in order_ids],
+            )
+
+    def products(self, run_id: str, order_ids: Iterable, chunk: int = 500) -> Dict[object, List[str]]:
+        """``order_id -> products`` for the given orders of ``run_id``."""
+        order_ids = list(order_ids)
+        found: Dict[object, List[str]] = {}
+        for start in range(0, len(order_ids), chunk):
+            ids = order_ids[start:start + chunk]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT order_id, products FROM intent_run_orders"
+                    f" WHERE run_id = ? AND order_id IN ({','.join('?' * len(ids))})",
+                    [run_id, *ids],
+                ).fetchall()
+            found.update((order_id, json.loads(products)) for order_id, products in rows)
+        return found
+
+    def counts(self, run_id: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM intent_run_orders WHERE run_id = ? GROUP BY status", (run_id,)
+            ).fetchall()
+        return {PENDING: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def set_status(self, run_id: str, status: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE intent_runs SET status = ?, updated_at = ? WHERE run_id = ?",
+                (status, datetime.utcnow().isoformat(), run_id),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[RunStore] = None
+_store_lock = threading.Lock()
+
+
+def get_run_store() -> RunStore:
+    """Shared run store at ``INTENT_RUNS_PATH``, opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RunStore(INTENT_RUNS_PATH)
+        return _store
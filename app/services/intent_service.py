@@ -1,18 +1,65 @@
-from google.cloud import bigquery  # type: ignore
-import requests
+import asyncio
 import json
+import random
+import threading
 import uuid
-import time
+from collections import deque
 from datetime import datetime
-from app.utils.config import RUNPOD_API_KEY, RUNPOD_ENDPOINT
+from app.utils.config import (
+  RUNPOD_API_KEY,
+  RUNPOD_ENDPOINT,
+  INTENT_MAX_IN_FLIGHT,
+  INTENT_MAX_RETRIES,
+  INTENT_REQUEST_TIMEOUT,
+  INTENT_INPUT_TOKEN_BUDGET,
+  INTENT_MAX_BATCH_ORDERS,
+  INTENT_OUTPUT_TOKENS_PER_ORDER,
+  INTENT_RETRY_ROUNDS,
+  INTENT_PAGE_SIZE,
+  INTENT_PIPELINE_DEPTH,
+  INTENT_STREAM_RESPONSES,
+)
+from app.utils.clients import get_bigquery_client
+from app.services.intent_cache import get_intent_cache, group_orders_by_basket
+from app.services.intent_aggregates import get_aggregates, reset_aggregates
+from app.services.intent_runs import DONE, FAILED, PENDING, get_run_store
+from app.services.json_stream import JsonObjectStream
+from app.services.result_writer import BufferedResultWriter
 import math
-from typing import Callable, Optional
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+import httpx
 
-bq_client = bigquery.Client(project="mindful-ship-474319-g8")
-BATCH_SIZE = 50
+
+BQ_PROJECT = "mindful-ship-474319-g8"
 MODEL_NAME = "mistralai/Mistral-7B-v0.3"
 
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+# Rough characters-per-token for Mistral-style tokenizers; conservative so batches don't overflow
+CHARS_PER_TOKEN = 3.0
+# Fixed output overhead (array brackets, stray whitespace) on top of the per-order allowance
+OUTPUT_TOKEN_OVERHEAD = 32
+
+
+class ModelCallError(Exception):
+  """A batch could not be inferred; ``response_text`` holds the model's raw reply if any."""
+
+  def __init__(self, message: str, response_text: Optional[str] = None):
+    super().__init__(message)
+    self.response_text = response_text
+
+
+class UnexpectedResponse(ModelCallError):
+  """The endpoint answered, but not in the expected ``{"output": {"text": ...}}`` shape."""
+
+  def __init__(self, output: dict):
+    super().__init__("Unexpected response format from model")
+    self.output = output
+
 
 def chunk_list(lst, n):
   """Yield successive n-sized chunks from a list."""
@@ -20,151 +67,608 @@ def chunk_list(lst, n):
     yield lst[i:i + n]
 
 
-def infer_intent_for_dataset(dataset_name: str, sample_size: int = 200, progress_cb: Optional[Callable[[str], None]] = None):
-  """
-  Fetches a sample of orders from BigQuery (default 200 rows), batches them,
-  sends to RunPod vLLM endpoint for intent inference, and writes results
-  back to BigQuery.
+def _emit(payload: dict, progress_cb: Optional[Callable[[str], None]]) -> None:
+  msg = json.dumps(payload)
+  print(msg)
+  if progress_cb:
+    try:
+      progress_cb(msg)
+    except Exception:
+      pass
 
-  Args:
-    dataset_name: BigQuery dataset name (e.g. `project.dataset`).
-    sample_size: Number of rows to sample from the source table (default 200).
-    progress_cb: Optional callable that receives JSON-serializable strings for progress updates.
+
+PROMPT_HEADER = (
+  "You are an intent inference model. Your task is to analyze a list of shopping orders and deduce the most specific, high-level intent behind each one.\n\n"
+  "* The inferred intent must be a concise phrase, no more than 2–3 words.\n"
+  "* Be as specific as possible. Instead of \"Clothing Shopping,\" consider \"Planning a wedding outfit.\"\n"
+  "  Instead of \"Grocery Shopping,\" consider \"Baking a cake\" or \"Making chili.\"\n"
+  "* If the intent is truly impossible to determine, you may use the phrase \"unknown intent.\"\n\n"
+  "**Input Format:** each order is {\"i\": <id>, \"p\": [<products>]}\n"
+  "```json\n"
+)
+PROMPT_FOOTER = (
+  "\n```\n\n"
+  "Please output a JSON array of objects with the shape: [{\"i\": <id>, \"intent\": \"<inferred intent>\"}]\n"
+)
+
+
+def estimate_tokens(text: str) -> int:
+  return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _encode_order(i: int, order: dict) -> str:
+  # Short per-batch id and minified products instead of the full order_id and indented JSON
+  return json.dumps({"i": i, "p": list(order["products"] or [])}, separators=(",", ":"), ensure_ascii=False)
+
+
+def build_prompt(batch: List[dict]) -> str:
+  """Prompt for ``batch``; orders are referred to by their position in the batch."""
+  return PROMPT_HEADER + "[" + ",".join(_encode_order(i, order) for i, order in enumerate(batch)) + "]" + PROMPT_FOOTER
+
+
+def max_tokens_for(batch_len: int) -> int:
+  return OUTPUT_TOKEN_OVERHEAD + INTENT_OUTPUT_TOKENS_PER_ORDER * batch_len
+
+
+def pack_batches(orders: Iterable[dict],
+                 token_budget: int = INTENT_INPUT_TOKEN_BUDGET,
+                 max_orders: int = INTENT_MAX_BATCH_ORDERS) -> Iterable[List[dict]]:
+  """Greedily fill each batch up to ``token_budget`` estimated prompt tokens (and ``max_orders``).
+
+  An order too large for the budget on its own still gets a batch to itself.
   """
-  # Ensure sample_size is a positive integer
-  sample_size = max(0, int(sample_size))
+  fixed = estimate_tokens(PROMPT_HEADER + "[]" + PROMPT_FOOTER)
+  batch: List[dict] = []
+  used = fixed
+  for order in orders:
+    cost = estimate_tokens(_encode_order(len(batch), order)) + 1
+    if batch and (used + cost > token_budget or len(batch) >= max_orders):
+      yield batch
+      batch, used = [], fixed
+      cost = estimate_tokens(_encode_order(0, order)) + 1
+    batch.append(order)
+    used += cost
+  if batch:
+    yield batch
 
-  query = f"SELECT order_id, products FROM `{dataset_name}.orders_grouped` LIMIT {sample_size};"
-  rows = list(bq_client.query(query).result())
-  all_orders = [{"order_id": r["order_id"], "products": r["products"]} for r in rows]
 
-  run_id = str(uuid.uuid4())
-  table_id = f"{dataset_name}.intent_inference_results"
+class BatchIntents(list):
+  """Decoded ``[{order_id, intent}]`` of one batch; ``dropped`` counts model items that mapped to no order."""
+  dropped = 0
 
-  if not all_orders:
-    msg = json.dumps({"type": "info", "text": f"No orders found in `{dataset_name}.orders_grouped` (sample_size={sample_size})."})
-    print(msg)
-    if progress_cb:
-      try:
-        progress_cb(msg)
-      except Exception:
-        pass
-    return
-
-  total_batches = math.ceil(len(all_orders) / BATCH_SIZE)
-  for idx, batch in enumerate(chunk_list(all_orders, BATCH_SIZE)):
-    # progress: batch start
-    msg = json.dumps({"type": "progress", "text": f"🔹 Processing batch {idx+1}/{total_batches}", "batch": idx+1, "total_batches": total_batches})
-    print(msg)
-    if progress_cb:
+
+def _short_id(i: object) -> Optional[int]:
+  """The model's ``i`` as an int; it sometimes writes ``"1"`` or ``1.0`` for ``1``."""
+  if isinstance(i, bool):
+    return None
+  if isinstance(i, int):
+    return i
+  if not isinstance(i, (str, float)):
+    return None
+  try:
+    value = float(i)
+  except ValueError:
+    return None
+  return int(value) if value.is_integer() else None
+
+
+def decode_intents(batch: List[dict], intents: List[dict]) -> BatchIntents:
+  """Map the model's short ids back to ``order_id``s, dropping ids that aren't in the batch."""
+  decoded = BatchIntents()
+  for r in intents:
+    i = _short_id(r.get("i")) if isinstance(r, dict) and "intent" in r else None
+    if i is not None and 0 <= i < len(batch):
+      decoded.append({"order_id": batch[i]["order_id"], "intent": r["intent"]})
+    else:
+      decoded.dropped += 1
+  return decoded
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response]) -> float:
+  if response is not None:
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
       try:
-        progress_cb(msg)
-      except Exception:
+        return min(RETRY_MAX_DELAY, float(retry_after))
+      except ValueError:
         pass
+  # Exponential backoff with full jitter
+  return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
 
-    prompt = (
-      "You are an intent inference model. Your task is to analyze a list of shopping orders and deduce the most specific, high-level intent behind each one.\n\n"
-      "* The inferred intent must be a concise phrase, no more than 2–3 words.\n"
-      "* Be as specific as possible. Instead of \"Clothing Shopping,\" consider \"Planning a wedding outfit.\"\n"
-      "  Instead of \"Grocery Shopping,\" consider \"Baking a cake\" or \"Making chili.\"\n"
-      "* If the intent is truly impossible to determine, you may use the phrase \"unknown intent.\"\n\n"
-      "**Input Format:**\n"
-      "```json\n"
-      + json.dumps(batch, indent=2)
-      + "\n```\n\n"
-      "Please output a JSON array of objects with the shape: [{\"order_id\": <order_id>, \"intent\": \"<inferred intent>\"}]\n"
-    )
+async def _post_with_retry(client: httpx.AsyncClient, url: str, body: dict, headers: dict,
+                           max_retries: int, stream: bool = False) -> httpx.Response:
+  """POST ``body``, retrying 429/5xx responses and transport errors with backoff.
 
+  With ``stream=True`` the returned response body has not been read yet; the caller must
+  close it.
+  """
+  attempt = 0
+  while True:
+    response = None
     try:
-      body = {
-        "model": "TheBloke/Mistral-7B-Instruct-v0.1-AWQ",
-        "prompt": prompt,
-        "max_tokens": 512,
-        "temperature": 0.3,
-        "stream": False,
-      }
+      request = client.build_request("POST", url, json=body, headers=headers)
+      response = await client.send(request, stream=stream)
+      if response.status_code not in RETRY_STATUSES or attempt >= max_retries:
+        return response
+      await response.aclose()
+    except httpx.TransportError:
+      if attempt >= max_retries:
+        raise
+    await asyncio.sleep(_retry_delay(attempt, response))
+    attempt += 1
 
-      headers = {
-        "Authorization": f"Bearer {RUNPOD_API_KEY}",
-        "Content-Type": "application/json",
-      }
 
-      response = requests.post(
-        RUNPOD_ENDPOINT,
-        data=json.dumps(body),
-        headers=headers,
-        timeout=180,
-      )
+def _chunk_text(chunk: dict) -> str:
+  """Generated text in one streamed event (OpenAI-style completions or RunPod ``output``)."""
+  choices = chunk.get("choices")
+  if choices:
+    choice = choices[0]
+    return choice.get("text") or (choice.get("delta") or {}).get("content") or ""
+  output = chunk.get("output")
+  if isinstance(output, dict):
+    return output.get("text") or ""
+  return output if isinstance(output, str) else ""
 
-      # Print raw response text for debugging/visibility (show even on HTTP error)
-      try:
-        print("Model response text:", response.text)
-      except Exception:
-        pass
-      response.raise_for_status()
-
-      output = response.json()
-      if "output" in output and "text" in output["output"]:
-        intents = json.loads(output["output"]["text"])
-      else:
-        err = json.dumps({"type": "error", "text": "Unexpected response format from model", "response": output})
-        print(err)
-        if progress_cb:
-          try:
-            progress_cb(err)
-          except Exception:
-            pass
-        continue
-
-      rows_to_insert = [
-        {
-          "order_id": r["order_id"],
-          "intent": r["intent"],
-          "model": MODEL_NAME,
-          "run_id": run_id,
-          "created_at": datetime.utcnow().isoformat(),
-        }
-        for r in intents
-      ]
-
-      bq_client.insert_rows_json(table_id, rows_to_insert)
-      inserted_msg = json.dumps({"type": "inserted", "count": len(rows_to_insert), "batch": idx + 1})
-      print(inserted_msg)
-      if progress_cb:
-        try:
-          progress_cb(inserted_msg)
-        except Exception:
-          pass
 
-    except Exception as e:
-      # Try to capture model response body for debugging
-      response_text = None
+async def _stream_text(response: httpx.Response) -> AsyncIterator[str]:
+  async for line in response.aiter_lines():
+    if not line.startswith("data:"):
+      continue
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+      return
+    try:
+      chunk = json.loads(data)
+    except ValueError:
+      continue
+    if isinstance(chunk, dict):
+      text = _chunk_text(chunk)
+      if text:
+        yield text
+
+
+async def infer_batch(client: httpx.AsyncClient, batch: List[dict],
+                      endpoint: str = RUNPOD_ENDPOINT, api_key: str = RUNPOD_API_KEY,
+                      max_retries: int = INTENT_MAX_RETRIES,
+                      on_partial: Optional[Callable[[List[dict]], Awaitable[None]]] = None,
+                      stream: bool = INTENT_STREAM_RESPONSES) -> BatchIntents:
+  """Send one batch to the model endpoint and return the parsed ``[{order_id, intent}]`` list.
+
+  The reply is parsed incrementally (see ``JsonObjectStream``): with ``stream=True`` and an
+  endpoint that answers with server-sent events, each intent is handed to ``on_partial`` as
+  soon as its object is complete. Malformed objects are dropped without losing the valid
+  ones; only an output with no valid object at all is an error. If the call fails part way,
+  intents already passed to ``on_partial`` stand.
+  """
+  body = {
+    "model": "TheBloke/Mistral-7B-Instruct-v0.1-AWQ",
+    "prompt": build_prompt(batch),
+    "max_tokens": max_tokens_for(len(batch)),
+    "temperature": 0.3,
+    "stream": stream,
+  }
+  headers = {
+    "Authorization": f"Bearer {api_key}",
+    "Content-Type": "application/json",
+  }
+
+  parser = JsonObjectStream()
+  collected = BatchIntents()
+  raw: List[str] = []
+
+  async def feed(text: str) -> None:
+    raw.append(text)
+    intents = decode_intents(batch, parser.feed(text))
+    collected.dropped += intents.dropped
+    if intents:
+      collected.extend(intents)
+      if on_partial:
+        await on_partial(intents)
+
+  try:
+    response = await _post_with_retry(client, endpoint, body, headers, max_retries, stream=True)
+  except httpx.HTTPError as e:
+    raise ModelCallError(str(e)) from e
+
+  try:
+    if response.status_code >= 400:
+      await response.aread()
+      raise ModelCallError(f"HTTP {response.status_code} from model endpoint", response.text)
+
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
       try:
-        response_text = response.text  # type: ignore
-      except Exception:
-        try:
-          response_text = getattr(e, "response", None) and getattr(e.response, "text", None)  # type: ignore
-        except Exception:
-          response_text = None
+        async for text in _stream_text(response):
+          await feed(text)
+      except httpx.HTTPError as e:
+        raise ModelCallError(f"Stream interrupted: {e}", "".join(raw)) from e
+    else:
+      # Endpoint answered in one piece (e.g. RunPod runsync)
+      await response.aread()
+      try:
+        output = response.json()
+      except ValueError as e:
+        raise ModelCallError(f"Invalid JSON from model endpoint: {e}", response.text) from e
+      if not (isinstance(output, dict) and isinstance(output.get("output"), dict) and "text" in output["output"]):
+        raise UnexpectedResponse(output)
+      await feed(output["output"]["text"])
+  finally:
+    await response.aclose()
+
+  text = "".join(raw)
+  if not collected and text.strip():
+    try:
+      empty = json.loads(text) == []
+    except ValueError:
+      empty = False
+    if not empty:
+      raise ModelCallError("Model output contains no valid intents", text)
+  return collected
+
+
+async def _aiter(items: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+  if hasattr(items, "__aiter__"):
+    async for item in items:
+      yield item
+  else:
+    for item in items:
+      yield item
 
-      err_payload = {"type": "error", "text": f"Batch {idx+1} failed: {e}", "batch": idx + 1}
-      if response_text:
-        err_payload["response_text"] = response_text
 
-      err_msg = json.dumps(err_payload)
-      print(err_msg)
-      if progress_cb:
+async def dispatch_batches(batches: Union[Iterable[List[dict]], AsyncIterable[List[dict]]],
+                           max_in_flight: int = INTENT_MAX_IN_FLIGHT,
+                           on_start: Optional[Callable[[int], None]] = None,
+                           on_partial: Optional[Callable[[int, List[dict]], Awaitable[None]]] = None,
+                           endpoint: str = RUNPOD_ENDPOINT,
+                           api_key: str = RUNPOD_API_KEY,
+                           max_retries: int = INTENT_MAX_RETRIES,
+                           timeout: float = INTENT_REQUEST_TIMEOUT,
+                           transport: Optional[httpx.AsyncBaseTransport] = None) -> AsyncIterator[Tuple[int, Union[List[dict], Exception]]]:
+  """Run up to ``max_in_flight`` batches concurrently over one pooled connection.
+
+  ``batches`` may be a list or an (async) iterator; it is consumed lazily, keeping at most
+  ``2 * max_in_flight`` batches scheduled so a slow consumer holds back the producer.
+  Yields ``(batch_index, intents_or_exception)`` strictly in batch order, whatever order the
+  responses arrive in. ``on_start(index)`` is called when a batch is actually sent, and
+  ``on_partial(index, intents)`` is awaited as intents of a streamed reply are parsed, before
+  the batch is complete and regardless of batch order. Stopping iteration early cancels the
+  batches still outstanding. ``transport`` lets tests and benchmarks swap in a mock endpoint.
+  """
+  max_in_flight = max(1, int(max_in_flight))
+  semaphore = asyncio.Semaphore(max_in_flight)
+  limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+
+  async with httpx.AsyncClient(timeout=timeout, limits=limits, transport=transport) as client:
+    async def run(idx: int, batch: List[dict]):
+      async with semaphore:
+        if on_start:
+          on_start(idx)
+        partial = None
+        if on_partial:
+          async def partial(intents: List[dict]) -> None:
+            await on_partial(idx, intents)
         try:
-          progress_cb(err_msg)
-        except Exception:
-          pass
-      # stop processing on first error
+          return await infer_batch(client, batch, endpoint=endpoint, api_key=api_key, max_retries=max_retries,
+                                   on_partial=partial)
+        except Exception as e:
+          return e
+
+    window: Deque[asyncio.Task] = deque()
+    scheduled = 0
+    try:
+      async for batch in _aiter(batches):
+        window.append(asyncio.create_task(run(scheduled, batch)))
+        scheduled += 1
+        if len(window) >= 2 * max_in_flight:
+          yield scheduled - len(window), await window.popleft()
+      while window:
+        yield scheduled - len(window), await window.popleft()
+    finally:
+      for task in window:
+        task.cancel()
+      await asyncio.gather(*window, return_exceptions=True)
+
+
+def _source_pages(bq_client, dataset_name: str, sample_size: Optional[int], start_index: int,
+                  page_size: int, stats: dict) -> Iterator[List[dict]]:
+  """Page through ``orders_grouped`` from row ``start_index``, in a stable order so a run can continue later."""
+  limit = f" LIMIT {sample_size}" if sample_size else ""
+  query = f"SELECT order_id, products FROM `{dataset_name}.orders_grouped` ORDER BY order_id{limit};"
+  rows = bq_client.query(query).result(page_size=page_size, start_index=start_index or None)
+  if rows.total_rows is not None:
+    stats["rows_total"] += max(0, rows.total_rows - start_index)
+  for page in rows.pages:
+    yield [{"order_id": r["order_id"], "products": r["products"]} for r in page]
+
+
+async def _pages_in_thread(pages: Iterator[List[dict]]) -> AsyncIterator[List[dict]]:
+  """Drive a blocking page iterator from a worker thread, one page at a time."""
+  done = object()
+  while True:
+    page = await asyncio.to_thread(next, pages, done)
+    if page is done:
       return
+    yield page
 
-  done_msg = json.dumps({"type": "done", "text": f"Inference completed for dataset: {dataset_name}", "run_id": run_id})
-  print(done_msg)
-  if progress_cb:
+
+def infer_intent_for_dataset(dataset_name: str, sample_size: Optional[int] = 200, progress_cb: Optional[Callable[[str], None]] = None,
+                             max_in_flight: int = INTENT_MAX_IN_FLIGHT, use_cache: bool = True,
+                             resume: Optional[str] = None, retry_rounds: int = INTENT_RETRY_ROUNDS,
+                             page_size: int = INTENT_PAGE_SIZE,
+                             cancel_event: Optional[threading.Event] = None) -> Optional[str]:
+  """
+  Streams orders from BigQuery (a sample of ``sample_size`` rows, or the whole table),
+  batches them, sends them to the RunPod vLLM endpoint for intent inference, and writes
+  results back to BigQuery.
+
+  The work runs as three overlapping stages joined by bounded queues: paged reads from
+  ``orders_grouped``, model calls (up to ``max_in_flight`` at once, see ``dispatch_batches``)
+  and result writes. A slow stage holds back the ones before it, so memory stays bounded by
+  the page size and queue depth however large the dataset is.
+
+  Within each page, orders with identical (normalized) baskets are collapsed before calling
+  the model, and intents already known for a basket are served from the local
+  ``intent_cache``; each intent is written back for every matching order_id.
+
+  Result rows are buffered and appended with BigQuery load jobs from a background thread
+  (see ``BufferedResultWriter``), so model calls never wait on the warehouse; an order is
+  only marked done once its row has been loaded, and rows of a rejected load are marked
+  failed and retried.
+
+  Progress is checkpointed per order in the ``intent_runs`` store. Failed batches are queued
+  and retried for up to ``retry_rounds`` further rounds instead of stopping the run; whatever
+  still fails can be picked up later with ``resume=<run_id>``, which only sends the orders not
+  yet done and continues reading the source where the run left off.
+
+  Args:
+    dataset_name: BigQuery dataset name (e.g. `project.dataset`).
+    sample_size: Number of rows to read from the source table (default 200); None or 0 reads
+      the full table. Ignored on resume.
+    progress_cb: Optional callable that receives JSON-serializable strings for progress updates.
+    max_in_flight: Maximum number of concurrent model requests.
+    use_cache: Set to False to ignore (but still populate) the basket intent cache.
+    resume: run_id of an earlier run of the same dataset to continue.
+    retry_rounds: How many times failed batches are re-sent within this call.
+    page_size: Rows fetched from BigQuery per page.
+    cancel_event: When set, stop reading and sending new work; batches already in flight are
+      still written and the run is left resumable with status ``cancelled``.
+
+  Returns:
+    The run_id, or None if there was nothing to infer.
+  """
+  def cancelled() -> bool:
+    return cancel_event is not None and cancel_event.is_set()
+
+  bq_client = get_bigquery_client(project=BQ_PROJECT)
+  table_id = f"{dataset_name}.intent_inference_results"
+  store = get_run_store()
+  cache = get_intent_cache()
+
+  if resume:
+    run_info = store.get_run(resume)
+    if run_info is None:
+      raise ValueError(f"Unknown run_id: {resume}")
+    if run_info["dataset"] != dataset_name:
+      raise ValueError(f"Run {resume} belongs to dataset {run_info['dataset']}, not {dataset_name}")
+    run_id = resume
+    counts = store.counts(run_id)
+    _emit({"type": "resume", "run_id": run_id, "remaining": counts[PENDING] + counts[FAILED],
+           "source_done": run_info["source_done"]}, progress_cb)
+    store.set_status(run_id, "running")
+  else:
+    sample_size = max(0, int(sample_size or 0)) or None
+    run_id = str(uuid.uuid4())
+    store.create_run(run_id, dataset_name, MODEL_NAME, sample_size=sample_size)
+    run_info = store.get_run(run_id)
+    _emit({"type": "start", "run_id": run_id, "sample_size": sample_size}, progress_cb)
+
+  def result_rows(intents: Iterable[Tuple[object, str]]) -> List[dict]:
+    created_at = datetime.utcnow().isoformat()
+    return [
+      {
+        "order_id": order_id,
+        "intent": intent,
+        "model": MODEL_NAME,
+        "run_id": run_id,
+        "created_at": created_at,
+      }
+      for order_id, intent in intents
+    ]
+
+  # Intent counts and intent x product for this run, kept as rows land (GET /intent/runs/{run_id}/aggregates)
+  aggregates = get_aggregates(("run", run_id)) if resume else reset_aggregates(("run", run_id))
+
+  # Orders only count as done once their rows are in the warehouse
+  def on_written(rows: List[dict]) -> None:
+    order_ids = [row["order_id"] for row in rows]
+    store.mark(run_id, order_ids, DONE)
+    products = store.products(run_id, order_ids)
+    aggregates.add({"intent": row["intent"], "products": products.get(row["order_id"])} for row in rows)
+    _emit({"type": "written", "count": len(rows)}, progress_cb)
+
+  def on_write_error(rows: List[dict], error: Exception) -> None:
+    store.mark(run_id, [row["order_id"] for row in rows], FAILED, str(error))
+    payload: Dict[str, object] = {"type": "write_failed", "text": str(error), "count": len(rows)}
+    row_errors = getattr(error, "errors", None)
+    if row_errors:
+      payload["errors"] = row_errors[:20]
+    _emit(payload, progress_cb)
+
+  writer = BufferedResultWriter(bq_client, table_id, on_written=on_written, on_error=on_write_error)
+
+  def write(item: dict) -> None:
+    """Writer stage: hand one unit of results to the buffered writer (runs on a worker thread)."""
+    if item.get("learned"):
+      cache.put_many(item["learned"], MODEL_NAME)
+    # Blocks only when the writer's buffer is full
+    writer.add(item.get("rows") or [])
+    store.mark(run_id, item.get("failed") or [], FAILED, item.get("error"))
+    if item.get("event"):
+      _emit(item["event"], progress_cb)
+
+  def stored_pages(statuses) -> AsyncIterator[List[dict]]:
+    return _pages_in_thread(store.iter_orders(run_id, statuses, page_size))
+
+  async def first_round_pages(stats: dict) -> AsyncIterator[List[dict]]:
+    if resume:
+      counts = store.counts(run_id)
+      stats["rows_total"] += counts[PENDING] + counts[FAILED]
+      async for page in stored_pages((PENDING, FAILED)):
+        yield page
+    if run_info["source_done"]:
+      return
+    rows_read = run_info["rows_read"]
+    source = _source_pages(bq_client, dataset_name, run_info["sample_size"], rows_read, page_size, stats)
+    async for page in _pages_in_thread(source):
+      rows_read += len(page)
+      # Checkpoint the page before any of it is sent, so a crash leaves it pending rather than lost
+      await asyncio.to_thread(store.add_orders, run_id, page, rows_read)
+      yield page
+    store.set_source_done(run_id)
+
+  async def run_round(pages: AsyncIterator[List[dict]], stats: dict) -> None:
+    page_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, INTENT_PIPELINE_DEPTH))
+    write_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, INTENT_PIPELINE_DEPTH))
+    # Batches in flight by index, as {representative order_id: order}, and the basket keys
+    # whose intents have already been handed to the writer
+    sent: Dict[int, Dict[object, dict]] = {}
+    delivered: Dict[int, set] = {}
+
+    def on_start(idx: int):
+      # Batches per row so far, extrapolated over the rows still to come
+      estimate = math.ceil(stats["rows_total"] * stats["batches"] / stats["rows_seen"]) if stats["rows_seen"] else 0
+      total_batches = max(estimate, stats["batches"])
+      _emit({"type": "progress", "text": f"🔹 Processing batch {idx+1}/{total_batches}", "batch": idx+1, "total_batches": total_batches}, progress_cb)
+
+    async def read():
+      async for page in pages:
+        if cancelled():
+          break
+        await page_queue.put(page)
+      await page_queue.put(None)
+
+    async def batches() -> AsyncIterator[List[dict]]:
+      while True:
+        page = await page_queue.get()
+        if page is None or cancelled():
+          # Orders of unread pages stay pending in the run store
+          return
+        stats["rows_seen"] += len(page)
+        groups = group_orders_by_basket(page)
+        cached = await asyncio.to_thread(cache.get_many, groups.keys(), MODEL_NAME) if use_cache else {}
+        stats["pages"] += 1
+        _emit({"type": "cache", "page": stats["pages"], "orders": len(page), "unique_baskets": len(groups),
+               "cache_hits": len(cached)}, progress_cb)
+        if cached:
+          intents = [(oid, intent) for key, intent in cached.items() for oid in groups[key]["order_ids"]]
+          await write_queue.put({"rows": result_rows(intents),
+                                 "event": {"type": "inserted", "count": len(intents), "source": "cache"}})
+        model_orders = [{**group, "key": key} for key, group in groups.items() if key not in cached]
+        for batch in pack_batches(model_orders):
+          sent[stats["batches"]] = {order["order_id"]: order for order in batch}
+          delivered[stats["batches"]] = set()
+          stats["batches"] += 1
+          yield batch
+
+    def fan_out(idx: int, result: List[dict]) -> Tuple[Dict[str, str], List[Tuple[object, str]]]:
+      """Spread each representative's intent over every order with the same basket, once per basket."""
+      learned: Dict[str, str] = {}
+      intents = []
+      for r in result:
+        order = sent[idx][r["order_id"]]
+        if order["key"] in delivered[idx]:
+          continue
+        delivered[idx].add(order["key"])
+        learned[order["key"]] = r["intent"]
+        intents.extend((oid, r["intent"]) for oid in order["order_ids"])
+      return learned, intents
+
+    async def on_partial(idx: int, result: List[dict]) -> None:
+      # Streamed intents go to the writer before the rest of their batch has been generated
+      learned, intents = fan_out(idx, result)
+      if intents:
+        await write_queue.put({"rows": result_rows(intents), "learned": learned,
+                               "event": {"type": "partial", "count": len(intents), "batch": idx + 1}})
+
+    async def call_model():
+      async for idx, result in dispatch_batches(batches(), max_in_flight=max_in_flight, on_start=on_start,
+                                                on_partial=on_partial):
+        learned, intents = fan_out(idx, [] if isinstance(result, Exception) else result)
+        orders = sent.pop(idx).values()
+        done_keys = delivered.pop(idx)
+        # Orders without an intent (failed call, or skipped by the model) go back on the retry queue
+        missing = [oid for order in orders if order["key"] not in done_keys for oid in order["order_ids"]]
+        written = sum(len(order["order_ids"]) for order in orders if order["key"] in done_keys)
+
+        if isinstance(result, Exception):
+          err_payload: Dict[str, object] = {"type": "batch_failed", "text": f"Batch {idx+1} failed: {result}", "batch": idx + 1,
+                                            "salvaged": written}
+          if isinstance(result, UnexpectedResponse):
+            err_payload["response"] = result.output
+          response_text = getattr(result, "response_text", None)
+          if response_text:
+            err_payload["response_text"] = response_text
+          await write_queue.put({"failed": missing, "error": str(result), "event": err_payload})
+          continue
+
+        await write_queue.put({"rows": result_rows(intents), "learned": learned,
+                               "failed": missing, "error": "no intent returned",
+                               "event": {"type": "inserted", "count": written, "batch": idx + 1,
+                                         "dropped": getattr(result, "dropped", 0)}})
+      await write_queue.put(None)
+
+    async def write_results():
+      while True:
+        item = await write_queue.get()
+        if item is None:
+          return
+        # Cache and checkpoint writes block; keep them off the event loop so in-flight requests keep flowing
+        await asyncio.to_thread(write, item)
+
+    tasks = [asyncio.create_task(stage()) for stage in (read, call_model, write_results)]
     try:
-      progress_cb(done_msg)
-    except Exception:
-      pass
+      await asyncio.gather(*tasks)
+    finally:
+      for task in tasks:
+        task.cancel()
+      await asyncio.gather(*tasks, return_exceptions=True)
+
+  def new_stats() -> dict:
+    return {"rows_total": 0, "rows_seen": 0, "pages": 0, "batches": 0}
+
+  def run_and_flush(pages: AsyncIterator[List[dict]], stats: dict) -> Dict[str, int]:
+    asyncio.run(run_round(pages, stats))
+    writer.flush()
+    return store.counts(run_id)
+
+  try:
+    stats = new_stats()
+    counts = run_and_flush(first_round_pages(stats), stats)
+    if not resume and sum(counts.values()) == 0:
+      store.set_status(run_id, "empty")
+      _emit({"type": "info", "text": f"No orders found in `{dataset_name}.orders_grouped` (sample_size={sample_size})."}, progress_cb)
+      return None
+
+    # Retry queue: failed orders are re-read from the checkpoint store and sent again
+    for attempt in range(1, max(0, int(retry_rounds)) + 1):
+      if not counts[FAILED] or cancelled():
+        break
+      _emit({"type": "retry", "round": attempt, "orders": counts[FAILED]}, progress_cb)
+      stats = new_stats()
+      stats["rows_total"] = counts[FAILED]
+      counts = run_and_flush(stored_pages((FAILED,)), stats)
+  finally:
+    # Rows already handed over are still written if a stage failed
+    writer.close()
+
+  if counts[FAILED] == 0 and counts[PENDING] == 0:
+    status = "completed"
+  else:
+    status = "cancelled" if cancelled() else "incomplete"
+  store.set_status(run_id, status)
+  done_payload: Dict[str, object] = {"type": "done", "text": f"Inference completed for dataset: {dataset_name}", "run_id": run_id,
+                                     "status": status, "orders": counts}
+  if status != "completed":
+    done_payload["text"] = f"Inference {status} for dataset: {dataset_name}; resume with run_id {run_id}"
+  _emit(done_payload, progress_cb)
+  return run_id
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import threading
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.utils.config import JOB_EVENT_HISTORY, JOBS_KEEP_FINISHED, MAX_CONCURRENT_JOBS, UPLOAD_MAX_JOBS
+
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobLimitReached(Exception):
+    """Raised by ``JobManager.submit`` when ``max_concurrent`` jobs are already active."""
+
+
+class Job:
+    """A background run with a replayable event log.
+
+    The target receives the job itself: it reports progress through ``publish`` (JSON strings,
+    the same shape as the services' ``progress_cb``) and should stop early once ``cancelled``
+    is set. Events are numbered from 1 so an SSE client can reattach with ``Last-Event-ID``.
+    """
+
+    def __init__(self, kind: str, params: Dict[str, Any], history: int = JOB_EVENT_HISTORY):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.created_at = datetime.utcnow().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.run_id: Optional[str] = None
+        self.last_event: Optional[dict] = None
+        self.cancelled = threading.Event()
+
+        self._lock = threading.Lock()
+        self._events: Deque[Tuple[int, dict]] = deque(maxlen=max(1, history))
+        self._published = 0
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def publish(self, msg: str) -> None:
+        """Record one progress message and wake every attached stream."""
+        try:
+            payload = json.loads(msg)
+        except (TypeError, ValueError):
+            payload = {"type": "message", "text": str(msg)}
+        if not isinstance(payload, dict):
+            payload = {"type": "message", "text": payload}
+        self._append(payload)
+
+    def _append(self, payload: dict, status: Optional[str] = None) -> None:
+        with self._lock:
+            if status is not None:
+                # Set together with the final event so a stream never sees one without the other
+                self.status = status
+            self._published += 1
+            self._events.append((self._published, payload))
+            self.last_event = payload
+            if payload.get("run_id"):
+                self.run_id = payload["run_id"]
+            waiters, self._waiters = self._waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The subscriber's loop has closed; nothing left to wake
+                pass
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    async def events(self, after: int = 0) -> AsyncIterator[Tuple[int, dict]]:
+        """Yield ``(event_id, payload)`` after ``after``, then live events until the job finishes.
+
+        Events that have already dropped out of the bounded history are skipped.
+        """
+        loop = asyncio.get_running_loop()
+        last = max(0, int(after))
+        while True:
+            wake = asyncio.Event()
+            with self._lock:
+                pending = [(i, p) for i, p in self._events if i > last]
+                done = self.finished
+                if not pending and not done:
+                    self._waiters.append((loop, wake))
+            for event_id, payload in pending:
+                last = event_id
+                yield event_id, payload
+            if pending:
+                continue
+            if done:
+                return
+            await wake.wait()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "run_id": self.run_id,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "cancel_requested": self.cancelled.is_set(),
+            "events": self._published,
+            "last_event": self.last_event,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Runs jobs on dedicated daemon threads (not the API's threadpool), at most ``max_concurrent`` at a time.
+
+    Finished jobs stay queryable until ``keep_finished`` newer ones have finished.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_JOBS, keep_finished: int = JOBS_KEEP_FINISHED):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.keep_finished = max(0, int(keep_finished))
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def active(self) -> List[Job]:
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.finished]
+
+    def submit(self, kind: str, target: Callable[[Job], Any], **params: Any) -> Job:
+        job = Job(kind, params)
+        with self._lock:
+            active = sum(1 for j in self._jobs.values() if not j.finished)
+            if active >= self.max_concurrent:
+                raise JobLimitReached(f"{active} jobs already running (limit {self.max_concurrent})")
+            self._jobs[job.id] = job
+            self._prune()
+        threading.Thread(target=self._run, args=(job, target), name=f"job-{job.id[:8]}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, target: Callable[[Job], Any]) -> None:
+        job.status = RUNNING
+        job.started_at = datetime.utcnow().isoformat()
+        try:
+            job.result = target(job)
+            status = CANCELLED if job.cancelled.is_set() else COMPLETED
+        except Exception as e:
+            job.error = str(e)
+            status = FAILED
+        job.finished_at = datetime.utcnow().isoformat()
+        end: Dict[str, Any] = {"type": "end", "status": status}
+        if job.error:
+            end["error"] = job.error
+        job._append(end, status=status)
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+
+_manager: Optional[JobManager] = None
+_upload_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Process-wide job manager, created on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
+
+
+def get_upload_job_manager() -> JobManager:
+    """Job manager for upload processing, so uploads never wait on inference job slots."""
+    global _upload_manager
+    with _manager_lock:
+        if _upload_manager is None:
+            _upload_manager = JobManager(max_concurrent=UPLOAD_MAX_JOBS)
+        return _upload_manager
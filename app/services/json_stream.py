@@ -0,0 +1,87 @@
+import json
+from typing import List
+
+
+class JsonObjectStream:
+    """Pull complete objects out of a JSON array while its text is still arriving.
+
+    ``feed`` takes the next piece of text and returns the objects completed by it. Anything
+    between objects (brackets, commas, chatter around the array) is skipped, and an object that
+    does not parse is dropped without losing the ones around it. With ``flat=True`` objects are
+    expected to hold no nested objects, so an opening brace inside one means it was cut off and
+    a new object starts there; a raw newline inside a string likewise abandons the object.
+    """
+
+    def __init__(self, flat: bool = True):
+        self.flat = flat
+        self.dropped = 0
+        self._buf: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def _reset(self) -> None:
+        self._buf = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> List[dict]:
+        found: List[dict] = []
+        for ch in text:
+            if self._depth == 0:
+                if ch == "{":
+                    self._buf = [ch]
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if ch == "\n":
+                    self.dropped += 1
+                    self._reset()
+                    continue
+                self._buf.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == "{" and self.flat:
+                # Previous object never closed; start over from this one
+                self.dropped += 1
+                self._reset()
+                self._buf = [ch]
+                self._depth = 1
+                continue
+
+            self._buf.append(ch)
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        obj = json.loads("".join(self._buf))
+                    except ValueError:
+                        obj = None
+                    if isinstance(obj, dict):
+                        found.append(obj)
+                    else:
+                        self.dropped += 1
+                    self._reset()
+        return found
+
+    @property
+    def pending(self) -> bool:
+        """True while an object has been started but not completed."""
+        return self._depth > 0
+
+
+def parse_objects(text: str, flat: bool = True) -> List[dict]:
+    """All well-formed objects of a (possibly truncated or malformed) JSON array."""
+    return JsonObjectStream(flat=flat).feed(text)
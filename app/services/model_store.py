@@ -0,0 +1,192 @@
+import hashlib
+import os
+import pickle
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+from app.utils.config import ARIMA_REFIT_AFTER_DAYS, ARIMA_REFIT_RATIO, MODEL_STORE_DIR
+
+
+# Fitted models by (series_id, model name); backed by pickle files in MODEL_STORE_DIR
+_models: LRUCache = LRUCache(maxsize=256)
+_store_lock = threading.Lock()
+
+
+def data_hash(train: pd.Series) -> str:
+    """Hash of a training series' dates and values."""
+    h = hashlib.sha1()
+    h.update(np.asarray(train.index.values, dtype='datetime64[ns]').view('int64').tobytes())
+    h.update(np.ascontiguousarray(train.values, dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def _path(series_id: str, model: str) -> str:
+    key = hashlib.sha1(series_id.encode("utf-8")).hexdigest()
+    return os.path.join(MODEL_STORE_DIR, f"{key}-{model}.pkl")
+
+
+def _ensure_dir() -> None:
+    """Create MODEL_STORE_DIR readable and writable by this user only."""
+    os.makedirs(MODEL_STORE_DIR, mode=0o700, exist_ok=True)
+
+
+def _trusted(f) -> bool:
+    """Whether an open model file may be unpickled: owned by this user and writable by no one else."""
+    if not hasattr(os, "getuid"):
+        return True
+    st = os.fstat(f.fileno())
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+def _load(series_id: str, model: str) -> Optional[Dict[str, Any]]:
+    with _store_lock:
+        entry = _models.get((series_id, model))
+    if entry is not None:
+        return entry
+    path = _path(series_id, model)
+    try:
+        with open(path, "rb") as f:
+            if not _trusted(f):
+                # Unpickling runs arbitrary code, so never load a file someone else could have written
+                print(f"WARNING: ignoring {path}: not owned by this user or writable by others")
+                return None
+            entry = pickle.load(f)
+    except Exception:
+        return None
+    with _store_lock:
+        _models[(series_id, model)] = entry
+    return entry
+
+
+def _save(series_id: str, model: str, entry: Dict[str, Any]) -> None:
+    with _store_lock:
+        _models[(series_id, model)] = entry
+    try:
+        _ensure_dir()
+        path = _path(series_id, model)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entry, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"WARNING: could not persist {model} model for {series_id}: {e}")
+
+
+def _match(entry: Optional[Dict[str, Any]], train: pd.Series) -> str:
+    """Classify a stored entry against ``train``: 'same', 'extends' (train adds new points) or 'stale'."""
+    if entry is None:
+        return 'stale'
+    n = entry['n_obs']
+    if len(train) == n and data_hash(train) == entry['data_hash']:
+        return 'same'
+    if len(train) > n and data_hash(train.iloc[:n]) == entry['data_hash']:
+        return 'extends'
+    return 'stale'
+
+
+def get_arima(series_id: str, train: pd.Series, order: Tuple[int, int, int] = (1, 1, 1),
+              seasonal_order: Tuple[int, int, int, int] = (0, 0, 0, 0)):
+    """Return fitted ARIMA results for ``train``, reusing the stored fit where possible.
+
+    Unchanged data returns the stored model; new trailing observations are appended to the
+    stored state with ``refit=False``; anything else triggers a full fit. Appending keeps the
+    parameters of the last full fit, so once more than ``ARIMA_REFIT_AFTER_DAYS`` days, or more
+    than ``ARIMA_REFIT_RATIO`` of that fit's length, have been appended the model is refitted.
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+
+    entry = _load(series_id, 'ARIMA')
+    if entry is not None and (tuple(entry.get('order', ())) != tuple(order)
+                              or tuple(entry.get('seasonal_order', (0, 0, 0, 0))) != tuple(seasonal_order)):
+        entry = None
+    status = _match(entry, train)
+    if status == 'same':
+        return entry['fitted']
+
+    values = np.asarray(train.values, dtype=float)
+    if status == 'extends':
+        fit_n_obs = entry.get('fit_n_obs', entry['n_obs'])
+        appended = len(train) - fit_n_obs
+        if appended > ARIMA_REFIT_AFTER_DAYS or appended > ARIMA_REFIT_RATIO * fit_n_obs:
+            status = 'stale'
+    if status == 'extends':
+        fitted = entry['fitted'].append(values[entry['n_obs']:], refit=False)
+    else:
+        fitted = ARIMA(values, order=order, seasonal_order=seasonal_order).fit()
+        fit_n_obs = len(train)
+
+    _save(series_id, 'ARIMA', {
+        'data_hash': data_hash(train),
+        'n_obs': len(train),
+        'fit_n_obs': fit_n_obs,
+        'order': tuple(order),
+        'seasonal_order': tuple(seasonal_order),
+        'fitted': fitted,
+    })
+    return fitted
+
+
+def get_arima_order(series_id: str, version: str) -> Optional[Dict[str, Any]]:
+    """Return the ARIMA order selected for ``series_id`` at data ``version`` (see ``arima_search``).
+
+    Only the latest version's choice is kept; a selection made on other data returns None.
+    """
+    entry = _load(series_id, 'ARIMA-order')
+    if entry is None or entry.get('version') != version:
+        return None
+    return entry['selection']
+
+
+def save_arima_order(series_id: str, version: str, selection: Dict[str, Any]) -> None:
+    _save(series_id, 'ARIMA-order', {'version': version, 'selection': selection})
+
+
+def _prophet_warm_start(m) -> Dict[str, Any]:
+    # From the Prophet docs on updating fitted models
+    res = {}
+    for pname in ['k', 'm', 'sigma_obs']:
+        res[pname] = m.params[pname][0][0]
+    for pname in ['delta', 'beta']:
+        res[pname] = m.params[pname][0]
+    return res
+
+
+def get_prophet(series_id: str, train: pd.Series):
+    """Return a fitted Prophet model for ``train``, reusing the stored fit where possible.
+
+    Prophet cannot append observations, so new data refits warm-started from the stored parameters.
+    """
+    from prophet import Prophet
+    from prophet.serialize import model_from_json, model_to_json
+
+    entry = _load(series_id, 'Prophet')
+    status = _match(entry, train)
+    previous = model_from_json(entry['model_json']) if status != 'stale' else None
+    if status == 'same':
+        return previous
+
+    df_prophet = pd.DataFrame({'ds': train.index, 'y': train.values})
+    m = Prophet()
+    if previous is not None:
+        m.fit(df_prophet, init=_prophet_warm_start(previous))
+    else:
+        m.fit(df_prophet)
+
+    _save(series_id, 'Prophet', {'data_hash': data_hash(train), 'n_obs': len(train), 'model_json': model_to_json(m)})
+    return m
+
+
+def clear_model_store(remove_files: bool = True) -> None:
+    with _store_lock:
+        _models.clear()
+    if remove_files and os.path.isdir(MODEL_STORE_DIR):
+        for name in os.listdir(MODEL_STORE_DIR):
+            if name.endswith(".pkl"):
+                try:
+                    os.remove(os.path.join(MODEL_STORE_DIR, name))
+                except OSError:
+                    pass
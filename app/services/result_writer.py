@@ -0,0 +1,170 @@
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from app.utils.config import INTENT_WRITE_FLUSH_ROWS, INTENT_WRITE_FLUSH_SECONDS
+
+
+# Columns of ``intent_inference_results`` (see ``intent_service.run_intent_inference``)
+RESULTS_SCHEMA: Sequence[Tuple[str, str, str]] = (
+    ("order_id", "INTEGER", "NULLABLE"),
+    ("intent", "STRING", "NULLABLE"),
+    ("model", "STRING", "NULLABLE"),
+    ("run_id", "STRING", "NULLABLE"),
+    ("created_at", "TIMESTAMP", "NULLABLE"),
+)
+
+
+class WriteError(Exception):
+    """A flush was rejected; ``errors`` holds BigQuery's row-level error records."""
+
+    def __init__(self, message: str, errors: Optional[List[dict]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def load_rows(client, table_id: str, rows: List[dict],
+              schema: Sequence[Tuple[str, str, str]] = RESULTS_SCHEMA) -> None:
+    """Append ``rows`` to ``table_id`` with one load job and wait for it.
+
+    Load jobs are free, unlike streaming inserts, but count against the per-table daily
+    load-job quota, hence the buffering in ``BufferedResultWriter``. The schema is passed
+    explicitly (no autodetect), so a flush whose values all look like one type cannot change
+    or fail against the table's columns. Any bad row fails the whole job and is reported
+    through ``WriteError``.
+    """
+    from google.cloud import bigquery
+
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        schema=[bigquery.SchemaField(name, field_type, mode=mode) for name, field_type, mode in schema],
+        autodetect=False,
+        max_bad_records=0,
+    )
+    job = client.load_table_from_json(rows, table_id, job_config=job_config)
+    try:
+        job.result()
+    except Exception as e:
+        raise WriteError(f"Load into {table_id} failed: {e}", getattr(job, "errors", None)) from e
+    if job.errors:
+        raise WriteError(f"Load into {table_id} reported errors", job.errors)
+
+
+class BufferedResultWriter:
+    """Collect result rows and append them to BigQuery from a background thread.
+
+    Rows are flushed when ``flush_rows`` have accumulated or ``flush_seconds`` have passed
+    since the first buffered row, whichever comes first. Flushes are meant to be size-driven:
+    every flush is a load job, and a table allows 1,500 a day, so the time cap defaults to
+    ``INTENT_WRITE_FLUSH_SECONDS`` (10 minutes, at most 144 jobs a day for a run that never
+    fills a batch). The cost is latency: rows, and the ``on_written`` progress and checkpoints
+    that follow them, can lag that long behind inference. ``on_written(rows)`` is called after
+    each successful flush and ``on_error(rows, exc)`` with the rows of a failed one, both on
+    the writer thread. ``add`` blocks while more than ``max_buffered_rows`` are waiting, so a
+    slow warehouse holds back producers instead of growing memory.
+    """
+
+    def __init__(self, client, table_id: str,
+                 flush_rows: int = INTENT_WRITE_FLUSH_ROWS,
+                 flush_seconds: float = INTENT_WRITE_FLUSH_SECONDS,
+                 on_written: Optional[Callable[[List[dict]], None]] = None,
+                 on_error: Optional[Callable[[List[dict], Exception], None]] = None,
+                 max_buffered_rows: Optional[int] = None,
+                 write: Callable[[object, str, List[dict]], None] = load_rows):
+        self.client = client
+        self.table_id = table_id
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_seconds = float(flush_seconds)
+        self.max_buffered_rows = max_buffered_rows or 4 * self.flush_rows
+        self.on_written = on_written
+        self.on_error = on_error
+        self._write = write
+        self.rows_written = 0
+        self.failed_flushes = 0
+
+        self._buffer: List[dict] = []
+        self._first_row_at: Optional[float] = None
+        self._flush_requested = False
+        self._writing = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, rows: List[dict]) -> None:
+        if not rows:
+            return
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("writer is closed")
+            while len(self._buffer) >= self.max_buffered_rows:
+                self._cond.wait()
+            if not self._buffer:
+                self._first_row_at = time.monotonic()
+            self._buffer.extend(rows)
+            self._cond.notify_all()
+
+    def flush(self) -> None:
+        """Write everything buffered so far and wait until it is done."""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._buffer or self._writing:
+                self._cond.wait()
+
+    def close(self) -> None:
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def __enter__(self) -> "BufferedResultWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _due(self) -> bool:
+        if not self._buffer:
+            return False
+        return (self._flush_requested or self._closed or len(self._buffer) >= self.flush_rows
+                or time.monotonic() - self._first_row_at >= self.flush_seconds)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._due():
+                    if self._closed:
+                        return
+                    if not self._buffer:
+                        self._flush_requested = False
+                        self._cond.notify_all()
+                    timeout = None if not self._buffer else max(0.0, self._first_row_at + self.flush_seconds - time.monotonic())
+                    self._cond.wait(timeout)
+                rows, self._buffer = self._buffer[:self.flush_rows], self._buffer[self.flush_rows:]
+                self._first_row_at = time.monotonic() if self._buffer else None
+                self._writing = True
+                self._cond.notify_all()
+            error: Optional[Exception] = None
+            try:
+                self._write(self.client, self.table_id, rows)
+            except Exception as e:
+                error = e
+            try:
+                if error is None:
+                    self.rows_written += len(rows)
+                    if self.on_written:
+                        self.on_written(rows)
+                else:
+                    self.failed_flushes += 1
+                    if self.on_error:
+                        self.on_error(rows, error)
+            except Exception:
+                # A failing callback must not take the writer thread down with it
+                pass
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
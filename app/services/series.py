@@ -0,0 +1,104 @@
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+
+# Prepared series memoized by content hash, shared across requests
+_series_cache: LRUCache = LRUCache(maxsize=128)
+_series_lock = threading.Lock()
+
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """Content hash of the 'Date' and 'Total Price' columns of ``df``."""
+    hashed = pd.util.hash_pandas_object(df[['Date', 'Total Price']], index=False)
+    return hashlib.sha1(hashed.values.tobytes()).hexdigest()
+
+
+class DailySeries:
+    """Daily 'Total Price' series aggregated and sorted once, with cached derived values.
+
+    Build instances with :meth:`from_frame` so identical inputs share one prepared object.
+    ``run_diagnostics`` and ``run_forecast`` accept either a DailySeries or a raw DataFrame.
+
+    Instances are shared across concurrent requests: the cheap derived values are computed
+    when the series is built, and the ACF/PACF caches are filled under a per-instance lock.
+    """
+
+    def __init__(self, ts: pd.Series, key: str):
+        self.ts = ts
+        self.key = key
+        # Forward-filled values as a float array
+        self.values: np.ndarray = np.asarray(ts.ffill().values, dtype=float)
+        self.variance = float(ts.var())
+        # First-differenced series (leading NaN dropped)
+        self.diff: pd.Series = ts.diff().dropna()
+        self._lock = threading.Lock()
+        self._acf: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pacf: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "DailySeries":
+        if not isinstance(df, pd.DataFrame):
+            raise ValueError('df must be a pandas DataFrame')
+        if 'Date' not in df.columns or 'Total Price' not in df.columns:
+            raise ValueError("DataFrame must contain 'Date' and 'Total Price' columns")
+
+        key = frame_hash(df)
+        with _series_lock:
+            cached = _series_cache.get(key)
+        if cached is not None:
+            return cached
+
+        dates = pd.to_datetime(df['Date'])
+        ts = df['Total Price'].groupby(dates).sum().sort_index()
+        ts.index.name = 'Date'
+        ts.name = 'Total Price'
+
+        series = cls(ts, key)
+        with _series_lock:
+            _series_cache[key] = series
+        return series
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def acf(self, nlags: int) -> np.ndarray:
+        return self._correlogram('acf', nlags)[0]
+
+    def acf_confint(self, nlags: int) -> np.ndarray:
+        """95% confidence band for ``acf(nlags)``, shape (nlags + 1, 2)."""
+        return self._correlogram('acf', nlags)[1]
+
+    def pacf(self, nlags: int) -> np.ndarray:
+        return self._correlogram('pacf', nlags)[0]
+
+    def pacf_confint(self, nlags: int) -> np.ndarray:
+        """95% confidence band for ``pacf(nlags)``, shape (nlags + 1, 2)."""
+        return self._correlogram('pacf', nlags)[1]
+
+    def _correlogram(self, kind: str, nlags: int) -> Tuple[np.ndarray, np.ndarray]:
+        cache = self._acf if kind == 'acf' else self._pacf
+        # Held while computing so concurrent requests for the same lags compute them once
+        with self._lock:
+            if nlags not in cache:
+                from statsmodels.tsa.stattools import acf, pacf
+                fn = acf if kind == 'acf' else pacf
+                cache[nlags] = fn(self.values, nlags=nlags, alpha=0.05)
+            return cache[nlags]
+
+
+def get_cached_series(key: str) -> Optional[DailySeries]:
+    """Look up a prepared series by its content hash (``DailySeries.key``)."""
+    with _series_lock:
+        return _series_cache.get(key)
+
+
+def as_daily_series(data: Union[pd.DataFrame, DailySeries]) -> DailySeries:
+    """Return ``data`` unchanged if already prepared, otherwise prepare it."""
+    if isinstance(data, DailySeries):
+        return data
+    return DailySeries.from_frame(data)
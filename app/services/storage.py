@@ -1,35 +1,280 @@
-from typing import Dict, Any, List
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+from app.services.intent_aggregates import IntentAggregates, find_aggregates, reset_aggregates
+from app.utils.config import STORE_MEMORY_BYTES, STORE_SPILL_DIR
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+
+BASKETS = "baskets"
+INTENTS = "intents"
+
+Key = Tuple[str, str, int]
+SPILL_PREFIX = "store-"
+
+
+def _encode(table: "pa.Table") -> "pa.Table":
+    """Dictionary-encode string and list-of-string columns; product and intent names repeat a lot."""
+    import pyarrow as pa
+
+    columns = []
+    for column in table.columns:
+        column = column.combine_chunks()
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            column = column.dictionary_encode()
+        elif pa.types.is_list(column.type) and pa.types.is_string(column.type.value_type):
+            column = pa.ListArray.from_arrays(column.offsets, column.values.dictionary_encode(),
+                                              mask=column.is_null())
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def _to_table(rows: Union["pa.Table", List[Dict[str, Any]]]) -> "pa.Table":
+    import pyarrow as pa
+
+    if isinstance(rows, pa.Table):
+        return rows
+    return pa.Table.from_pylist(list(rows))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to someone else
+        return True
+    return True
+
+
+def remove_stale_spills(spill_root: str) -> None:
+    """Delete spill directories left in ``spill_root`` by store processes that no longer run."""
+    if not os.path.isdir(spill_root):
+        return
+    for name in os.listdir(spill_root):
+        pid = name[len(SPILL_PREFIX):].split("-", 1)[0] if name.startswith(SPILL_PREFIX) else ""
+        if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+            shutil.rmtree(os.path.join(spill_root, name), ignore_errors=True)
+
+
+class DatasetStore:
+    """Baskets and intents per ``(user_id, dataset_id)``, kept as Arrow tables.
+
+    Tables are held in memory up to ``memory_budget`` bytes; beyond that the least recently
+    used ones are written to Arrow IPC files and served from there through a memory map, so
+    the OS pages them in on demand instead of the process holding them. Spilled files go to a
+    directory private to this process (mode 0700, random name) under ``spill_dir``, removed
+    when the process exits; directories of processes that died are removed on startup.
+
+    Every table belongs to one user's dataset: callers always name both, and there is no
+    "most recent" fallback that could hand one tenant another tenant's data.
+    """
+
+    def __init__(self, memory_budget: int = STORE_MEMORY_BYTES, spill_dir: str = STORE_SPILL_DIR):
+        self.memory_budget = max(0, int(memory_budget))
+        self.spill_root = spill_dir
+        self.spill_dir: Optional[str] = None
+        self._lock = threading.Lock()
+        self._resident: "OrderedDict[Key, pa.Table]" = OrderedDict()
+        self._resident_bytes = 0
+        self._spilled: Dict[Key, str] = {}
+        remove_stale_spills(spill_dir)
+
+    @property
+    def resident_bytes(self) -> int:
+        return self._resident_bytes
+
+    def put(self, kind: str, user_id: str, dataset_id: int, table: "pa.Table") -> None:
+        key = (kind, user_id, dataset_id)
+        with self._lock:
+            self._drop(key)
+            self._resident[key] = table
+            self._resident_bytes += table.nbytes
+            while self._resident_bytes > self.memory_budget and self._resident:
+                self._spill_oldest()
+
+    def get(self, kind: str, user_id: str, dataset_id: int) -> Optional["pa.Table"]:
+        """Table stored under the key, or None."""
+        import pyarrow as pa
+
+        key = (kind, user_id, dataset_id)
+        with self._lock:
+            table = self._resident.get(key)
+            if table is not None:
+                self._resident.move_to_end(key)
+                return table
+            path = self._spilled.get(key)
+        if path is None:
+            return None
+        return pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+    def drop(self, kind: str, user_id: str, dataset_id: int) -> None:
+        with self._lock:
+            self._drop((kind, user_id, dataset_id))
+
+    def close(self) -> None:
+        """Forget every table and delete this process's spill directory."""
+        with self._lock:
+            self._resident.clear()
+            self._resident_bytes = 0
+            self._spilled.clear()
+            if self.spill_dir:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir = None
+
+    def _drop(self, key: Key) -> None:
+        table = self._resident.pop(key, None)
+        if table is not None:
+            self._resident_bytes -= table.nbytes
+        path = self._spilled.pop(key, None)
+        if path and os.path.exists(path):
+            # Open memory maps keep their pages; only the name goes away
+            os.remove(path)
+
+    def _spill_oldest(self) -> None:
+        import pyarrow as pa
+
+        key, table = self._resident.popitem(last=False)
+        self._resident_bytes -= table.nbytes
+        if self.spill_dir is None:
+            os.makedirs(self.spill_root, mode=0o700, exist_ok=True)
+            self.spill_dir = tempfile.mkdtemp(prefix=f"{SPILL_PREFIX}{os.getpid()}-", dir=self.spill_root)
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        path = os.path.join(self.spill_dir, f"{key[0]}-{name}.arrow")
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        self._spilled[key] = path
+
+
+_store: Optional[DatasetStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> DatasetStore:
+    """Process-wide dataset store, created on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DatasetStore()
+            atexit.register(_store.close)
+        return _store
+
+
+_values: Dict[str, Any] = {}
 
-_data_store: Dict[str, Any] = {}
 
 def save(key: str, value: Any) -> None:
-    _data_store[key] = value
+    _values[key] = value
+
 
 def get(key: str) -> Any:
-    return _data_store.get(key)
-# app/services/storage.py
-from typing import Dict, Any, List
+    return _values.get(key)
+
+
+def set_baskets(baskets: Union["pa.Table", List[Dict[str, Any]]], user_id: str, dataset_id: int) -> None:
+    get_store().put(BASKETS, user_id, dataset_id, _encode(_to_table(baskets)))
+
+
+def get_baskets_table(user_id: str, dataset_id: int) -> Optional["pa.Table"]:
+    return get_store().get(BASKETS, user_id, dataset_id)
+
+
+def get_baskets(user_id: str, dataset_id: int) -> List[Dict[str, Any]]:
+    # An empty list if nothing was stored under the key
+    table = get_baskets_table(user_id, dataset_id)
+    return table.to_pylist() if table is not None else []
+
+
+def _scope(user_id: str, dataset_id: int) -> Tuple[str, str, int]:
+    return ("dataset", user_id, dataset_id)
+
+
+def _with_products(intents: "pa.Table", user_id: str, dataset_id: int) -> "pa.Table":
+    """Intent rows with their baskets' products (joined on order_id) for co-occurrence counts."""
+    if "products" in intents.column_names or "order_id" not in intents.column_names:
+        return intents
+    baskets = get_store().get(BASKETS, user_id, dataset_id)
+    if baskets is None or not {"order_id", "products"} <= set(baskets.column_names):
+        return intents
+    import pyarrow.compute as pc
+
+    # Row of each order in the baskets table (null when unknown) -> that row's products
+    rows = pc.index_in(intents.column("order_id"), value_set=baskets.column("order_id"))
+    return intents.append_column("products", baskets.column("products").take(rows))
+
+
+# Serializes read-modify-write of a dataset's intents table and aggregates
+_intents_lock = threading.Lock()
+
+
+def _rebuild_aggregates(table: "pa.Table", user_id: str, dataset_id: int) -> IntentAggregates:
+    aggregates = IntentAggregates()
+    aggregates.add_table(_with_products(table, user_id, dataset_id))
+    return reset_aggregates(_scope(user_id, dataset_id), aggregates)
+
+
+def _dataset_aggregates(user_id: str, dataset_id: int) -> Optional[IntentAggregates]:
+    """Aggregates of a dataset's stored intents, rebuilt from the table if the scope was evicted."""
+    aggregates = find_aggregates(_scope(user_id, dataset_id))
+    if aggregates is not None:
+        return aggregates
+    with _intents_lock:
+        aggregates = find_aggregates(_scope(user_id, dataset_id))
+        if aggregates is not None:
+            return aggregates
+        table = get_store().get(INTENTS, user_id, dataset_id)
+        return _rebuild_aggregates(table, user_id, dataset_id) if table is not None else None
+
+
+def set_intents(rows: Union["pa.Table", List[dict]], user_id: str, dataset_id: int) -> None:
+    table = _encode(_to_table(rows))
+    with _intents_lock:
+        get_store().put(INTENTS, user_id, dataset_id, table)
+        _rebuild_aggregates(table, user_id, dataset_id)
+
+
+def append_intents(rows: Union["pa.Table", List[dict]], user_id: str, dataset_id: int) -> None:
+    """Add intent rows to what is stored for the dataset, updating its aggregates with just these rows.
+
+    If the dataset's aggregates were evicted (``INTENT_AGGREGATE_SCOPES``) they are rebuilt
+    from the whole stored table instead, so counts always match the stored rows.
+    """
+    import pyarrow as pa
+
+    table = _encode(_to_table(rows))
+    store = get_store()
+    with _intents_lock:
+        existing = store.get(INTENTS, user_id, dataset_id)
+        combined = pa.concat_tables([existing, table], promote_options="permissive") if existing is not None else table
+        store.put(INTENTS, user_id, dataset_id, combined)
+        aggregates = find_aggregates(_scope(user_id, dataset_id))
+        if aggregates is None:
+            _rebuild_aggregates(combined, user_id, dataset_id)
+        else:
+            aggregates.add_table(_with_products(table, user_id, dataset_id))
 
-_data_store: Dict[str, Any] = {}
 
-def set_baskets(baskets: List[Dict[str, Any]]):
-    _data_store["baskets"] = baskets
+def get_intents(user_id: str, dataset_id: int) -> List[dict]:
+    table = get_store().get(INTENTS, user_id, dataset_id)
+    return table.to_pylist() if table is not None else []
 
-def get_baskets() -> List[Dict[str, Any]]:
-    # This ensures an empty list is returned if the "baskets" key doesn't exist
-    return _data_store.get("baskets", [])
 
-def set_intents(rows: list[dict]) -> None:
-    _data_store["intents"] = rows
+def get_intent_counts(user_id: str, dataset_id: int) -> Dict[str, int]:
+    """Intent -> count, from the incrementally kept aggregates (no scan of the rows)."""
+    aggregates = _dataset_aggregates(user_id, dataset_id)
+    return aggregates.counts() if aggregates is not None else {}
 
-def get_intents() -> list[dict]:
-    return _data_store.get("intents", [])
 
-def get_intent_counts() -> dict[str, int]:
-    intents = _data_store.get("intents", [])
-    counts = {}
-    for row in intents:
-        intent = row.get("intent")
-        if intent:
-            counts[intent] = counts.get(intent, 0) + 1
-    return counts
\ No newline at end of file
+def get_intent_aggregates(user_id: str, dataset_id: int, k: int = 10) -> dict:
+    """Row counts, top ``k`` intents and each one's top ``k`` products for a dataset."""
+    aggregates = _dataset_aggregates(user_id, dataset_id)
+    return (aggregates or IntentAggregates()).snapshot(k)
@@ -0,0 +1,261 @@
+import csv
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.config import UPLOAD_CSV_BLOCK_BYTES, UPLOAD_WORKERS
+
+
+# Header columns that identify each of the three Instacart-style input files
+FILE_TYPES = [
+    ("orders", {"order_id", "user_id", "order_date", "Total cost"}),
+    ("order_products", {"order_id", "product_id"}),
+    ("products", {"product_id", "product_name"}),
+]
+
+# Arrow types for known columns, so every CSV block parses the same way (and matches the
+# BigQuery Orders schema) instead of depending on what the first block happens to contain
+COLUMN_TYPES = {
+    "order_id": "int64",
+    "user_id": "int64",
+    "product_id": "int64",
+    "product_name": "string",
+    "order_date": "string",
+    "Total cost": "float64",
+    "City": "string",
+    "payment method": "string",
+    "User name": "string",
+    "Store type": "string",
+    "Customer_Category": "string",
+    "Season": "string",
+    "Promotion": "string",
+    "Total_Items": "string",
+}
+
+
+def read_header(path: str) -> List[str]:
+    """Column names from the first line of a CSV file, without reading the rest."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), [])
+
+
+def detect_file_type(columns: List[str]) -> Optional[str]:
+    cols = set(columns)
+    for file_type, required in FILE_TYPES:
+        if required <= cols:
+            return file_type
+    return None
+
+
+def staged_path(user_dir: str, file_type: str) -> str:
+    return os.path.join(user_dir, f"{file_type}.parquet")
+
+
+_claim_lock = threading.Lock()
+
+
+def claim_staged_files(user_dir: str, file_types: List[str]) -> Optional[str]:
+    """Move a complete set of staged files out of ``user_dir`` into a new job directory.
+
+    The job then reads only its own copies, so uploads arriving while it runs stage a new set
+    in ``user_dir`` instead of changing its inputs mid-merge. Returns the job directory, or
+    None if a file is missing (not uploaded yet, or claimed by a concurrent upload first).
+    """
+    with _claim_lock:
+        if not all(os.path.exists(staged_path(user_dir, t)) for t in file_types):
+            return None
+        job_dir = tempfile.mkdtemp(prefix="job-", dir=user_dir)
+        moved = []
+        try:
+            for file_type in file_types:
+                os.rename(staged_path(user_dir, file_type), staged_path(job_dir, file_type))
+                moved.append(file_type)
+        except FileNotFoundError:
+            # Another worker process claimed the set between the check and the move
+            release_staged_files(job_dir, user_dir, moved)
+            return None
+        return job_dir
+
+
+def release_staged_files(job_dir: str, user_dir: str, file_types: List[str]) -> None:
+    """Put a job's unused inputs back in ``user_dir`` (unless newer uploads replaced them) and remove ``job_dir``."""
+    with _claim_lock:
+        for file_type in file_types:
+            src, dest = staged_path(job_dir, file_type), staged_path(user_dir, file_type)
+            if os.path.exists(src) and not os.path.exists(dest):
+                os.replace(src, dest)
+    shutil.rmtree(job_dir, ignore_errors=True)
+
+
+def csv_to_parquet(src: str, dest: str, columns: List[str],
+                   block_bytes: int = UPLOAD_CSV_BLOCK_BYTES) -> Tuple[int, int]:
+    """Convert ``src`` to Parquet block by block with Arrow's multithreaded CSV reader.
+
+    Only one block (``block_bytes`` of CSV) is held in memory at a time. The file is written
+    under a temporary name and moved into place, so a failed conversion never leaves a
+    half-written ``dest`` behind. Returns ``(rows, columns)``.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    import pyarrow.parquet as pq
+
+    column_types: Dict[str, pa.DataType] = {
+        name: pa.type_for_alias(COLUMN_TYPES[name]) for name in columns if name in COLUMN_TYPES
+    }
+    reader = pv.open_csv(
+        src,
+        read_options=pv.ReadOptions(use_threads=True, block_size=block_bytes),
+        convert_options=pv.ConvertOptions(column_types=column_types),
+    )
+    tmp = dest + ".part"
+    rows = 0
+    try:
+        with pq.ParquetWriter(tmp, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return rows, len(reader.schema)
+
+
+# Arrow type for each BigQuery column type used by the Orders schema
+BIGQUERY_ARROW_TYPES = {
+    "INTEGER": "int64",
+    "FLOAT": "float64",
+    "STRING": "string",
+    "BOOLEAN": "bool",
+}
+
+
+def arrow_schema(schema: List[Tuple[str, str, str]]):
+    """Arrow schema for a BigQuery schema given as ``(name, type, mode)`` tuples."""
+    import pyarrow as pa
+
+    fields = []
+    for name, field_type, mode in schema:
+        arrow_type = pa.type_for_alias(BIGQUERY_ARROW_TYPES[field_type])
+        if mode == "REPEATED":
+            arrow_type = pa.list_(arrow_type)
+        fields.append(pa.field(name, arrow_type, nullable=mode != "REQUIRED"))
+    return pa.schema(fields)
+
+
+def conform_table(table, schema: List[Tuple[str, str, str]], **constants):
+    """Reshape ``table`` to ``schema``: its columns in schema order and type, nulls for the
+    missing ones, and ``constants`` (e.g. ``dataset_id=7``) as constant columns. Columns the
+    schema does not know are left out.
+
+    Dictionary-encoded strings are kept as they are; Parquet stores them as plain strings.
+    """
+    import pyarrow as pa
+
+    target = arrow_schema(schema)
+    columns = []
+    for field in target:
+        if field.name in constants:
+            column = pa.repeat(pa.scalar(constants[field.name], field.type), table.num_rows)
+        elif field.name in table.column_names:
+            column = table.column(field.name)
+            if not _same_storage(column.type, field.type):
+                column = column.cast(field.type)
+        else:
+            column = pa.nulls(table.num_rows, field.type)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=target.names)
+
+
+def _same_storage(actual, expected) -> bool:
+    import pyarrow as pa
+
+    if pa.types.is_dictionary(actual):
+        return actual.value_type == expected
+    if pa.types.is_list(actual) and pa.types.is_list(expected):
+        return _same_storage(actual.value_type, expected.value_type)
+    return actual == expected
+
+
+def write_parquet(table, dest: str, row_group_rows: int = 1_000_000) -> int:
+    """Write ``table`` to ``dest`` (via a temporary name) and return its size in bytes."""
+    import pyarrow.parquet as pq
+
+    tmp = dest + ".part"
+    try:
+        pq.write_table(table, tmp, row_group_size=row_group_rows, compression="snappy")
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return os.path.getsize(dest)
+
+
+def load_parquet(client, path: str, table_id: str, schema_fields) -> int:
+    """Append the Parquet file at ``path`` to ``table_id`` with one load job and wait for it.
+
+    The file is uploaded from disk in chunks by the client's resumable upload, so it is never
+    held in memory. List inference maps Parquet lists onto REPEATED columns. Returns the
+    number of rows loaded.
+    """
+    from google.cloud import bigquery
+    from google.cloud.bigquery.format_options import ParquetOptions
+
+    parquet_options = ParquetOptions()
+    parquet_options.enable_list_inference = True
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        schema=schema_fields,
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        parquet_options=parquet_options,
+    )
+    with open(path, "rb") as f:
+        load_job = client.load_table_from_file(f, table_id, job_config=job_config)
+    load_job.result()
+    return load_job.output_rows or 0
+
+
+def build_orders_file(user_dir: str, schema: List[Tuple[str, str, str]], dest: str,
+                      **constants) -> Dict[str, int]:
+    """Assemble the user's three staged files into one Parquet file of Orders rows at ``dest``.
+
+    Meant to run in the upload process pool: only paths and counts cross the process
+    boundary. Returns the number of orders, order items and bytes written.
+    """
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    from app.services.basket_assembly import assemble_orders
+
+    tables = {name: pq.read_table(staged_path(user_dir, name)) for name, _ in FILE_TYPES}
+    merged = assemble_orders(tables["orders"], tables["order_products"], tables["products"])
+    table = conform_table(merged, schema, **constants)
+    size = write_parquet(table, dest)
+    return {
+        "orders": table.num_rows,
+        "order_items": pc.sum(pc.list_value_length(merged.column("products"))).as_py() or 0,
+        "bytes": size,
+    }
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_upload_pool() -> ProcessPoolExecutor:
+    """Process pool for upload assembly, created on first use.
+
+    Workers are spawned rather than forked: the API process runs threads (jobs, the
+    threadpool) that a forked child would inherit in an arbitrary state.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+
+            _pool = ProcessPoolExecutor(max_workers=max(1, UPLOAD_WORKERS),
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
@@ -0,0 +1,35 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+# Shared, lazily constructed API clients. Nothing is created at import time, so the app
+# starts (and its routes can be imported) without credentials or network access.
+
+_clients: Dict[Tuple[Optional[str], Optional[str]], object] = {}
+_clients_lock = threading.Lock()
+
+
+def get_bigquery_client(project: Optional[str] = None, credentials_path: Optional[str] = None):
+    """Return a BigQuery client for ``project``, created on first use and reused afterwards.
+
+    ``credentials_path`` points at a service-account JSON key; without it the default
+    application credentials are used.
+    """
+    key = (project, credentials_path)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            from google.cloud import bigquery
+
+            credentials = None
+            if credentials_path:
+                from google.oauth2 import service_account
+                credentials = service_account.Credentials.from_service_account_file(credentials_path)
+            client = bigquery.Client(project=project, credentials=credentials)
+            _clients[key] = client
+    return client
+
+
+def reset_clients() -> None:
+    """Forget all cached clients (e.g. after credentials change, or in tests)."""
+    with _clients_lock:
+        _clients.clear()
@@ -1,7 +1,76 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
 RUNPOD_ENDPOINT = os.getenv("RUNPOD_ENDPOINT", "https://api.runpod.io/v2/your-endpoint")
-RUNPOD_API_KEY = os.getenv("RUNPOD_API_KEY", "your-api-key")
\ No newline at end of file
+RUNPOD_API_KEY = os.getenv("RUNPOD_API_KEY", "your-api-key")
+
+# Local cache for sales data fetched by app.services.data_prep
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", os.path.join(tempfile.gettempdir(), "fetch_cache"))
+FETCH_CACHE_TTL_SECONDS = int(os.getenv("FETCH_CACHE_TTL_SECONDS", "900"))
+FETCH_CACHE_MAX_ENTRIES = int(os.getenv("FETCH_CACHE_MAX_ENTRIES", "64"))
+
+# Batch forecasting (/forecast/batch)
+FORECAST_BATCH_WORKERS = int(os.getenv("FORECAST_BATCH_WORKERS", str(os.cpu_count() or 1)))
+FORECAST_SERIES_BUDGET_SECONDS = float(os.getenv("FORECAST_SERIES_BUDGET_SECONDS", "60"))
+
+# Fitted ARIMA/Prophet models reused across forecast requests. Models are pickles, so they live
+# in a directory private to this user (created 0700), not in the shared temp directory
+MODEL_STORE_DIR = os.getenv("MODEL_STORE_DIR", os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "purchase-intent", "model_store"))
+# Appended ARIMA updates keep the old parameters; refit fully once this many days were appended
+# since the last fit, or once they exceed this fraction of the observations that fit used
+ARIMA_REFIT_AFTER_DAYS = int(os.getenv("ARIMA_REFIT_AFTER_DAYS", "28"))
+ARIMA_REFIT_RATIO = float(os.getenv("ARIMA_REFIT_RATIO", "0.25"))
+
+# Automatic ARIMA order selection
+ARIMA_SEARCH_BUDGET_SECONDS = float(os.getenv("ARIMA_SEARCH_BUDGET_SECONDS", "10"))
+# Processes in the persistent pool that fits the candidates (one search uses it at a time)
+ARIMA_SEARCH_WORKERS = int(os.getenv("ARIMA_SEARCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Intent inference dispatch to the model endpoint
+INTENT_MAX_IN_FLIGHT = int(os.getenv("INTENT_MAX_IN_FLIGHT", "8"))
+INTENT_MAX_RETRIES = int(os.getenv("INTENT_MAX_RETRIES", "4"))
+INTENT_REQUEST_TIMEOUT = float(os.getenv("INTENT_REQUEST_TIMEOUT", "180"))
+INTENT_CACHE_PATH = os.getenv("INTENT_CACHE_PATH", os.path.join(tempfile.gettempdir(), "intent_cache.sqlite3"))
+INTENT_INPUT_TOKEN_BUDGET = int(os.getenv("INTENT_INPUT_TOKEN_BUDGET", "3000"))
+INTENT_MAX_BATCH_ORDERS = int(os.getenv("INTENT_MAX_BATCH_ORDERS", "100"))
+INTENT_OUTPUT_TOKENS_PER_ORDER = int(os.getenv("INTENT_OUTPUT_TOKENS_PER_ORDER", "16"))
+# Checkpointed intent runs (resume with ?resume=<run_id>)
+INTENT_RUNS_PATH = os.getenv("INTENT_RUNS_PATH", os.path.join(tempfile.gettempdir(), "intent_runs.sqlite3"))
+INTENT_RETRY_ROUNDS = int(os.getenv("INTENT_RETRY_ROUNDS", "2"))
+# Paged intent pipeline: rows per source page and pages/batches buffered between stages
+INTENT_PAGE_SIZE = int(os.getenv("INTENT_PAGE_SIZE", "5000"))
+INTENT_PIPELINE_DEPTH = int(os.getenv("INTENT_PIPELINE_DEPTH", "4"))
+# Intent results are appended with load jobs (1,500 per table per day), so flushes are driven by
+# size; the time cap only bounds how long a slow run's rows wait, and each flush is a job
+# (600 s allows at most 144 a day), trading freshness in BigQuery for quota headroom
+INTENT_WRITE_FLUSH_ROWS = int(os.getenv("INTENT_WRITE_FLUSH_ROWS", "50000"))
+INTENT_WRITE_FLUSH_SECONDS = float(os.getenv("INTENT_WRITE_FLUSH_SECONDS", "600"))
+# Background jobs (/intent/jobs)
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+JOBS_KEEP_FINISHED = int(os.getenv("JOBS_KEEP_FINISHED", "100"))
+JOB_EVENT_HISTORY = int(os.getenv("JOB_EVENT_HISTORY", "1000"))
+# Ask the model endpoint to stream tokens so intents are parsed as they arrive
+INTENT_STREAM_RESPONSES = os.getenv("INTENT_STREAM_RESPONSES", "1").lower() not in ("0", "false", "no")
+# CSV uploads are streamed to disk and staged as Parquet in UPLOAD_TMP_DIR
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR", os.path.join(tempfile.gettempdir(), "intent_uploads"))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1 << 20)))
+UPLOAD_CSV_BLOCK_BYTES = int(os.getenv("UPLOAD_CSV_BLOCK_BYTES", str(4 << 20)))
+# Merge-and-load of a complete upload runs as a background job (/upload/jobs) on a process pool
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_MAX_JOBS = int(os.getenv("UPLOAD_MAX_JOBS", "4"))
+# Local index of uploaded datasets and the dataset_id sequence, re-synced with "Data sets" on every
+# allocation. Hosts that allocate dataset ids concurrently must share this file
+DATASET_CATALOG_PATH = os.getenv("DATASET_CATALOG_PATH", os.path.join(tempfile.gettempdir(), "dataset_catalog.sqlite3"))
+# How long a client's latest dataset is served locally before "Data sets" is checked again
+DATASET_CATALOG_REFRESH_SECONDS = float(os.getenv("DATASET_CATALOG_REFRESH_SECONDS", "300"))
+# In-process dataset store (app.services.storage): Arrow tables per user and dataset, least
+# recently used ones spilled to memory-mapped files once STORE_MEMORY_BYTES is exceeded. Each
+# process spills into its own private directory under STORE_SPILL_DIR
+STORE_MEMORY_BYTES = int(os.getenv("STORE_MEMORY_BYTES", str(512 << 20)))
+STORE_SPILL_DIR = os.getenv("STORE_SPILL_DIR", os.path.join(tempfile.gettempdir(), "intent_store"))
+# Intent aggregates (counts, top-k, intent x product) are kept for this many datasets/runs
+INTENT_AGGREGATE_SCOPES = int(os.getenv("INTENT_AGGREGATE_SCOPES", "256"))
@@ -0,0 +1,70 @@
+"""Throughput of intent_service.dispatch_batches against the local mock LLM server.
+
+Starts benchmarks.mock_llm_server on a free port and pushes synthetic orders through the
+dispatcher at several in-flight limits (1 = the old sequential behaviour):
+
+    python -m benchmarks.intent_dispatch --orders 2000 --latency 0.2 --in-flight 1 4 16
+"""
+import argparse
+import asyncio
+import os
+import socket
+import threading
+import time
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port: int) -> None:
+    import uvicorn
+    from benchmarks.mock_llm_server import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+
+async def _run(batches, endpoint: str, in_flight: int) -> int:
+    from app.services.intent_service import dispatch_batches
+
+    done = 0
+    async for _, result in dispatch_batches(batches, max_in_flight=in_flight, endpoint=endpoint):
+        if isinstance(result, Exception):
+            raise result
+        done += len(result)
+    return done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock model latency per request (s)")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    # The mock reads these at import time
+    os.environ["MOCK_LLM_LATENCY"] = str(args.latency)
+    os.environ["MOCK_LLM_429_RATE"] = str(args.rate_429)
+    port = _free_port()
+    _start_server(port)
+    endpoint = f"http://127.0.0.1:{port}/run"
+
+    orders = [{"order_id": i, "products": ["milk", "eggs", "flour"]} for i in range(args.orders)]
+    batches = [orders[i:i + args.batch_size] for i in range(0, len(orders), args.batch_size)]
+
+    for in_flight in args.in_flight:
+        start = time.perf_counter()
+        done = asyncio.run(_run(batches, endpoint, in_flight))
+        elapsed = time.perf_counter() - start
+        print(f"in_flight={in_flight:<3} {done} orders in {elapsed:.2f}s -> {done / elapsed:.0f} orders/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Local stand-in for the RunPod/vLLM endpoint used by app.services.intent_service.
+
+Answers every POST with a RunPod-style ``{"output": {"text": "<json array>"}}`` containing one
+intent per order (by its short id ``i``) found in the prompt's fenced JSON block, or, when the
+request asks for ``"stream": true``, with the same text as OpenAI-style server-sent events
+spread over the latency. Latency and 429 rate are configurable so dispatch throughput can be
+benchmarked offline:
+
+    MOCK_LLM_LATENCY=0.5 MOCK_LLM_429_RATE=0.05 uvicorn benchmarks.mock_llm_server:app --port 8001
+    RUNPOD_ENDPOINT=http://127.0.0.1:8001/run ...
+"""
+import asyncio
+import json
+import os
+import random
+import re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY = float(os.getenv("MOCK_LLM_LATENCY", "0.5"))
+RATE_429 = float(os.getenv("MOCK_LLM_429_RATE", "0"))
+
+app = FastAPI(title="Mock LLM endpoint")
+
+_BLOCK = re.compile(r"```json\s*(.*?)\s*```", re.S)
+
+
+def _order_ids(prompt: str) -> list:
+    match = _BLOCK.search(prompt)
+    if not match:
+        return []
+    items = json.loads(match.group(1))
+    return [item.get("i", item.get("order_id")) for item in items if isinstance(item, dict)]
+
+
+def mock_reply(prompt: str) -> str:
+    return json.dumps([{"i": i, "intent": "mock intent"} for i in _order_ids(prompt)], separators=(",", ":"))
+
+
+@app.post("/{path:path}")
+async def run(path: str, request: Request):
+    body = await request.json()
+    if RATE_429 and random.random() < RATE_429:
+        return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "0.1"})
+    text = mock_reply(body.get("prompt", ""))
+    if body.get("stream"):
+        return StreamingResponse(_sse(text), media_type="text/event-stream")
+    await asyncio.sleep(LATENCY)
+    return {"output": {"text": text}}
+
+
+async def _sse(text: str, chunk_chars: int = 16):
+    chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+    for chunk in chunks:
+        await asyncio.sleep(LATENCY / len(chunks))
+        yield f"data: {json.dumps({'choices': [{'text': chunk}]})}\n\n"
+    yield "data: [DONE]\n\n"
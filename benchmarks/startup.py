@@ -0,0 +1,56 @@
+"""Startup benchmark: import time of app.main and time to the first /docs response.
+
+Each sample runs in a fresh interpreter so nothing is already imported. Exits non-zero when
+the median of either measurement exceeds its threshold, so it can gate CI.
+
+    python -m benchmarks.startup --runs 5 --max-import 2.0 --max-docs 3.0
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = r"""
+import json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+response = TestClient(app.main.app).get("/docs")
+assert response.status_code == 200, response.status_code
+docs = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "docs_s": docs - start}))
+"""
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample() -> dict:
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=REPO_ROOT, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import", type=float, default=float(os.getenv("STARTUP_MAX_IMPORT_SECONDS", "2.0")))
+    parser.add_argument("--max-docs", type=float, default=float(os.getenv("STARTUP_MAX_DOCS_SECONDS", "3.0")))
+    args = parser.parse_args()
+
+    samples = [sample() for _ in range(args.runs)]
+    import_s = statistics.median(s["import_s"] for s in samples)
+    docs_s = statistics.median(s["docs_s"] for s in samples)
+    print(f"import app.main: median {import_s:.3f}s (threshold {args.max_import:.2f}s)")
+    print(f"first /docs:     median {docs_s:.3f}s (threshold {args.max_docs:.2f}s)")
+
+    if import_s > args.max_import or docs_s > args.max_docs:
+        print("FAIL: startup time regression")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Time of the upload merge step: pandas groupby-apply(list) against basket_assembly.
+
+Generates synthetic orders / order_products / products tables (about ten items per order) and
+builds the per-order product lists both ways. The pandas path is only run up to
+``--pandas-max-rows`` because it takes minutes beyond that:
+
+    python -m benchmarks.upload_merge --rows 1000000 10000000 30000000 --pandas-max-rows 10000000
+"""
+import argparse
+import resource
+import time
+
+
+def _tables(rows: int, n_products: int, items_per_order: int, seed: int = 0):
+    import numpy as np
+    import pyarrow as pa
+
+    rng = np.random.default_rng(seed)
+    n_orders = max(1, rows // items_per_order)
+    orders = pa.table({
+        "order_id": np.arange(n_orders, dtype=np.int64),
+        "user_id": rng.integers(0, max(1, n_orders // 5), n_orders),
+    })
+    order_products = pa.table({
+        "order_id": rng.integers(0, n_orders, rows),
+        "product_id": rng.integers(0, n_products, rows),
+    })
+    products = pa.table({
+        "product_id": np.arange(n_products, dtype=np.int64),
+        "product_name": [f"product {i}" for i in range(n_products)],
+    })
+    return orders, order_products, products
+
+
+def _pandas_merge(orders, order_products, products):
+    # The merge /upload used before basket_assembly
+    orders, order_products, products = orders.to_pandas(), order_products.to_pandas(), products.to_pandas()
+    merged = order_products.merge(products, on="product_id", how="left")
+    grouped = merged.groupby("order_id")["product_name"].apply(list).reset_index()
+    final_df = orders.merge(grouped, on="order_id", how="left")
+    final_df.rename(columns={"product_name": "products"}, inplace=True)
+    final_df["products"] = final_df["products"].apply(lambda x: x if isinstance(x, list) else [])
+    return final_df
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main() -> None:
+    from app.services.basket_assembly import assemble_orders
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000, 30_000_000],
+                        help="order_products rows per run")
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--items-per-order", type=int, default=10)
+    parser.add_argument("--pandas-max-rows", type=int, default=10_000_000,
+                        help="Skip the pandas baseline above this many rows")
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        tables = _tables(rows, args.products, args.items_per_order)
+        table, arrow_s = _timed(assemble_orders, *tables)
+        line = f"rows={rows:>11,}  orders={table.num_rows:>10,}  arrow={arrow_s:7.2f}s"
+        if rows <= args.pandas_max_rows:
+            _, pandas_s = _timed(_pandas_merge, *tables)
+            line += f"  pandas={pandas_s:7.2f}s  speedup={pandas_s / arrow_s:5.1f}x"
+        print(f"{line}  peak_rss={_peak_rss_mb():,.0f}MB", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -171,26 +171,26 @@ export default function InferIntentsPage() {
   // Restore EventSource if running on mount
   useEffect(() => {
     if (running && !eventSourceRef.current && selected) {
-      // Reconnect EventSource
-      const dataset = "my_dataset"; // TODO: replace with actual dataset name or user input
-      const sample_size = selected === "sample" ? 200 : 0;
-      const url = `http://localhost:8000/intent/infer/stream?dataset=${dataset}${
-        sample_size ? `&sample_size=${sample_size}` : ""
-      }`;
-      const es = new EventSource(url);
+      // Reattach to the background job started earlier instead of starting a new run
+      const jobId =
+        typeof window !== "undefined" ? localStorage.getItem("infer_job_id") : null;
+      if (!jobId) {
+        setRunning(false);
+        return;
+      }
+      const es = new EventSource(`http://localhost:8000/intent/jobs/${jobId}/events`);
       eventSourceRef.current = es;
       es.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
-          if (data.type === "batch") {
-            setProgress({ batch: data.batch, total: data.total });
-          } else if (data.type === "done") {
-            setRunning(false);
-            es.close();
-            eventSourceRef.current = null;
-          } else if (data.type === "error") {
-            setError(data.text || "Unknown error");
+          if (data.type === "progress") {
+            setProgress({ batch: data.batch, total: data.total_batches });
+          } else if (data.type === "end") {
+            if (data.status === "failed") {
+              setError(data.error || "Unknown error");
+            }
             setRunning(false);
+            localStorage.removeItem("infer_job_id");
             es.close();
             eventSourceRef.current = null;
           }
@@ -233,6 +233,12 @@ export default function InferIntentsPage() {
 
   // Stop the running inference (close EventSource and clear state)
   function stopInference() {
+    // Cancel the backend job; batches already sent are still saved
+    const jobId =
+      typeof window !== "undefined" ? localStorage.getItem("infer_job_id") : null;
+    if (jobId) {
+      fetch(`http://localhost:8000/intent/jobs/${jobId}/cancel`, { method: "POST" }).catch(() => {});
+    }
     // Stop backend EventSource if present
     if (eventSourceRef.current) {
       try {
@@ -259,6 +265,7 @@ export default function InferIntentsPage() {
       localStorage.removeItem("infer_running");
       localStorage.removeItem("infer_progress");
       localStorage.removeItem("infer_countdown_end");
+      localStorage.removeItem("infer_job_id");
     }
     // clear any sample results shown
     setSampleResults([]);
@@ -444,23 +451,27 @@ export default function InferIntentsPage() {
               // Example: dataset param is hardcoded, sample_size based on selection
               const dataset = "my_dataset"; // TODO: replace with actual dataset name or user input
               const sample_size = selected === "sample" ? 200 : 0;
-              const url = `http://localhost:8000/intent/infer/stream?dataset=${dataset}${
-                sample_size ? `&sample_size=${sample_size}` : ""
-              }`;
+              // sample_size=0 streams the full dataset
+              const url = `http://localhost:8000/intent/infer/stream?dataset=${dataset}&sample_size=${sample_size}`;
               const es = new EventSource(url);
               eventSourceRef.current = es;
               es.onmessage = (event) => {
                 try {
                   const data = JSON.parse(event.data);
-                  if (data.type === "batch") {
+                  if (data.type === "job") {
+                    // Lets a reload reattach to this run (see the restore effect above)
+                    localStorage.setItem("infer_job_id", data.job_id);
+                  } else if (data.type === "batch") {
                     setProgress({ batch: data.batch, total: data.total });
                   } else if (data.type === "done") {
                     setRunning(false);
+                    localStorage.removeItem("infer_job_id");
                     es.close();
                     eventSourceRef.current = null;
                   } else if (data.type === "error") {
                     setError(data.text || "Unknown error");
                     setRunning(false);
+                    localStorage.removeItem("infer_job_id");
                     es.close();
                     eventSourceRef.current = null;
                   }
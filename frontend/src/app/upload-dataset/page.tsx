@@ -96,6 +96,16 @@ export default function UploadDataset() {
 
       if (res.ok) {
         const data = await res.json();
+        if (data.job_id) {
+          // Last file in: the dataset is merged and loaded in the background
+          const job = await waitForUploadJob(data.job_id);
+          if (job.status !== "completed") {
+            setStatus(`Processing failed: ${job.error || job.status}`);
+            setProgress(0);
+            localStorage.removeItem("uploadState");
+            return;
+          }
+        }
         setStatus(`Upload complete! `);
         setProgress(100);
         setUploadComplete(true);
@@ -120,6 +130,18 @@ export default function UploadDataset() {
     }
   };
 
+  const waitForUploadJob = async (jobId: string) => {
+    while (true) {
+      const res = await fetch(`http://localhost:8000/upload/jobs/${jobId}`);
+      if (!res.ok) return { status: "failed", error: "Upload job not found" };
+      const job = await res.json();
+      if (["completed", "failed", "cancelled"].includes(job.status)) return job;
+      const stage = job.last_event?.stage;
+      if (stage) setStatus(`Processing dataset: ${stage}...`);
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleFileInput = (e: React.ChangeEvent<HTMLInputElement>) => {
     if (e.target.files && e.target.files[0]) {
       handleFile(e.target.files[0]);
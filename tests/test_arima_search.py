@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from app.services import arima_search, model_store
+
+
+def test_difference_order_reuses_adf_result():
+    values = np.arange(10, dtype=float)
+    assert arima_search.difference_order({"p_value": 0.01}, values) == 0
+    assert arima_search.difference_order({"p_value": 0.40}, values) == 1
+
+
+def test_candidates_are_unique_and_simplest_first():
+    candidates = arima_search.candidate_orders(d=1, season=7, seasonal_D=0)
+    assert len(candidates) == len(set(candidates))
+    assert candidates[0] == ((0, 1, 0), (0, 0, 0, 0))
+
+
+def test_selected_order_is_cached_per_series(monkeypatch, tmp_path):
+    monkeypatch.setattr(model_store, "MODEL_STORE_DIR", str(tmp_path))
+    model_store.clear_model_store()
+    rng = np.random.default_rng(7)
+    values = np.cumsum(rng.normal(0, 1, 60))
+
+    first = arima_search.select_order(values, series_id="category=Books",
+                                      stationarity={"p_value": 0.5}, budget=30)
+    second = arima_search.select_order(values, series_id="category=Books")
+
+    assert first["order"][1] == 1
+    assert not first["cached"] and second["cached"]
+    assert second["order"] == first["order"]
+
+
+def test_selected_order_is_redone_when_the_data_changes(monkeypatch, tmp_path):
+    monkeypatch.setattr(model_store, "MODEL_STORE_DIR", str(tmp_path))
+    model_store.clear_model_store()
+    rng = np.random.default_rng(8)
+    values = np.cumsum(rng.normal(0, 1, 40))
+    arima_search.select_order(values, series_id="category=Books", stationarity={"p_value": 0.5},
+                              budget=30, version="2025-01-01|40")
+
+    later = arima_search.select_order(values, series_id="category=Books", stationarity={"p_value": 0.5},
+                                      budget=30, version="2025-01-02|41")
+
+    assert not later["cached"]
+
+
+def test_searches_share_a_warm_pool_across_budget_expiry():
+    import threading
+
+    rng = np.random.default_rng(9)
+    long_values = np.cumsum(rng.normal(0, 1, 400))
+    values = np.cumsum(rng.normal(0, 1, 60))
+    pool = arima_search._search_pool()
+
+    with pytest.raises(ValueError, match="within"):
+        arima_search.select_order(long_values, stationarity={"p_value": 0.5}, budget=0)
+    assert arima_search._search_pool() is pool
+
+    results = []
+
+    def search():
+        results.append(arima_search.select_order(values, stationarity={"p_value": 0.5}, season=0, budget=60))
+
+    threads = [threading.Thread(target=search) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 2 and results[0]["order"] == results[1]["order"]
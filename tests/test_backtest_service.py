@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from app.services.backtest_service import run_backtest, fold_origins, mase_2d, smape_2d
+from app.services.forecast_service import mase, smape
+
+
+def _daily_frame(periods=60, seed=1):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01", periods=periods, freq="D")
+    values = 100 + 10 * np.sin(np.arange(periods) * 2 * np.pi / 7) + rng.normal(0, 1, periods)
+    return pd.DataFrame({"Date": dates, "Total Price": values})
+
+
+def test_fold_origins_end_at_series_end():
+    origins = fold_origins(n=50, horizon=7, n_folds=3, min_train=7)
+    assert origins.tolist() == [29, 36, 43]
+
+
+def test_vectorized_metrics_match_scalar_versions():
+    rng = np.random.default_rng(0)
+    actual = rng.uniform(1, 10, (4, 6))
+    forecast = rng.uniform(1, 10, (4, 6))
+    np.testing.assert_allclose(mase_2d(actual, forecast), [mase(a, f) for a, f in zip(actual, forecast)])
+    np.testing.assert_allclose(smape_2d(actual, forecast), [smape(a, f) for a, f in zip(actual, forecast)])
+
+
+def test_seasonal_naive_beats_naive_on_weekly_series():
+    results = run_backtest(_daily_frame(), horizon=7, n_folds=4, window="sliding", models=[])
+    assert len(results["Naive"]["folds"]) == 4
+    assert results["SeasonalNaive"]["mean"]["RMSE"] < results["Naive"]["mean"]["RMSE"]
+    assert results["_meta"]["window"] == "sliding"
+
+
+def test_trend_seasonal_fold_forecasts_the_real_test_dates():
+    from app.services.backtest_service import _fit_fold
+
+    dates = pd.date_range("2024-01-01", periods=70, freq="D")
+    values = 50 + 10 * np.sin(np.arange(70) * 2 * np.pi / 7)
+    # The test window skips two days, as a daily series with missing sales would
+    test_rows = [56, 57, 60, 61, 62]
+
+    forecast = _fit_fold("TrendSeasonal", dates[:56].to_numpy(), values[:56], dates[test_rows].to_numpy())
+
+    np.testing.assert_allclose(forecast, values[test_rows], atol=0.5)
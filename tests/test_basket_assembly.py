@@ -0,0 +1,41 @@
+import numpy as np
+import pyarrow as pa
+
+from app.services.basket_assembly import assemble_orders
+
+
+def test_products_are_grouped_per_order_in_file_order():
+    orders = pa.table({"order_id": [3, 1, 2, None, 1], "user_id": [10, 11, 12, 13, 14]})
+    order_products = pa.table({
+        "order_id": [1, 3, 1, 2, 3, 1, 7],
+        "product_id": [100, 200, 300, 999, 100, 200, 100],
+    })
+    products = pa.table({"product_id": [100, 200, 300], "product_name": ["milk", "eggs", "flour"]})
+
+    table = assemble_orders(orders, order_products, products)
+
+    assert table.column_names == ["order_id", "user_id", "products"]
+    assert table.column("products").to_pylist() == [
+        ["eggs", "milk"],
+        ["milk", "flour", "eggs"],
+        [],  # only an unknown product
+        [],  # null order_id
+        ["milk", "flour", "eggs"],  # repeated order_id gets the same basket
+    ]
+
+
+def test_matches_the_pandas_groupby_on_random_data():
+    rng = np.random.default_rng(1)
+    orders = pa.table({"order_id": rng.permutation(500)})
+    order_products = pa.table({
+        "order_id": rng.integers(0, 600, 5000),
+        "product_id": rng.integers(0, 50, 5000),
+    })
+    products = pa.table({"product_id": np.arange(50), "product_name": [f"p{i}" for i in range(50)]})
+
+    table = assemble_orders(orders, order_products, products, dictionary=False)
+
+    merged = order_products.to_pandas().merge(products.to_pandas(), on="product_id", how="left")
+    grouped = merged.groupby("order_id")["product_name"].apply(list).to_dict()
+    expected = [grouped.get(order_id, []) for order_id in orders.column("order_id").to_pylist()]
+    assert table.column("products").to_pylist() == expected
@@ -0,0 +1,94 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pandas as pd
+
+from app.services import data_prep
+
+
+class FakeClient:
+    def __init__(self):
+        self.queries = []
+        self.modified = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def get_table(self, table_id):
+        return SimpleNamespace(modified=self.modified)
+
+    def query(self, sql):
+        self.queries.append(sql)
+        df = pd.DataFrame({"Date": ["2025-01-01", "2025-01-02"], "Total Revenue": [1.0, 2.0]})
+        return SimpleNamespace(to_dataframe=lambda: df)
+
+
+def _reset(monkeypatch, tmp_path):
+    monkeypatch.setattr(data_prep, "FETCH_CACHE_DIR", str(tmp_path))
+    data_prep.clear_fetch_cache()
+
+
+def test_fetch_is_cached_per_selection(monkeypatch, tmp_path):
+    _reset(monkeypatch, tmp_path)
+    client = FakeClient()
+
+    first = data_prep.fetch_data_from_bigquery(category="Books", client=client)
+    second = data_prep.fetch_data_from_bigquery(category="Books", client=client)
+    data_prep.fetch_data_from_bigquery(category="Sports", client=client)
+
+    assert len(client.queries) == 2
+    assert "Total Price" in first.columns
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_fetch_reads_parquet_after_memory_eviction(monkeypatch, tmp_path):
+    _reset(monkeypatch, tmp_path)
+    client = FakeClient()
+
+    data_prep.fetch_data_from_bigquery(category="Books", client=client)
+    data_prep.clear_fetch_cache(remove_files=False)
+    data_prep.fetch_data_from_bigquery(category="Books", client=client)
+
+    assert len(client.queries) == 1
+
+
+def test_fetch_invalidated_when_source_table_changes(monkeypatch, tmp_path):
+    _reset(monkeypatch, tmp_path)
+    client = FakeClient()
+
+    data_prep.fetch_data_from_bigquery(category="Books", client=client)
+    client.modified = datetime(2025, 2, 1, tzinfo=timezone.utc)
+    data_prep._version_cache.clear()
+    data_prep.fetch_data_from_bigquery(category="Books", client=client)
+
+    assert len(client.queries) == 2
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+
+
+def test_daily_mode_aggregates_in_sql_and_caches_separately(monkeypatch, tmp_path):
+    _reset(monkeypatch, tmp_path)
+    client = FakeClient()
+
+    data_prep.fetch_data_from_bigquery(category="Books", client=client)
+    data_prep.fetch_data_from_bigquery(category="Books", client=client, daily=True)
+
+    assert len(client.queries) == 2
+    assert "GROUP BY `Date`" in client.queries[1]
+    assert data_prep.DAILY_VIEW in client.queries[1]
+
+
+def test_daily_cache_follows_the_view_refresh_not_the_source(monkeypatch, tmp_path):
+    _reset(monkeypatch, tmp_path)
+    client = FakeClient()
+    refreshed = {"at": datetime(2025, 1, 1, tzinfo=timezone.utc)}
+    source_table = client.get_table
+
+    def get_table(table_id):
+        if table_id == data_prep.DAILY_VIEW:
+            return SimpleNamespace(modified=None, mview_last_refresh_time=refreshed["at"])
+        return source_table(table_id)
+
+    client.get_table = get_table
+    data_prep.fetch_data_from_bigquery(category="Books", client=client, daily=True)
+    refreshed["at"] = datetime(2025, 1, 2, tzinfo=timezone.utc)
+    data_prep._version_cache.clear()
+    data_prep.fetch_data_from_bigquery(category="Books", client=client, daily=True)
+
+    assert len(client.queries) == 2
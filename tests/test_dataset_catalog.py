@@ -0,0 +1,99 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import dataset_catalog
+from app.services.dataset_catalog import FAILED, DatasetCatalog, allocate_dataset_id, latest_dataset_id
+
+
+class _Warehouse:
+    """``Data sets`` rows; answers the full backfill, MAX(dataset_id) and per-client latest queries."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def query(self, sql, job_config=None):
+        self.queries.append(sql)
+        if "MAX(dataset_id)" in sql:
+            rows = [SimpleNamespace(max_id=max((r.dataset_id for r in self.rows), default=None))]
+        elif job_config is not None:
+            client_id = job_config.query_parameters[0].value
+            rows = sorted((r for r in self.rows if r.Client_id == client_id), key=lambda r: -r.dataset_id)[:1]
+        else:
+            rows = self.rows
+        return SimpleNamespace(result=lambda: iter(rows))
+
+
+def test_ids_are_seeded_once_and_never_handed_out_twice(tmp_path):
+    path = str(tmp_path / "catalog.sqlite3")
+    warehouse = _Warehouse([SimpleNamespace(dataset_id=7, Client_id="a", num_rows=10),
+                            SimpleNamespace(dataset_id=3, Client_id="b", num_rows=5)])
+    first, second = DatasetCatalog(path), DatasetCatalog(path)
+
+    assert allocate_dataset_id(first, warehouse, "ds.Data sets", client_id="a") == 8
+    ids = []
+    lock = threading.Lock()
+
+    def allocate(catalog):
+        for _ in range(25):
+            dataset_id = allocate_dataset_id(catalog, warehouse, "ds.Data sets")
+            with lock:
+                ids.append(dataset_id)
+
+    threads = [threading.Thread(target=allocate, args=(c,)) for c in (first, second, first, second)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(ids) == list(range(9, 109))
+    assert sum("MAX(dataset_id)" not in sql for sql in warehouse.queries) == 1
+    assert first.get(3)["client_id"] == "b"
+
+
+def test_latest_dataset_per_client_skips_unfinished_uploads(tmp_path):
+    catalog = DatasetCatalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.record_many([(1, "a", 10), (2, "b", 4)])
+
+    ready = catalog.allocate("a")
+    pending = catalog.allocate("a")
+    failed = catalog.allocate("a")
+    catalog.record(ready, "a", rows=3, orders=2)
+    catalog.record(failed, "a", status=FAILED, error="load failed")
+
+    assert catalog.latest_for_client("a") == ready
+    assert catalog.get(pending)["status"] == "allocated"
+    assert catalog.get(ready)["orders"] == 2
+    assert catalog.latest_for_client("b") == 2
+    assert catalog.latest_for_client("nobody") is None
+
+
+def test_ids_written_elsewhere_are_not_reissued(tmp_path):
+    warehouse = _Warehouse([SimpleNamespace(dataset_id=7, Client_id="a", num_rows=10)])
+    catalog = DatasetCatalog(str(tmp_path / "catalog.sqlite3"))
+    assert allocate_dataset_id(catalog, warehouse, "ds.Data sets") == 8
+
+    # Another host registers 9 and 12 in the warehouse
+    warehouse.rows += [SimpleNamespace(dataset_id=9, Client_id="b", num_rows=1),
+                       SimpleNamespace(dataset_id=12, Client_id="b", num_rows=1)]
+
+    assert allocate_dataset_id(catalog, warehouse, "ds.Data sets") == 13
+
+
+def test_latest_dataset_is_refreshed_from_the_warehouse_after_the_ttl(tmp_path, monkeypatch):
+    pytest.importorskip("google.cloud.bigquery")
+    from cachetools import TTLCache
+
+    now = [0.0]
+    monkeypatch.setattr(dataset_catalog, "_refreshed", TTLCache(maxsize=16, ttl=60, timer=lambda: now[0]))
+    warehouse = _Warehouse([SimpleNamespace(dataset_id=3, Client_id="a", num_rows=10)])
+    catalog = DatasetCatalog(str(tmp_path / "catalog.sqlite3"))
+
+    assert latest_dataset_id(catalog, warehouse, "ds.Data sets", "a") == 3
+    warehouse.rows.append(SimpleNamespace(dataset_id=5, Client_id="a", num_rows=2))
+    assert latest_dataset_id(catalog, warehouse, "ds.Data sets", "a") == 3
+    now[0] = 61.0
+    assert latest_dataset_id(catalog, warehouse, "ds.Data sets", "a") == 5
+    assert len(warehouse.queries) == 2
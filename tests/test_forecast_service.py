@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from app.services.forecast_service import (get_forecast_pool, iter_batch_forecasts, run_forecast,
+                                           trend_seasonal_forecast)
+
+
+def _daily_frame(periods=60, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01", periods=periods, freq="D")
+    values = 100 + 10 * np.sin(np.arange(periods) * 2 * np.pi / 7) + rng.normal(0, 1, periods)
+    return pd.DataFrame({"Date": dates, "Total Price": values})
+
+
+def test_batch_forecasts_every_group():
+    frames = []
+    for name in ["Books", "Sports", "Clothing"]:
+        frame = _daily_frame()
+        frame["group"] = name
+        frames.append(frame)
+    df = pd.concat(frames, ignore_index=True)
+
+    results = list(iter_batch_forecasts(df, workers=2, time_budget=60))
+
+    assert sorted(r["group"] for r in results) == ["Books", "Clothing", "Sports"]
+    assert all("Naive" in r["forecasts"] for r in results)
+
+
+def test_batch_forecasts_share_one_pool():
+    frame = _daily_frame()
+    frame["group"] = "Books"
+
+    pool = get_forecast_pool()
+    first = list(iter_batch_forecasts(frame, workers=1, time_budget=60))
+    second = list(iter_batch_forecasts(frame, workers=1, time_budget=60))
+
+    assert get_forecast_pool() is pool
+    assert [r["group"] for r in first + second] == ["Books", "Books"]
+
+
+def test_trend_seasonal_recovers_weekly_pattern():
+    dates = pd.date_range("2024-01-01", periods=120, freq="D")
+    values = 50 + 0.5 * np.arange(120) + 10 * np.sin(np.arange(120) * 2 * np.pi / 7)
+    train = pd.Series(values[:100], index=dates[:100])
+
+    pred = trend_seasonal_forecast(train, dates[100:])
+
+    np.testing.assert_allclose(pred, values[100:], atol=1.0)
+
+
+def test_trend_seasonal_forecast_is_scale_invariant():
+    frame = _daily_frame(periods=90, seed=4)
+    train = pd.Series(frame["Total Price"].values, index=frame["Date"])
+    future = pd.date_range(train.index[-1], periods=15, freq="D")[1:]
+
+    pred = trend_seasonal_forecast(train, future)
+    scaled = trend_seasonal_forecast(train * 1000, future)
+
+    np.testing.assert_allclose(scaled, pred * 1000, rtol=1e-6)
+
+
+def test_run_forecast_fast_engine_reports_trend_seasonal():
+    results = run_forecast(_daily_frame(), engine="fast")
+
+    assert set(results["TrendSeasonal"]) == {"forecast", "RMSE", "MASE", "sMAPE"}
+    assert results["TrendSeasonal"]["RMSE"] < results["Naive"]["RMSE"]
+    assert "error" in results["Prophet"]
@@ -0,0 +1,69 @@
+import pyarrow as pa
+
+from app.services import storage
+from app.services.intent_aggregates import IntentAggregates, RankedCounter
+from app.services.storage import DatasetStore
+
+
+def test_top_k_follows_increments():
+    counter = RankedCounter()
+    for key, n in [("a", 3), ("b", 1), ("c", 2), ("b", 4), ("d", 2)]:
+        counter.add(key, n)
+
+    assert counter.top(2) == [("b", 5), ("a", 3)]
+    assert counter.top(10) == [("b", 5), ("a", 3), ("c", 2), ("d", 2)]
+    assert counter["c"] == 2 and counter.total == 12 and len(counter) == 4
+
+
+def test_rows_and_tables_aggregate_the_same():
+    rows = [
+        {"intent": "breakfast", "products": ["milk", "eggs"]},
+        {"intent": "baking", "products": ["flour", "eggs"]},
+        {"intent": "breakfast", "products": ["milk"]},
+        {"intent": None, "products": ["soap"]},
+    ]
+    by_row, by_table = IntentAggregates(), IntentAggregates()
+    by_row.add(rows)
+    by_table.add_table(storage._encode(pa.Table.from_pylist(rows)))
+
+    assert by_row.snapshot() == by_table.snapshot()
+    assert by_table.top_products("breakfast") == [("milk", 2), ("eggs", 1)]
+
+
+def test_appended_intents_update_dataset_counts(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, "_store", DatasetStore(spill_dir=str(tmp_path)))
+    storage.set_baskets([{"order_id": i, "products": ["milk"] if i % 2 else ["flour"]} for i in range(4)],
+                        user_id="u", dataset_id=1)
+
+    storage.set_intents([{"order_id": 0, "intent": "baking"}], user_id="u", dataset_id=1)
+    storage.append_intents([{"order_id": i, "intent": "breakfast"} for i in (1, 3)], user_id="u", dataset_id=1)
+
+    assert storage.get_intent_counts("u", 1) == {"baking": 1, "breakfast": 2}
+    assert len(storage.get_intents("u", 1)) == 3
+    summary = storage.get_intent_aggregates("u", 1, k=1)
+    assert summary["top_intents"] == [{"intent": "breakfast", "count": 2}]
+    assert summary["top_products"] == {"breakfast": [{"product": "milk", "count": 2}]}
+
+    storage.set_intents([{"order_id": 2, "intent": "baking"}], user_id="u", dataset_id=1)
+    assert storage.get_intent_counts("u", 1) == {"baking": 1}
+
+
+def test_evicted_dataset_aggregates_are_rebuilt_from_stored_intents(monkeypatch, tmp_path):
+    from cachetools import LRUCache
+
+    from app.services import intent_aggregates
+
+    monkeypatch.setattr(storage, "_store", DatasetStore(spill_dir=str(tmp_path)))
+    monkeypatch.setattr(intent_aggregates, "_scopes", LRUCache(maxsize=1))
+    storage.set_baskets([{"order_id": 1, "products": ["milk"]}], user_id="u", dataset_id=1)
+    storage.set_intents([{"order_id": 1, "intent": "breakfast"}], user_id="u", dataset_id=1)
+    storage.set_intents([{"order_id": 9, "intent": "camping"}], user_id="v", dataset_id=2)  # evicts u/1
+
+    storage.append_intents([{"order_id": 2, "intent": "breakfast"}], user_id="u", dataset_id=1)
+    storage.set_intents([{"order_id": 9, "intent": "camping"}], user_id="v", dataset_id=2)  # evicts u/1 again
+
+    assert storage.get_intent_counts("u", 1) == {"breakfast": 2}
+    summary = storage.get_intent_aggregates("u", 1)
+    assert summary["rows"] == 2
+    assert summary["top_products"] == {"breakfast": [{"product": "milk", "count": 1}]}
+    assert storage.get_intent_counts("u", 3) == {}
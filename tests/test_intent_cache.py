@@ -0,0 +1,33 @@
+from app.services.intent_cache import IntentCache, basket_key, group_orders_by_basket, normalize_basket
+
+
+def test_normalize_basket_ignores_order_case_and_duplicates():
+    assert normalize_basket(["Milk ", "eggs", "milk"]) == ("eggs", "milk")
+    assert basket_key(["Eggs", "Milk"]) == basket_key(["milk", "eggs", "MILK"])
+    assert normalize_basket(None) == ()
+
+
+def test_group_orders_by_basket_keeps_first_order_as_representative():
+    orders = [
+        {"order_id": 1, "products": ["milk", "eggs"]},
+        {"order_id": 2, "products": ["tent"]},
+        {"order_id": 3, "products": ["Eggs", "Milk"]},
+    ]
+    groups = group_orders_by_basket(orders)
+
+    assert len(groups) == 2
+    group = groups[basket_key(["milk", "eggs"])]
+    assert group["order_id"] == 1
+    assert group["order_ids"] == [1, 3]
+
+
+def test_intent_cache_round_trip_is_per_model(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = IntentCache(path)
+    key = basket_key(["flour", "sugar"])
+    cache.put_many({key: "Baking a cake"}, model="m1")
+    cache.close()
+
+    reopened = IntentCache(path)
+    assert reopened.get_many([key, "missing"], model="m1") == {key: "Baking a cake"}
+    assert reopened.get_many([key], model="m2") == {}
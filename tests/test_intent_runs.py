@@ -0,0 +1,15 @@
+from app.services.intent_runs import DONE, FAILED, RunStore
+
+
+def test_run_store_tracks_unfinished_orders(tmp_path):
+    store = RunStore(str(tmp_path / "runs.sqlite3"))
+    orders = [{"order_id": i, "products": [f"item{i}"]} for i in range(4)]
+    store.create_run("r1", "p.d", "m", orders)
+
+    store.mark("r1", [0, 1], DONE)
+    store.mark("r1", [2], FAILED, "HTTP 500")
+
+    assert store.counts("r1") == {"pending": 1, "done": 2, "failed": 1}
+    assert store.unfinished_orders("r1") == orders[2:]
+    assert store.get_run("r1")["dataset"] == "p.d"
+    assert store.get_run("missing") is None
@@ -0,0 +1,307 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services import intent_service
+from app.services.intent_aggregates import get_aggregates
+from benchmarks.mock_llm_server import mock_reply
+
+
+def _collect(batches, transport, **kwargs):
+    async def run():
+        return [item async for item in intent_service.dispatch_batches(
+            batches, endpoint="http://mock/run", transport=transport, **kwargs)]
+    return asyncio.run(run())
+
+
+def test_dispatch_yields_results_in_batch_order():
+    async def handler(request):
+        prompt = json.loads(request.content)["prompt"]
+        # The first batch answers last
+        await asyncio.sleep(0.05 if "item0" in prompt else 0.0)
+        return httpx.Response(200, json={"output": {"text": mock_reply(prompt)}})
+
+    batches = [[{"order_id": 100 + i, "products": [f"item{i}"]}] for i in range(4)]
+    results = _collect(batches, httpx.MockTransport(handler), max_in_flight=4)
+
+    assert [idx for idx, _ in results] == [0, 1, 2, 3]
+    assert [r[0]["order_id"] for _, r in results] == [100, 101, 102, 103]
+
+
+def test_dispatch_retries_rate_limited_requests(monkeypatch):
+    monkeypatch.setattr(intent_service, "RETRY_BASE_DELAY", 0.001)
+    calls = {"n": 0}
+
+    def handler(request):
+        calls["n"] += 1
+        if calls["n"] <= 2:
+            return httpx.Response(429)
+        prompt = json.loads(request.content)["prompt"]
+        return httpx.Response(200, json={"output": {"text": mock_reply(prompt)}})
+
+    batches = [[{"order_id": 7, "products": ["milk"]}]]
+    [(idx, result)] = _collect(batches, httpx.MockTransport(handler), max_retries=3)
+
+    assert calls["n"] == 3
+    assert result == [{"order_id": 7, "intent": "mock intent"}]
+
+
+def test_dispatch_reports_failure_after_retries(monkeypatch):
+    monkeypatch.setattr(intent_service, "RETRY_BASE_DELAY", 0.001)
+    batches = [[{"order_id": 1, "products": ["milk"]}]]
+    [(idx, result)] = _collect(batches, httpx.MockTransport(lambda r: httpx.Response(503, text="busy")), max_retries=1)
+
+    assert isinstance(result, intent_service.ModelCallError)
+    assert result.response_text == "busy"
+
+
+def test_pack_batches_respects_token_budget():
+    orders = [{"order_id": i, "products": ["x" * 30]} for i in range(40)]
+    fixed = intent_service.estimate_tokens(intent_service.build_prompt([]))
+    budget = fixed + 60
+
+    batches = list(intent_service.pack_batches(orders, token_budget=budget, max_orders=100))
+
+    assert sum(len(b) for b in batches) == 40
+    assert all(intent_service.estimate_tokens(intent_service.build_prompt(b)) <= budget for b in batches)
+    # A single order larger than the budget still goes out on its own
+    assert list(intent_service.pack_batches([{"order_id": 1, "products": ["y" * 500]}], token_budget=budget)) == \
+        [[{"order_id": 1, "products": ["y" * 500]}]]
+
+
+def test_prompt_is_compact_and_ids_map_back():
+    batch = [{"order_id": 98765, "products": ["milk", "eggs"]}, {"order_id": 43210, "products": ["tent"]}]
+    prompt = intent_service.build_prompt(batch)
+
+    assert '[{"i":0,"p":["milk","eggs"]},{"i":1,"p":["tent"]}]' in prompt
+    assert "98765" not in prompt
+    decoded = intent_service.decode_intents(batch, [{"i": 1, "intent": "Camping"}, {"i": 5, "intent": "bogus"}])
+    assert decoded == [{"order_id": 43210, "intent": "Camping"}]
+
+
+def test_decode_coerces_numeric_ids_and_counts_drops():
+    batch = [{"order_id": 10}, {"order_id": 11}, {"order_id": 12}]
+    decoded = intent_service.decode_intents(batch, [
+        {"i": "1", "intent": "A"}, {"i": 2.0, "intent": "B"}, {"i": 0, "intent": "C"},
+        {"i": 1.5, "intent": "x"}, {"i": "one", "intent": "x"}, {"i": True, "intent": "x"}, {"i": 0},
+    ])
+
+    assert decoded == [{"order_id": 11, "intent": "A"}, {"order_id": 12, "intent": "B"},
+                       {"order_id": 10, "intent": "C"}]
+    assert decoded.dropped == 4
+
+
+class _FakeBigQuery:
+    """Pages through ``rows`` like a BigQuery RowIterator; ``fail_after_pages`` simulates a dropped read."""
+
+    def __init__(self, rows, fail_after_pages=None):
+        self.rows = rows
+        self.fail_after_pages = fail_after_pages
+        self.start_indexes = []
+        self.inserted = []
+
+    def query(self, query):
+        fake = self
+
+        class _Rows:
+            def __init__(self, start_index, page_size):
+                self.total_rows = len(fake.rows)
+                self._rows = fake.rows[start_index:]
+                self._page_size = page_size or len(self._rows) or 1
+
+            @property
+            def pages(self):
+                for n, i in enumerate(range(0, len(self._rows), self._page_size)):
+                    if fake.fail_after_pages is not None and n >= fake.fail_after_pages:
+                        raise ConnectionError("read interrupted")
+                    yield self._rows[i:i + self._page_size]
+
+        class _Job:
+            def result(self, page_size=None, start_index=None):
+                fake.start_indexes.append(start_index or 0)
+                return _Rows(start_index or 0, page_size)
+        return _Job()
+
+    def load_table_from_json(self, rows, table_id, job_config=None):
+        fake = self
+
+        class _LoadJob:
+            errors = None
+
+            def result(self):
+                fake.inserted.extend(rows)
+        return _LoadJob()
+
+
+def _use_fakes(monkeypatch, tmp_path, bq, handler):
+    from app.services.intent_cache import IntentCache
+    from app.services.intent_runs import RunStore
+
+    store = RunStore(str(tmp_path / "runs.sqlite3"))
+    monkeypatch.setattr(intent_service, "RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(intent_service, "get_bigquery_client", lambda project=None: bq)
+    monkeypatch.setattr(intent_service, "get_run_store", lambda: store)
+    monkeypatch.setattr(intent_service, "get_intent_cache", lambda: IntentCache(str(tmp_path / "cache.sqlite3")))
+
+    original = intent_service.dispatch_batches
+
+    def dispatch(batches, **kwargs):
+        return original(batches, endpoint="http://mock/run", transport=httpx.MockTransport(handler), max_retries=0, **kwargs)
+
+    monkeypatch.setattr(intent_service, "dispatch_batches", dispatch)
+    return store
+
+
+def test_failed_batches_are_checkpointed_and_resumable(tmp_path, monkeypatch):
+    bq = _FakeBigQuery([{"order_id": i, "products": [f"item{i}"]} for i in range(6)])
+    outage = {"on": True}
+    sent = []
+
+    def handler(request):
+        prompt = json.loads(request.content)["prompt"]
+        if outage["on"] and "item5" in prompt:
+            return httpx.Response(500)
+        sent.append(prompt)
+        return httpx.Response(200, json={"output": {"text": mock_reply(prompt)}})
+
+    store = _use_fakes(monkeypatch, tmp_path, bq, handler)
+    monkeypatch.setattr(intent_service, "pack_batches", lambda orders: intent_service.chunk_list(list(orders), 2))
+
+    messages = []
+    run_id = intent_service.infer_intent_for_dataset("p.d", sample_size=6, progress_cb=messages.append, retry_rounds=1)
+
+    assert json.loads(messages[-1])["status"] == "incomplete"
+    assert sorted(row["order_id"] for row in bq.inserted) == [0, 1, 2, 3]
+    assert store.counts(run_id)["failed"] == 2
+
+    outage["on"] = False
+    sent.clear()
+    assert intent_service.infer_intent_for_dataset("p.d", resume=run_id) == run_id
+
+    # Only the failed batch is sent again, and its results land under the same run
+    assert len(sent) == 1 and "item4" in sent[0]
+    assert sorted(row["order_id"] for row in bq.inserted) == list(range(6))
+    assert {row["run_id"] for row in bq.inserted} == {run_id}
+    assert store.get_run(run_id)["status"] == "completed"
+
+    # Run aggregates count each written row once, across the resume
+    aggregates = get_aggregates(("run", run_id))
+    assert aggregates.top(1) == [("mock intent", 6)]
+    assert aggregates.top_products("mock intent", 10)[0] == ("item0", 1)
+
+
+def test_pipeline_pages_source_and_resumes_where_reading_stopped(tmp_path, monkeypatch):
+    bq = _FakeBigQuery([{"order_id": i, "products": [f"item{i}"]} for i in range(10)], fail_after_pages=2)
+
+    def handler(request):
+        prompt = json.loads(request.content)["prompt"]
+        return httpx.Response(200, json={"output": {"text": mock_reply(prompt)}})
+
+    store = _use_fakes(monkeypatch, tmp_path, bq, handler)
+    messages = []
+    with pytest.raises(ConnectionError):
+        intent_service.infer_intent_for_dataset("p.d", sample_size=0, page_size=3, progress_cb=messages.append)
+
+    run_id = json.loads(messages[0])["run_id"]
+    assert store.get_run(run_id)["rows_read"] == 6
+
+    bq.fail_after_pages = None
+    intent_service.infer_intent_for_dataset("p.d", resume=run_id, page_size=3)
+
+    assert bq.start_indexes == [0, 6]
+    assert sorted(row["order_id"] for row in bq.inserted) == list(range(10))
+    assert store.get_run(run_id)["status"] == "completed"
+
+
+def test_rejected_loads_are_retried_without_new_model_calls(tmp_path, monkeypatch):
+    bq = _FakeBigQuery([{"order_id": i, "products": [f"item{i}"]} for i in range(4)])
+    calls = {"n": 0}
+
+    def handler(request):
+        calls["n"] += 1
+        prompt = json.loads(request.content)["prompt"]
+        return httpx.Response(200, json={"output": {"text": mock_reply(prompt)}})
+
+    store = _use_fakes(monkeypatch, tmp_path, bq, handler)
+    load = bq.load_table_from_json
+    rejected = []
+
+    def flaky_load(rows, table_id, job_config=None):
+        if not rejected:
+            rejected.append(len(rows))
+            raise RuntimeError("quota exceeded")
+        return load(rows, table_id, job_config)
+
+    monkeypatch.setattr(bq, "load_table_from_json", flaky_load)
+    messages = []
+    run_id = intent_service.infer_intent_for_dataset("p.d", progress_cb=messages.append, retry_rounds=1)
+
+    assert rejected == [4] and calls["n"] == 1
+    assert any(json.loads(m)["type"] == "write_failed" for m in messages)
+    assert sorted(row["order_id"] for row in bq.inserted) == [0, 1, 2, 3]
+    assert store.get_run(run_id)["status"] == "completed"
+
+
+def test_streamed_intents_arrive_before_the_batch_fails():
+    batch = [{"order_id": 10 + i, "products": [f"item{i}"]} for i in range(3)]
+
+    async def events():
+        yield b'data: {"choices": [{"text": "[{\\"i\\":0,\\"intent\\":\\"Baking\\"},"}]}\n\n'
+        yield b'data: {"choices": [{"text": "{\\"i\\":1,\\"intent\\":\\"Cam"}]}\n\n'
+        raise httpx.ReadError("connection reset")
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
+
+    partials = []
+
+    async def on_partial(idx, intents):
+        partials.append((idx, intents))
+
+    results = _collect([batch], httpx.MockTransport(handler), on_partial=on_partial, max_retries=0)
+
+    assert partials == [(0, [{"order_id": 10, "intent": "Baking"}])]
+    assert isinstance(results[0][1], intent_service.ModelCallError)
+
+
+def test_valid_intents_are_kept_from_malformed_output():
+    def handler(request):
+        text = '[{"i":0,"intent":"Baking"}, {"i":1,"intent":"oops"' + ' {"i":2,"intent":"Camping"}]'
+        return httpx.Response(200, json={"output": {"text": text}})
+
+    batch = [{"order_id": 10 + i, "products": [f"item{i}"]} for i in range(3)]
+    [(_, result)] = _collect([batch], httpx.MockTransport(handler))
+
+    assert result == [{"order_id": 10, "intent": "Baking"}, {"order_id": 12, "intent": "Camping"}]
+
+
+def test_pipeline_keeps_streamed_intents_of_a_failed_batch(tmp_path, monkeypatch):
+    bq = _FakeBigQuery([{"order_id": i, "products": [f"item{i}"]} for i in range(3)])
+    prompts = []
+
+    def handler(request):
+        prompt = json.loads(request.content)["prompt"]
+        prompts.append(prompt)
+        reply = mock_reply(prompt)
+
+        async def events():
+            for obj in json.loads(reply):
+                yield f"data: {json.dumps({'choices': [{'text': json.dumps(obj) + ','}]})}\n\n".encode()
+                if len(prompts) == 1:
+                    raise httpx.ReadError("connection reset")
+            yield b"data: [DONE]\n\n"
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
+
+    store = _use_fakes(monkeypatch, tmp_path, bq, handler)
+    messages = []
+    run_id = intent_service.infer_intent_for_dataset("p.d", progress_cb=messages.append, retry_rounds=1)
+
+    failed = [json.loads(m) for m in messages if json.loads(m)["type"] == "batch_failed"]
+    assert failed[0]["salvaged"] == 1
+    # The retry only asks about the two orders that had no intent yet
+    assert "item0" not in prompts[1] and "item1" in prompts[1] and "item2" in prompts[1]
+    assert sorted(row["order_id"] for row in bq.inserted) == [0, 1, 2]
+    assert store.get_run(run_id)["status"] == "completed"
@@ -0,0 +1,49 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app.services.job_manager import CANCELLED, COMPLETED, JobLimitReached, JobManager
+
+
+def _collect(job, after=0):
+    async def run():
+        return [item async for item in job.events(after)]
+    return asyncio.run(run())
+
+
+def test_events_replay_from_last_event_id():
+    manager = JobManager(max_concurrent=1)
+
+    def target(job):
+        for i in range(3):
+            job.publish(json.dumps({"type": "progress", "batch": i + 1, "run_id": "r1"}))
+        return "r1"
+
+    job = manager.submit("intent", target)
+    events = _collect(job)
+
+    assert [event_id for event_id, _ in events] == [1, 2, 3, 4]
+    assert events[-1][1] == {"type": "end", "status": COMPLETED}
+    # A reattaching client only gets what it has not seen
+    assert [p.get("batch") for _, p in _collect(job, after=2)] == [3, None]
+    assert job.snapshot()["run_id"] == "r1" and job.result == "r1"
+
+
+def test_concurrent_jobs_are_capped_and_cancellable():
+    manager = JobManager(max_concurrent=1)
+    started = threading.Event()
+
+    def target(job):
+        started.set()
+        job.cancelled.wait(5)
+
+    job = manager.submit("intent", target)
+    started.wait(5)
+    with pytest.raises(JobLimitReached):
+        manager.submit("intent", target)
+
+    job.cancel()
+    assert _collect(job)[-1][1]["status"] == CANCELLED
+    assert manager.submit("intent", lambda job: None).id != job.id
@@ -0,0 +1,17 @@
+from app.services.json_stream import JsonObjectStream, parse_objects
+
+
+def test_objects_are_emitted_as_soon_as_they_close():
+    stream = JsonObjectStream()
+    text = '[{"i":0,"intent":"Baking"},{"i":1,"intent":"Camp {trip}"}]'
+
+    assert stream.feed(text[:20]) == []
+    assert stream.feed(text[20:30]) == [{"i": 0, "intent": "Baking"}]
+    assert stream.feed(text[30:]) == [{"i": 1, "intent": "Camp {trip}"}]
+
+
+def test_malformed_objects_are_dropped_without_losing_the_rest():
+    text = ('Here you go: [{"i":0,"intent":"ok"}, {"i":1,"intent":"cut off" {"i":2,"intent":"fine \\"x\\""},'
+            ' {"i":3 "intent":"no comma"}, {"i":4,"intent":"trunc')
+
+    assert parse_objects(text) == [{"i": 0, "intent": "ok"}, {"i": 2, "intent": 'fine "x"'}]
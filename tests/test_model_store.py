@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.services import model_store
+
+
+def _train(periods):
+    rng = np.random.default_rng(3)
+    values = np.cumsum(rng.normal(0, 1, 80)) + 50
+    dates = pd.date_range("2024-01-01", periods=80, freq="D")
+    return pd.Series(values[:periods], index=dates[:periods], name="Total Price")
+
+
+def test_arima_reused_for_unchanged_series(monkeypatch, tmp_path):
+    monkeypatch.setattr(model_store, "MODEL_STORE_DIR", str(tmp_path))
+    model_store.clear_model_store()
+
+    first = model_store.get_arima("category=Books", _train(60))
+    assert model_store.get_arima("category=Books", _train(60)) is first
+
+    # Reloaded from disk after the in-memory store is cleared
+    model_store.clear_model_store(remove_files=False)
+    reloaded = model_store.get_arima("category=Books", _train(60))
+    np.testing.assert_allclose(reloaded.forecast(3), first.forecast(3))
+
+
+def test_arima_appends_new_observations_without_refit(monkeypatch, tmp_path):
+    monkeypatch.setattr(model_store, "MODEL_STORE_DIR", str(tmp_path))
+    model_store.clear_model_store()
+
+    first = model_store.get_arima("category=Books", _train(60))
+    updated = model_store.get_arima("category=Books", _train(61))
+
+    assert updated.nobs == 61
+    np.testing.assert_allclose(updated.params, first.params)
+
+
+def test_arima_refits_after_enough_appended_days(monkeypatch, tmp_path):
+    monkeypatch.setattr(model_store, "MODEL_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(model_store, "ARIMA_REFIT_AFTER_DAYS", 5)
+    model_store.clear_model_store()
+
+    first = model_store.get_arima("category=Books", _train(60))
+    appended = model_store.get_arima("category=Books", _train(65))
+    refitted = model_store.get_arima("category=Books", _train(66))
+
+    np.testing.assert_allclose(appended.params, first.params)
+    assert model_store._load("category=Books", "ARIMA")["fit_n_obs"] == 66
+    assert not np.allclose(refitted.params, first.params)
+
+
+def test_model_files_writable_by_others_are_not_unpickled(monkeypatch, tmp_path):
+    monkeypatch.setattr(model_store, "MODEL_STORE_DIR", str(tmp_path / "store"))
+    model_store.clear_model_store()
+
+    model_store.save_arima_order("category=Books", "v1", {"order": (1, 1, 1)})
+    assert (tmp_path / "store").stat().st_mode & 0o777 == 0o700
+    model_store.clear_model_store(remove_files=False)
+    assert model_store.get_arima_order("category=Books", "v1") == {"order": (1, 1, 1)}
+
+    path = model_store._path("category=Books", "ARIMA-order")
+    os.chmod(path, 0o666)
+    model_store.clear_model_store(remove_files=False)
+    assert model_store.get_arima_order("category=Books", "v1") is None
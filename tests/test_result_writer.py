@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from app.services.result_writer import BufferedResultWriter, WriteError
+
+
+def test_writer_flushes_by_row_count_and_on_close():
+    flushed = []
+    writer = BufferedResultWriter(None, "p.d.t", flush_rows=3, flush_seconds=60,
+                                  write=lambda client, table_id, rows: flushed.append(len(rows)))
+    writer.add([{"order_id": i} for i in range(7)])
+    writer.close()
+
+    assert flushed == [3, 3, 1]
+    assert writer.rows_written == 7
+
+
+def test_writer_flushes_after_elapsed_time():
+    written = threading.Event()
+    writer = BufferedResultWriter(None, "p.d.t", flush_rows=1000, flush_seconds=0.05,
+                                  write=lambda client, table_id, rows: None, on_written=lambda rows: written.set())
+    writer.add([{"order_id": 1}])
+
+    assert written.wait(2)
+    writer.close()
+
+
+def test_writer_reports_rejected_rows():
+    def reject(client, table_id, rows):
+        raise WriteError("Load failed", [{"reason": "invalid", "message": "bad intent"}])
+
+    failures = []
+    writer = BufferedResultWriter(None, "p.d.t", flush_rows=10, write=reject,
+                                  on_error=lambda rows, e: failures.append((len(rows), e.errors)))
+    writer.add([{"order_id": 1}, {"order_id": 2}])
+    writer.close()
+
+    assert failures == [(2, [{"reason": "invalid", "message": "bad intent"}])]
+    assert writer.rows_written == 0 and writer.failed_flushes == 1
+
+
+def test_load_rows_passes_the_results_schema(monkeypatch):
+    pytest.importorskip("google.cloud.bigquery")
+    from app.services.result_writer import load_rows
+
+    class _Job:
+        errors = None
+
+        def result(self):
+            return self
+
+    class _Client:
+        def load_table_from_json(self, rows, table_id, job_config):
+            self.job_config = job_config
+            return _Job()
+
+    client = _Client()
+    load_rows(client, "p.d.intent_inference_results", [{"order_id": 1, "intent": "x"}])
+
+    assert not client.job_config.autodetect
+    assert [field.name for field in client.job_config.schema] == ["order_id", "intent", "model", "run_id", "created_at"]
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from app.services.series import DailySeries, as_daily_series
+
+
+def _sales_frame():
+    dates = pd.date_range("2025-01-01", periods=20, freq="D").strftime("%Y-%m-%d")
+    # Two rows per day so aggregation has something to do
+    return pd.DataFrame({
+        "Date": list(dates) * 2,
+        "Total Price": np.arange(40, dtype=float),
+    })
+
+
+def test_from_frame_aggregates_and_sorts():
+    series = DailySeries.from_frame(_sales_frame())
+    assert len(series) == 20
+    assert series.ts.index.is_monotonic_increasing
+    assert series.ts.iloc[0] == 0.0 + 20.0
+
+
+def test_from_frame_is_memoized_by_content():
+    first = DailySeries.from_frame(_sales_frame())
+    second = DailySeries.from_frame(_sales_frame())
+    assert first is second
+    assert as_daily_series(first) is first
+
+
+def test_derived_values_are_cached():
+    series = DailySeries.from_frame(_sales_frame())
+    assert series.acf(5) is series.acf(5)
+    assert len(series.diff) == 19
+    assert series.variance == float(series.ts.var())
+
+
+def test_diagnostics_are_numeric_and_plots_render_on_demand():
+    from app.services.diagnostics_service import run_diagnostics, render_plot
+
+    series = DailySeries.from_frame(_sales_frame())
+    result = run_diagnostics(series, max_lags=5)
+
+    assert "acf_plot_b64" not in result
+    assert result["acf"]["lags"] == 5
+    assert len(result["acf"]["values"]) == 6
+    assert len(result["pacf"]["confint"]) == result["pacf"]["lags"] + 1
+    assert result["series_key"] == series.key
+
+    png = render_plot(series, "acf", max_lags=5)
+    assert png.startswith(b"\x89PNG")
+    assert render_plot(series, "acf", max_lags=5) is png
+
+
+def test_correlograms_are_computed_once_under_concurrency(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from statsmodels.tsa import stattools
+
+    calls = []
+    real_acf = stattools.acf
+
+    def counting_acf(*args, **kwargs):
+        calls.append(kwargs.get("nlags"))
+        return real_acf(*args, **kwargs)
+
+    monkeypatch.setattr(stattools, "acf", counting_acf)
+    frame = _sales_frame()
+    frame["Total Price"] += 1000.0  # a series no other test has cached
+    series = DailySeries.from_frame(frame)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: series.acf(4), range(16)))
+
+    assert calls == [4]
+    assert all(result is results[0] for result in results)
+
+
+def test_plot_route_rebuilds_an_evicted_series(monkeypatch):
+    from app.routes import diagnostics
+    from app.services import series as series_module
+
+    frame = _sales_frame()
+    key = DailySeries.from_frame(frame).key
+    series_module._series_cache.clear()
+    monkeypatch.setattr(diagnostics, "fetch_data_from_bigquery", lambda **kwargs: frame)
+
+    response = diagnostics.diagnostics_plot(key, "acf", max_lags=5, category="Books", product=None)
+
+    assert response.media_type == "image/png"
+    assert series_module.get_cached_series(key) is not None
@@ -0,0 +1,18 @@
+import subprocess
+import sys
+
+HEAVY_MODULES = ("statsmodels", "matplotlib", "prophet", "sklearn", "mlxtend", "google.cloud.bigquery")
+
+
+def test_app_import_does_not_load_heavy_libraries_or_clients():
+    # Fresh interpreter so other tests' imports don't leak in
+    code = (
+        "import sys, app.main\n"
+        "from app.utils import clients\n"
+        f"loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(','.join(loaded) + '|' + str(len(clients._clients)))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    loaded, n_clients = out.strip().splitlines()[-1].split("|")
+    assert loaded == ""
+    assert n_clients == "0"
@@ -0,0 +1,62 @@
+import os
+
+import pyarrow as pa
+import pytest
+
+from app.services import storage
+from app.services.storage import BASKETS, DatasetStore
+
+
+def test_tenants_do_not_clobber_each_other(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, "_store", DatasetStore(spill_dir=str(tmp_path)))
+
+    storage.set_baskets([{"order_id": 1, "products": ["milk", "eggs"]}], user_id="a", dataset_id=1)
+    storage.set_baskets([{"order_id": 2, "products": ["milk"]}], user_id="b", dataset_id=2)
+    storage.set_intents([{"order_id": 2, "intent": "breakfast"}, {"order_id": 3, "intent": "breakfast"},
+                         {"order_id": 4, "intent": None}], user_id="b", dataset_id=2)
+
+    assert storage.get_baskets("a", 1) == [{"order_id": 1, "products": ["milk", "eggs"]}]
+    assert storage.get_baskets("b", 2) == [{"order_id": 2, "products": ["milk"]}]
+    with pytest.raises(TypeError):
+        storage.get_baskets()  # no "most recent table" of some other user
+    assert storage.get_baskets("a", 2) == []
+    assert storage.get_intent_counts("b", 2) == {"breakfast": 2}
+    assert storage.get_intent_counts("a", 1) == {}
+    assert pa.types.is_dictionary(storage.get_baskets_table("a", 1).schema.field("products").type.value_type)
+
+
+def test_least_recently_used_tables_spill_to_memory_maps(tmp_path):
+    def baskets(n):
+        return storage._encode(pa.table({"order_id": list(range(n)), "products": [["milk", "eggs"]] * n}))
+
+    one = baskets(10_000)
+    store = DatasetStore(memory_budget=int(one.nbytes * 2.5), spill_dir=str(tmp_path))
+    for dataset_id in (1, 2):
+        store.put(BASKETS, "u", dataset_id, baskets(10_000))
+    store.get(BASKETS, "u", 1)
+    store.put(BASKETS, "u", 3, baskets(10_000))
+
+    assert store.resident_bytes <= store.memory_budget
+    spill_dir = store.spill_dir
+    assert os.path.dirname(spill_dir) == str(tmp_path) and os.stat(spill_dir).st_mode & 0o777 == 0o700
+    assert len(os.listdir(spill_dir)) == 1  # dataset 2 was the least recently used
+    spilled = store.get(BASKETS, "u", 2)
+    assert spilled.num_rows == 10_000
+    assert spilled.column("products")[0].as_py() == ["milk", "eggs"]
+
+    store.put(BASKETS, "u", 2, baskets(5))
+    assert os.listdir(spill_dir) == []
+    store.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spills_of_dead_processes_are_removed_at_startup(tmp_path):
+    dead = tmp_path / f"{storage.SPILL_PREFIX}99999999-abc"
+    dead.mkdir()
+    (dead / "baskets-x.arrow").write_bytes(b"old")
+    live = tmp_path / f"{storage.SPILL_PREFIX}{os.getpid()}-abc"
+    live.mkdir()
+
+    DatasetStore(spill_dir=str(tmp_path))
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [live.name]
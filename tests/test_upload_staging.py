@@ -0,0 +1,205 @@
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+
+from app.services.upload_staging import csv_to_parquet, detect_file_type, read_header
+
+
+def test_file_type_comes_from_the_header_only(tmp_path):
+    path = tmp_path / "upload.csv"
+    path.write_text("order_id,product_id,add_to_cart_order\n" + "not,a,number\n" * 3)
+
+    assert read_header(str(path)) == ["order_id", "product_id", "add_to_cart_order"]
+    assert detect_file_type(read_header(str(path))) == "order_products"
+    assert detect_file_type(["foo", "bar"]) is None
+
+
+def test_csv_is_staged_block_by_block_with_stable_types(tmp_path):
+    src = tmp_path / "orders.csv"
+    lines = ["order_id,user_id,order_date,Total cost,Total_Items"]
+    lines += [f"{i},{i % 7},2024-01-{i % 28 + 1:02d},{i}.5,{i}" for i in range(2000)]
+    lines.append("2000,1,2024-02-01,3,many")
+    src.write_text("\n".join(lines) + "\n")
+
+    dest = tmp_path / "orders.parquet"
+    rows, columns = csv_to_parquet(str(src), str(dest), read_header(str(src)), block_bytes=4096)
+
+    assert (rows, columns) == (2001, 5)
+    table = pq.read_table(dest)
+    assert str(table.schema.field("Total_Items").type) == "string"
+    assert table.column("Total_Items")[-1].as_py() == "many"
+
+
+def test_upload_route_stages_parquet(tmp_path, monkeypatch):
+    from app.main import app
+    from app.routes import upload
+
+    monkeypatch.setattr(upload, "UPLOAD_TMP_DIR", str(tmp_path))
+    client = TestClient(app)
+    csv_bytes = b"product_id,product_name\n1,milk\n2,eggs\n"
+
+    response = client.post("/upload", files={"file": ("products.csv", csv_bytes, "text/csv")}, data={"user_id": "u1"})
+
+    assert response.status_code == 200
+    assert response.json() == {"rows": 2, "columns": 2}
+    assert pq.read_table(tmp_path / "u1" / "products.parquet").column("product_name").to_pylist() == ["milk", "eggs"]
+    assert sorted(p.name for p in (tmp_path / "u1").iterdir()) == ["products.parquet"]
+
+    bad = client.post("/upload", files={"file": ("x.csv", b"a,b\n1,2\n", "text/csv")}, data={"user_id": "u1"})
+    assert bad.status_code == 400
+
+
+def test_orders_are_conformed_and_loaded_as_parquet(tmp_path):
+    import pyarrow as pa
+
+    from app.routes.upload import SCHEMA
+    from app.services.basket_assembly import assemble_orders
+    from app.services.upload_staging import conform_table, load_parquet, write_parquet
+
+    orders = pa.table({"order_id": [1, 2], "user_id": [5, 6], "Total cost": [3, 4], "extra": ["x", "y"]})
+    order_products = pa.table({"order_id": [1, 1], "product_id": [10, 11]})
+    products = pa.table({"product_id": [10, 11], "product_name": ["milk", "eggs"]})
+
+    table = conform_table(assemble_orders(orders, order_products, products), SCHEMA, dataset_id=7)
+    path = str(tmp_path / "orders_load.parquet")
+    write_parquet(table, path)
+
+    loaded = pq.read_table(path)
+    assert loaded.column_names == [name for name, _, _ in SCHEMA]
+    assert loaded.column("products").to_pylist() == [["milk", "eggs"], []]
+    assert loaded.column("dataset_id").to_pylist() == [7, 7]
+    assert loaded.column("Total cost").to_pylist() == [3.0, 4.0]
+    assert loaded.column("intent").to_pylist() == [None, None]
+
+    class _Job:
+        output_rows = 2
+
+        def result(self):
+            return self
+
+    class _Client:
+        def load_table_from_file(self, f, table_id, job_config):
+            self.body, self.config = f.read(), job_config
+            return _Job()
+
+    client = _Client()
+    assert load_parquet(client, path, "proj.ds.Orders", []) == 2
+    assert client.body[:4] == b"PAR1"
+    assert client.config.to_api_repr()["load"]["parquetOptions"] == {"enableListInference": True}
+
+
+def test_complete_upload_is_merged_and_loaded_by_a_job(tmp_path, monkeypatch):
+    import time
+    from types import SimpleNamespace
+
+    from app.main import app
+    from app.routes import upload
+    from app.services.dataset_catalog import DatasetCatalog
+
+    loads = []
+
+    class _Client:
+        def query(self, sql):
+            return SimpleNamespace(result=lambda: iter([SimpleNamespace(dataset_id=4, Client_id="u0", num_rows=9)]))
+
+        def load_table_from_file(self, f, table_id, job_config):
+            loads.append((table_id, f.read()))
+            return SimpleNamespace(result=lambda: None, output_rows=2)
+
+    monkeypatch.setattr(upload, "UPLOAD_TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(upload, "get_bigquery_client", lambda: _Client())
+    catalog = DatasetCatalog(str(tmp_path / "catalog.sqlite3"))
+    monkeypatch.setattr(upload, "get_dataset_catalog", lambda: catalog)
+    client = TestClient(app)
+    files = [
+        ("orders.csv", b"order_id,user_id,order_date,Total cost\n1,5,2024-01-01,3.5\n2,6,2024-01-02,1\n"),
+        ("order_products.csv", b"order_id,product_id\n1,10\n1,11\n"),
+        ("products.csv", b"product_id,product_name\n10,milk\n11,eggs\n"),
+    ]
+    responses = [client.post("/upload", files={"file": (name, body, "text/csv")}, data={"user_id": "u1"})
+                 for name, body in files]
+
+    assert [r.json().get("job_id") for r in responses[:2]] == [None, None]
+    job_id = responses[2].json()["job_id"]
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        job = client.get(f"/upload/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.1)
+
+    assert job["status"] == "completed", job["error"]
+    assert job["result"] == {"dataset_id": 5, "rows": 2, "loaded_rows": 2, "orders": 2, "order_items": 2,
+                             "bytes": job["result"]["bytes"]}
+    assert [table_id.rsplit(".", 1)[1] for table_id, _ in loads] == ["Data sets", "Orders"]
+    assert loads[1][1][:4] == b"PAR1"
+    assert list((tmp_path / "u1").iterdir()) == []
+    assert catalog.latest_for_client("u1") == 5
+    assert catalog.get(5)["orders"] == 2
+    assert client.get("/upload/jobs/nope").status_code == 404
+
+
+def test_overlapping_uploads_each_merge_their_own_files(tmp_path, monkeypatch):
+    import threading
+    import time
+    from types import SimpleNamespace
+
+    from app.main import app
+    from app.routes import upload
+    from app.services.dataset_catalog import DatasetCatalog
+
+    loaded = {}
+
+    class _Client:
+        def query(self, sql):
+            return SimpleNamespace(result=lambda: iter([]))
+
+        def load_table_from_file(self, f, table_id, job_config):
+            if table_id == upload.TABLE_ID:
+                table = pq.read_table(f)
+                loaded[table.column("dataset_id")[0].as_py()] = table.column("order_id").to_pylist()
+            return SimpleNamespace(result=lambda: None, output_rows=0)
+
+    # Hold the first job before it reads its files until the second upload set has arrived
+    gate = threading.Event()
+    allocate = upload.allocate_dataset_id
+    calls = []
+
+    def held_allocate(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            gate.wait(30)
+        return allocate(*args, **kwargs)
+
+    monkeypatch.setattr(upload, "UPLOAD_TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(upload, "get_bigquery_client", lambda: _Client())
+    monkeypatch.setattr(upload, "allocate_dataset_id", held_allocate)
+    catalog = DatasetCatalog(str(tmp_path / "catalog.sqlite3"))
+    monkeypatch.setattr(upload, "get_dataset_catalog", lambda: catalog)
+    client = TestClient(app)
+
+    def submit(order_ids):
+        orders = "order_id,user_id,order_date,Total cost\n" + "".join(f"{i},5,2024-01-01,1\n" for i in order_ids)
+        items = "order_id,product_id\n" + "".join(f"{i},10\n" for i in order_ids)
+        files = [("orders.csv", orders), ("order_products.csv", items),
+                 ("products.csv", "product_id,product_name\n10,milk\n")]
+        responses = [client.post("/upload", files={"file": (name, body.encode(), "text/csv")}, data={"user_id": "u1"})
+                     for name, body in files]
+        return responses[-1].json()["job_id"]
+
+    first = submit([1, 2])
+    second = submit([3, 4, 5])
+    gate.set()
+
+    jobs = {}
+    deadline = time.time() + 60
+    while time.time() < deadline and len(jobs) < 2:
+        for job_id in (first, second):
+            job = client.get(f"/upload/jobs/{job_id}").json()
+            if job["status"] in ("completed", "failed"):
+                jobs[job_id] = job
+        time.sleep(0.1)
+
+    assert all(job["status"] == "completed" for job in jobs.values()), jobs
+    assert sorted(job["result"]["orders"] for job in jobs.values()) == [2, 3]
+    assert sorted(loaded.values()) == [[1, 2], [3, 4, 5]]
+    assert list((tmp_path / "u1").iterdir()) == []